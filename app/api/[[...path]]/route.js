@@ -1,105 +1,304 @@
-import Database from 'better-sqlite3';
-import bcrypt from 'bcryptjs';
-import jwt from 'jsonwebtoken';
 import { NextResponse } from 'next/server';
 import { v4 as uuidv4 } from 'uuid';
 import Papa from 'papaparse';
-import path from 'path';
-
-const JWT_SECRET = process.env.JWT_SECRET || 'your-secret-key-change-in-production';
-const DB_PATH = path.join(process.cwd(), 'inventory.db');
-
-let db = null;
-
-function getDatabase() {
-  if (!db) {
-    db = new Database(DB_PATH);
-    db.exec(`
-      CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, username TEXT UNIQUE NOT NULL, passwordHash TEXT NOT NULL, role TEXT NOT NULL, createdAt TEXT NOT NULL);
-      CREATE TABLE IF NOT EXISTS stores (id TEXT PRIMARY KEY, name TEXT NOT NULL, location TEXT NOT NULL, contactEmail TEXT, contactPhone TEXT, createdAt TEXT NOT NULL);
-      CREATE TABLE IF NOT EXISTS inventoryItems (id TEXT PRIMARY KEY, sku TEXT NOT NULL, productName TEXT NOT NULL, currentQuantity INTEGER NOT NULL, reorderLevel INTEGER NOT NULL, unitCost REAL NOT NULL DEFAULT 0, storeId TEXT NOT NULL, createdAt TEXT NOT NULL, updatedAt TEXT NOT NULL, FOREIGN KEY (storeId) REFERENCES stores(id), UNIQUE(sku, storeId));
-      CREATE TABLE IF NOT EXISTS alerts (id TEXT PRIMARY KEY, itemId TEXT NOT NULL, storeId TEXT NOT NULL, sku TEXT NOT NULL, productName TEXT NOT NULL, currentQuantity INTEGER NOT NULL, reorderLevel INTEGER NOT NULL, alertType TEXT NOT NULL, triggered TEXT NOT NULL, resolved INTEGER NOT NULL DEFAULT 0, resolvedBy TEXT, resolvedAt TEXT, FOREIGN KEY (itemId) REFERENCES inventoryItems(id));
-      CREATE TABLE IF NOT EXISTS inventoryHistory (id TEXT PRIMARY KEY, itemId TEXT NOT NULL, changeType TEXT NOT NULL, quantityChange INTEGER NOT NULL, previousQty INTEGER NOT NULL, newQty INTEGER NOT NULL, userId TEXT, notes TEXT, timestamp TEXT NOT NULL, FOREIGN KEY (itemId) REFERENCES inventoryItems(id));
-    `);
+import { SHARDS_DIR, alertShard, allDatabases, allShards, forgetItemShard, getDatabase, itemShard, openDatabase, prepareCached, statement, storeShard, syncStoreShard } from '@/lib/db';
+import { hashPassword, verifyPassword, needsRehash } from '@/lib/passwords';
+import { signToken, verifyToken, verifyTokenValue } from '@/lib/tokens';
+import { hasMetricsToken, instrumentRoute, renderMetrics } from '@/lib/metrics';
+import { cachedJson } from '@/lib/cache';
+import { LIST_FORMATS, encodeColumns, projectFields } from '@/lib/columns';
+import { searchMatches } from '@/lib/search';
+import { rebuildStoreStats, checkStoreStats, readStoreStats } from '@/lib/stats';
+import { IMPORT_MODES, importInventory, parseCsvStream } from '@/lib/import';
+import { MAX_BATCH_ADJUSTMENTS, applyAdjustments } from '@/lib/adjust';
+import { evaluateAlerts } from '@/lib/alerts';
+import { eventStream, publish, publishItemDeleted, publishItems, publishStats } from '@/lib/events';
+import { BACKUP_DIR, backupStatus, createSnapshot, listSnapshots } from '@/lib/backup';
+import { requestFingerprint, withIdempotency } from '@/lib/idempotency';
+import { submitWrite } from '@/lib/writes';
+import { allocateTransfers, openAlertsPage, skuRollup, surplusDonors } from '@/lib/skus';
+import { DEFAULT_COVER_DAYS, DEFAULT_LEAD_TIME_DAYS, forecastCandidates, rebuildVelocities } from '@/lib/forecast';
+import { HISTORY_BUCKETS, compactHistory, historyPage, parseHistoryRange, summarizeHistory, summarizedThrough } from '@/lib/history';
+
+const INVENTORY_SORT_FIELDS = { sku: 'sku', productName: 'productName', quantity: 'currentQuantity', updatedAt: 'updatedAt', relevance: 'relevance' };
+// Fields a list can be projected to with ?fields=, as SQL expressions; storeName needs the stores join.
+const INVENTORY_FIELDS = { id: 'i.id', sku: 'i.sku', productName: 'i.productName', currentQuantity: 'i.currentQuantity', reorderLevel: 'i.reorderLevel', unitCost: 'i.unitCost', storeId: 'i.storeId', createdAt: 'i.createdAt', updatedAt: 'i.updatedAt', version: 'i.version', storeName: "COALESCE(s.name, 'Unknown')" };
+const ALERT_FIELDS = { id: 'a.id', itemId: 'a.itemId', storeId: 'a.storeId', sku: 'a.sku', productName: 'a.productName', currentQuantity: 'a.currentQuantity', reorderLevel: 'a.reorderLevel', alertType: 'a.alertType', triggered: 'a.triggered', resolved: 'a.resolved', resolvedBy: 'a.resolvedBy', resolvedAt: 'a.resolvedAt', storeName: "COALESCE(s.name, 'Unknown')" };
+const DICTIONARY_FIELDS = ['storeId', 'storeName', 'alertType'];
+const DEFAULT_PAGE_SIZE = 100, MAX_PAGE_SIZE = 1000, DEFAULT_HISTORY_PAGE_SIZE = 50, DEFAULT_FORECAST_DAYS = 30, DEFAULT_ROLLUP_PAGE_SIZE = 20;
+const EXPORT_FIELDS = ['SKU', 'Product Name', 'Store', 'Current Quantity', 'Reorder Level', 'Unit Cost', 'Total Value', 'Needs Reorder'], EXPORT_BATCH_SIZE = 1000;
+
+const userProfiles = new Map(), MAX_CACHED_PROFILES = 10000;
+
+// Profiles never change after registration, so /auth/me is answered from memory after the first lookup.
+function getUserProfile(userId) {
+  let profile = userProfiles.get(userId);
+  if (!profile) {
+    profile = statement('userById').get(userId);
+    if (!profile) return profile;
+    if (userProfiles.size >= MAX_CACHED_PROFILES) userProfiles.delete(userProfiles.keys().next().value);
+    userProfiles.set(userId, profile);
   }
-  return db;
+  return profile;
+}
+
+// Runs a mutation (returning { status, body, headers }) through the write queue, which may commit it together with
+// other requests' mutations. With an Idempotency-Key header, a retry of a request that already succeeded gets the
+// stored response instead of applying it twice.
+async function respondWrite(db, request, user, body, mutation) {
+  const key = request.headers.get('idempotency-key'), fingerprint = key && requestFingerprint(request.method, new URL(request.url).pathname, body);
+  const { status, body: payload, headers } = await submitWrite(db, () => withIdempotency(db, { userId: user.userId, key, fingerprint }, mutation));
+  return NextResponse.json(payload, { status, headers });
+}
+
+// Version an item update is conditional on: the If-Match header (an item ETag such as "3", or * for any version) or
+// `expectedVersion` in the body. Undefined when the update is unconditional, null when the value is not a version.
+function parseExpectedVersion(ifMatch, expectedVersion) {
+  const value = ifMatch ? ifMatch.trim().replace(/^W\//, '').replace(/^"(.*)"$/, '$1') : expectedVersion;
+  if (value === undefined || value === null || value === '*') return undefined;
+  const version = Number(value);
+  return Number.isInteger(version) && version >= 0 ? version : null;
+}
+
+// Opaque keyset cursors: the sort values of the last row of a page, `length` strings or numbers (two for a sort column
+// plus the id tie-breaker, one for a unique key). Null when the cursor does not decode to that shape.
+function encodeCursor(values) {
+  return Buffer.from(JSON.stringify(values)).toString('base64url');
 }
 
-function verifyToken(request) {
+function decodeCursor(cursor, length = 2) {
   try {
-    const authHeader = request.headers.get('authorization');
-    if (!authHeader || !authHeader.startsWith('Bearer ')) return null;
-    const token = authHeader.substring(7);
-    return jwt.verify(token, JWT_SECRET);
+    const values = JSON.parse(Buffer.from(cursor, 'base64url').toString());
+    return Array.isArray(values) && values.length === length && values.every(value => typeof value === 'string' || typeof value === 'number') ? values : null;
   } catch (error) {
     return null;
   }
 }
 
-function checkAndCreateAlerts(itemId) {
-  const db = getDatabase();
-  const item = db.prepare('SELECT * FROM inventoryItems WHERE id = ?').get(itemId);
-  if (!item) return;
-  const shouldAlert = item.currentQuantity <= item.reorderLevel;
-  const existingAlert = db.prepare('SELECT * FROM alerts WHERE itemId = ? AND resolved = 0').get(itemId);
-  if (shouldAlert && !existingAlert) {
-    db.prepare(`INSERT INTO alerts (id, itemId, storeId, sku, productName, currentQuantity, reorderLevel, alertType, triggered, resolved) VALUES (?, ?, ?, ?, ?, ?, ?, 'reorder', ?, 0)`).run(uuidv4(), item.id, item.storeId, item.sku, item.productName, item.currentQuantity, item.reorderLevel, new Date().toISOString());
-  } else if (!shouldAlert && existingAlert) {
-    db.prepare(`UPDATE alerts SET resolved = 1, resolvedAt = ?, resolvedBy = 'system' WHERE id = ?`).run(new Date().toISOString(), existingAlert.id);
+// Builds the FROM source and WHERE conditions shared by every inventory listing (storeId, search, lowStock filters).
+// When searching, the source joins the full-text matches as `m` so callers can select and sort by m.relevance.
+function inventoryFilters(searchParams) {
+  const matches = searchParams.get('search') ? searchMatches(searchParams.get('search'), { fuzzy: searchParams.get('fuzzy') === 'true' }) : null;
+  const source = matches ? `(${matches.sql}) m JOIN inventoryItems i ON i.rowid = m.rowid` : 'inventoryItems i', conditions = [], params = matches ? [...matches.params] : [];
+  if (searchParams.get('storeId')) { conditions.push('i.storeId = ?'); params.push(searchParams.get('storeId')); }
+  if (searchParams.get('lowStock') === 'true') conditions.push('i.currentQuantity <= i.reorderLevel');
+  return { source, ranked: Boolean(matches), conditions, params };
+}
+
+// Merges per-shard pages, each sorted by (field, id), into the first `limit` rows overall.
+function mergeSorted(pages, field, descending, limit) {
+  const sign = descending ? -1 : 1;
+  const compare = (a, b) => (a[field] < b[field] ? -sign : a[field] > b[field] ? sign : a.id < b.id ? -sign : a.id > b.id ? sign : 0);
+  return pages.flat().sort(compare).slice(0, limit);
+}
+
+// Groups item ids by the shard holding them; ids no shard holds are left out.
+function itemIdsByShard(itemIds) {
+  const groups = new Map();
+  for (const itemId of itemIds) {
+    const shard = itemShard(itemId);
+    if (shard) groups.has(shard) ? groups.get(shard).push(itemId) : groups.set(shard, [itemId]);
+  }
+  return groups;
+}
+
+// Groups batch lines (by index) by the shard holding their item; lines no shard holds are grouped under null.
+function adjustmentsByShard(adjustments) {
+  if (!SHARDS_DIR) return new Map([[getDatabase(), adjustments.map((line, index) => index)]]);
+  const groups = new Map();
+  adjustments.forEach((line, index) => {
+    const shard = line?.itemId ? itemShard(line.itemId) : line?.sku && line?.storeId ? storeShard(line.storeId) : null;
+    groups.has(shard) ? groups.get(shard).push(index) : groups.set(shard, [index]);
+  });
+  return groups;
+}
+
+const unroutedError = (line) => (line && (line.itemId || (line.sku && line.storeId)) ? 'Item not found' : 'Item ID or SKU and store ID required');
+
+// Best-effort batch spanning shards: each shard applies its lines in its own transaction, lines no shard holds fail.
+function applyAdjustmentsAcrossShards(groups, adjustments, { userId }) {
+  const results = new Array(adjustments.length), summary = { committed: true, applied: 0, failed: 0, alertsCreated: 0, alertsResolved: 0 };
+  for (const [shard, indexes] of groups) {
+    if (!shard) {
+      for (const index of indexes) results[index] = { index, error: unroutedError(adjustments[index]) };
+      summary.failed += indexes.length;
+      continue;
+    }
+    const part = applyAdjustments(shard, indexes.map(index => adjustments[index]), { userId, atomic: false });
+    part.results.forEach((result, position) => { results[indexes[position]] = { ...result, index: indexes[position] }; });
+    summary.applied += part.applied; summary.failed += part.failed; summary.alertsCreated += part.alertsCreated; summary.alertsResolved += part.alertsResolved;
   }
+  return { ...summary, results };
+}
+
+// Streams the filtered inventory of the database `files` (one per shard read) as CSV, EXPORT_BATCH_SIZE rows per
+// chunk, pulling from the cursor only as fast as the client reads. Files are read one after another, each on its own
+// read-only connection: an open iterator keeps its connection busy until exhausted.
+function streamInventoryCsv(files, searchParams) {
+  const { source, conditions, params } = inventoryFilters(searchParams), pending = [...files];
+  const query = `SELECT i.sku, i.productName, s.name AS storeName, i.currentQuantity, i.reorderLevel, i.unitCost FROM ${source} LEFT JOIN stores s ON s.id = i.storeId ${conditions.length ? `WHERE ${conditions.join(' AND ')}` : ''}`;
+  const encoder = new TextEncoder();
+  let reader = null, rows = null, header = true;
+  const close = () => { if (reader?.open) { rows.return(); reader.close(); } rows = null; };
+  const nextRow = () => {
+    for (;;) {
+      if (!rows) {
+        if (pending.length === 0) return null;
+        reader = openDatabase({ readonly: true, fileMustExist: true }, pending.shift());
+        rows = reader.prepare(query).iterate(...params);
+      }
+      const { value, done } = rows.next();
+      if (!done) return value;
+      close();
+    }
+  };
+  return new ReadableStream({
+    pull(controller) {
+      try {
+        const batch = [];
+        while (batch.length < EXPORT_BATCH_SIZE) {
+          const item = nextRow();
+          if (!item) break;
+          batch.push([item.sku, item.productName, item.storeName || '', item.currentQuantity, item.reorderLevel, item.unitCost, (item.currentQuantity * item.unitCost).toFixed(2), item.currentQuantity <= item.reorderLevel ? 'Yes' : 'No']);
+        }
+        if (batch.length > 0 || header) controller.enqueue(encoder.encode(Papa.unparse({ fields: EXPORT_FIELDS, data: batch }, { header }) + '\r\n'));
+        header = false;
+        if (batch.length < EXPORT_BATCH_SIZE) { close(); controller.close(); }
+      } catch (error) {
+        close();
+        controller.error(error);
+      }
+    },
+    cancel: close
+  });
 }
 
-export async function GET(request) {
+async function handleGet(request) {
   try {
     const db = getDatabase();
     const { pathname, searchParams } = new URL(request.url);
     const path = pathname.replace('/api', '') || '/';
     if (path === '/') return NextResponse.json({ message: 'Store Inventory Tracker API' });
+    if (path === '/metrics') {
+      if (!verifyToken(request) && !hasMetricsToken(request)) return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
+      return new NextResponse(renderMetrics(), { headers: { 'Content-Type': 'text/plain; version=0.0.4; charset=utf-8' } });
+    }
+    if (path === '/events') {
+      if (!verifyToken(request) && !verifyTokenValue(searchParams.get('token'))) return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
+      const stream = eventStream(request.headers.get('last-event-id') || searchParams.get('lastEventId'), request.signal);
+      return new NextResponse(stream, { headers: { 'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache, no-transform', Connection: 'keep-alive', 'X-Accel-Buffering': 'no' } });
+    }
     const user = verifyToken(request);
     if (!user && !path.startsWith('/auth/')) return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
-    if (path === '/auth/me') return NextResponse.json({ user: db.prepare('SELECT id, username, role, createdAt FROM users WHERE id = ?').get(user.userId) });
-    if (path === '/stores') return NextResponse.json({ stores: db.prepare('SELECT * FROM stores').all() });
+    if (path === '/auth/me') return NextResponse.json({ user: getUserProfile(user.userId) });
+    if (path === '/stores') return cachedJson(db, request, ['stores'], () => ({ stores: statement('allStores').all() }));
     if (path === '/inventory') {
-      let query = 'SELECT * FROM inventoryItems WHERE 1=1', params = [];
-      if (searchParams.get('storeId')) { query += ' AND storeId = ?'; params.push(searchParams.get('storeId')); }
-      if (searchParams.get('search')) { query += ' AND (sku LIKE ? OR productName LIKE ?)'; params.push(`%${searchParams.get('search')}%`, `%${searchParams.get('search')}%`); }
-      let items = db.prepare(query).all(...params);
-      if (searchParams.get('lowStock') === 'true') items = items.filter(item => item.currentQuantity <= item.reorderLevel);
-      const storeMap = Object.fromEntries(db.prepare('SELECT id, name FROM stores').all().map(s => [s.id, s.name]));
-      return NextResponse.json({ items: items.map(item => ({ ...item, storeName: storeMap[item.storeId] || 'Unknown' })) });
+      const { source, ranked, conditions, params } = inventoryFilters(searchParams);
+      const sortField = INVENTORY_SORT_FIELDS[searchParams.get('sort') || (ranked ? 'relevance' : 'sku')];
+      if (!sortField || (sortField === 'relevance' && !ranked)) return NextResponse.json({ error: `Invalid sort field, expected one of: ${Object.keys(INVENTORY_SORT_FIELDS).join(', ')} (relevance requires search)` }, { status: 400 });
+      // The cursor needs the id and sort value of the last row, so those are always selected.
+      const projection = projectFields(searchParams.get('fields'), ranked ? { ...INVENTORY_FIELDS, relevance: 'm.relevance' } : INVENTORY_FIELDS, ['id', sortField]);
+      if (!projection) return NextResponse.json({ error: `Invalid fields, expected any of: ${Object.keys(INVENTORY_FIELDS).join(', ')}` }, { status: 400 });
+      const format = searchParams.get('format') || 'rows';
+      if (!LIST_FORMATS.includes(format)) return NextResponse.json({ error: `Invalid format, expected one of: ${LIST_FORMATS.join(', ')}` }, { status: 400 });
+      const sortColumn = sortField === 'relevance' ? 'm.relevance' : `i.${sortField}`;
+      const direction = searchParams.get('order') === 'desc' ? 'DESC' : 'ASC', limit = Math.min(Math.max(parseInt(searchParams.get('limit'), 10) || DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE);
+      if (searchParams.get('after')) {
+        const cursor = decodeCursor(searchParams.get('after'));
+        if (!cursor) return NextResponse.json({ error: 'Invalid cursor' }, { status: 400 });
+        conditions.push(`(${sortColumn}, i.id) ${direction === 'DESC' ? '<' : '>'} (?, ?)`); params.push(...cursor);
+      }
+      // Sharded without a storeId, every shard returns its own first page and the pages are merged.
+      const shards = searchParams.get('storeId') ? [storeShard(searchParams.get('storeId'))].filter(Boolean) : allShards();
+      return cachedJson(shards, request, ['inventoryItems', 'stores'], () => {
+        const query = `SELECT ${projection.sql} FROM ${source}${projection.fields.includes('storeName') ? ' LEFT JOIN stores s ON s.id = i.storeId' : ''} ${conditions.length ? `WHERE ${conditions.join(' AND ')}` : ''} ORDER BY ${sortColumn} ${direction}, i.id ${direction} LIMIT ?`;
+        const pages = shards.map(shard => prepareCached(shard, query).all(...params, limit + 1));
+        const rows = pages.length === 1 ? pages[0] : mergeSorted(pages, sortField, direction === 'DESC', limit + 1);
+        const items = rows.slice(0, limit), last = items[items.length - 1];
+        return { items: format === 'columns' ? encodeColumns(items, projection.fields, DICTIONARY_FIELDS) : items, nextCursor: rows.length > limit ? encodeCursor([last[sortField], last.id]) : null };
+      });
+    }
+    if (path === '/inventory/forecast') {
+      const days = (name, fallback) => (searchParams.get(name) === null ? fallback : Number(searchParams.get(name)));
+      const withinDays = days('withinDays', DEFAULT_FORECAST_DAYS), leadTimeDays = days('leadTimeDays', DEFAULT_LEAD_TIME_DAYS), coverDays = days('coverDays', DEFAULT_COVER_DAYS);
+      if (![withinDays, leadTimeDays, coverDays].every(value => Number.isInteger(value) && value >= 0)) return NextResponse.json({ error: 'withinDays, leadTimeDays and coverDays must be non-negative integers' }, { status: 400 });
+      const after = searchParams.get('after') ? decodeCursor(searchParams.get('after')) : null;
+      if (searchParams.get('after') && !after) return NextResponse.json({ error: 'Invalid cursor' }, { status: 400 });
+      const storeId = searchParams.get('storeId'), limit = Math.min(Math.max(parseInt(searchParams.get('limit'), 10) || DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE);
+      const shards = storeId ? [storeShard(storeId)].filter(Boolean) : allShards();
+      const pages = shards.map(shard => forecastCandidates(shard, { storeId, withinDays, leadTimeDays, coverDays, after, limit }));
+      // Candidates come from the stored stockout day, which is never later than the exact projection, so the ones whose
+      // projection falls outside the window are dropped here and the cursor continues after the last candidate examined.
+      const rows = pages.length === 1 ? pages[0] : mergeSorted(pages, 'stockoutDay', false, limit + 1), examined = rows.slice(0, limit), last = examined[examined.length - 1];
+      const items = examined.filter(item => item.daysToStockout !== null && item.daysToStockout <= withinDays).map(({ stockoutDay, ...item }) => item);
+      return NextResponse.json({ withinDays, leadTimeDays, coverDays, items, nextCursor: rows.length > limit ? encodeCursor([last.stockoutDay, last.id]) : null });
+    }
+    if (path === '/skus/rollup') {
+      const after = searchParams.get('after') ? decodeCursor(searchParams.get('after'), 1) : null;
+      if (searchParams.get('after') && !after) return NextResponse.json({ error: 'Invalid cursor' }, { status: 400 });
+      const limit = Math.min(Math.max(parseInt(searchParams.get('limit'), 10) || DEFAULT_ROLLUP_PAGE_SIZE, 1), MAX_PAGE_SIZE), shards = allShards();
+      return cachedJson(shards, request, ['inventoryItems', 'stores'], () => {
+        const { skus, next } = skuRollup(shards, { sku: searchParams.get('sku'), lowStock: searchParams.get('lowStock') === 'true', after: after?.[0], limit, breakdown: searchParams.get('breakdown') !== 'false' });
+        return { skus, nextCursor: next === null ? null : encodeCursor([next]) };
+      });
+    }
+    if (path === '/skus/transfers') {
+      const before = searchParams.get('after') ? decodeCursor(searchParams.get('after')) : null;
+      if (searchParams.get('after') && !before) return NextResponse.json({ error: 'Invalid cursor' }, { status: 400 });
+      const storeId = searchParams.get('storeId'), sku = searchParams.get('sku'), limit = Math.min(Math.max(parseInt(searchParams.get('limit'), 10) || DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE);
+      const alertShards = storeId ? [storeShard(storeId)].filter(Boolean) : allShards(), donorShards = allShards();
+      return cachedJson(donorShards, request, ['alerts', 'inventoryItems', 'stores'], () => {
+        const pages = alertShards.map(shard => openAlertsPage(shard, { storeId, sku, before, limit: limit + 1 }));
+        const rows = pages.length === 1 ? pages[0] : mergeSorted(pages, 'triggered', true, limit + 1), alerts = rows.slice(0, limit), last = alerts[alerts.length - 1];
+        // Donors may sit in any store, so with sharding every shard contributes its best ones for the page's SKUs.
+        const skus = [...new Set(alerts.map(alert => alert.sku))], donors = skus.length > 0 ? donorShards.flatMap(shard => surplusDonors(shard, skus)) : [];
+        return { suggestions: allocateTransfers(alerts, donors), nextCursor: rows.length > limit ? encodeCursor([last.triggered, last.id]) : null };
+      });
     }
     if (path === '/alerts') {
-      let query = 'SELECT * FROM alerts';
-      if (searchParams.get('resolved') === 'false') query += ' WHERE resolved = 0';
-      query += ' ORDER BY triggered DESC';
-      const alerts = db.prepare(query).all();
-      const storeMap = Object.fromEntries(db.prepare('SELECT id, name FROM stores').all().map(s => [s.id, s.name]));
-      return NextResponse.json({ alerts: alerts.map(alert => ({ ...alert, resolved: Boolean(alert.resolved), storeName: storeMap[alert.storeId] || 'Unknown' })) });
+      const projection = projectFields(searchParams.get('fields'), ALERT_FIELDS, ['triggered']), format = searchParams.get('format') || 'rows';
+      if (!projection) return NextResponse.json({ error: `Invalid fields, expected any of: ${Object.keys(ALERT_FIELDS).join(', ')}` }, { status: 400 });
+      if (!LIST_FORMATS.includes(format)) return NextResponse.json({ error: `Invalid format, expected one of: ${LIST_FORMATS.join(', ')}` }, { status: 400 });
+      const query = `SELECT ${projection.sql} FROM alerts a${projection.fields.includes('storeName') ? ' LEFT JOIN stores s ON s.id = a.storeId' : ''}${searchParams.get('resolved') === 'false' ? ' WHERE a.resolved = 0' : ''} ORDER BY a.triggered DESC`;
+      const shards = allShards();
+      return cachedJson(shards, request, ['alerts', 'stores'], () => {
+        const alerts = shards.flatMap(shard => prepareCached(shard, query).all());
+        if (shards.length > 1) alerts.sort((a, b) => (a.triggered > b.triggered ? -1 : a.triggered < b.triggered ? 1 : 0));
+        if (projection.fields.includes('resolved')) for (const alert of alerts) alert.resolved = Boolean(alert.resolved);
+        return { alerts: format === 'columns' ? encodeColumns(alerts, projection.fields, DICTIONARY_FIELDS) : alerts };
+      });
     }
     if (path === '/dashboard/stats') {
-      const items = db.prepare('SELECT currentQuantity, unitCost, reorderLevel FROM inventoryItems').all();
-      return NextResponse.json({
-        stats: {
-          totalItems: db.prepare('SELECT COUNT(*) as count FROM inventoryItems').get().count,
-          totalStores: db.prepare('SELECT COUNT(*) as count FROM stores').get().count,
-          activeAlerts: db.prepare('SELECT COUNT(*) as count FROM alerts WHERE resolved = 0').get().count,
-          totalValue: items.reduce((sum, item) => sum + (item.currentQuantity * item.unitCost), 0).toFixed(2),
-          lowStockCount: items.filter(item => item.currentQuantity <= item.reorderLevel).length
-        }
-      });
+      const storeId = searchParams.get('storeId'), shards = storeId ? [storeShard(storeId)].filter(Boolean) : allShards();
+      return cachedJson(shards, request, ['stores', 'inventoryItems', 'alerts', 'storeStats'], () => ({ stats: readStoreStats(shards, storeId) }));
+    }
+    if (path === '/backups') return NextResponse.json({ ...backupStatus(), snapshots: listSnapshots() });
+    if (path === '/dashboard/stats/check') {
+      const mismatches = allShards().flatMap(shard => checkStoreStats(shard));
+      return NextResponse.json({ consistent: mismatches.length === 0, mismatches });
+    }
+    if (path.startsWith('/inventory/') && path.endsWith('/history/summary')) {
+      const itemId = path.split('/')[2], bucket = searchParams.get('bucket') || 'day', range = parseHistoryRange(searchParams.get('from'), searchParams.get('to'));
+      if (!HISTORY_BUCKETS.includes(bucket)) return NextResponse.json({ error: `Invalid bucket, expected one of: ${HISTORY_BUCKETS.join(', ')}` }, { status: 400 });
+      if (!range) return NextResponse.json({ error: 'Invalid date range' }, { status: 400 });
+      return NextResponse.json({ bucket, buckets: summarizeHistory(itemShard(itemId) || db, itemId, { bucket, ...range }) });
     }
     if (path.startsWith('/inventory/') && path.endsWith('/history')) {
-      const itemId = path.split('/')[2];
-      const history = db.prepare('SELECT * FROM inventoryHistory WHERE itemId = ? ORDER BY timestamp DESC LIMIT 50').all(itemId);
+      const itemId = path.split('/')[2], range = parseHistoryRange(searchParams.get('from'), searchParams.get('to'));
+      if (!range) return NextResponse.json({ error: 'Invalid date range' }, { status: 400 });
+      const before = searchParams.get('after') ? decodeCursor(searchParams.get('after')) : null;
+      if (searchParams.get('after') && !before) return NextResponse.json({ error: 'Invalid cursor' }, { status: 400 });
+      const limit = Math.min(Math.max(parseInt(searchParams.get('limit'), 10) || DEFAULT_HISTORY_PAGE_SIZE, 1), MAX_PAGE_SIZE);
+      const shard = itemShard(itemId) || db, { events: history, next } = historyPage(shard, itemId, { ...range, before, limit });
       const userIds = [...new Set(history.map(h => h.userId).filter(Boolean))];
-      const userMap = userIds.length > 0 ? Object.fromEntries(db.prepare(`SELECT id, username FROM users WHERE id IN (${userIds.map(() => '?').join(',')})`).all(...userIds).map(u => [u.id, u.username])) : {};
-      return NextResponse.json({ history: history.map(h => ({ ...h, username: userMap[h.userId] || 'System' })) });
+      const userMap = userIds.length > 0 ? Object.fromEntries(prepareCached(db, `SELECT id, username FROM users WHERE id IN (${userIds.map(() => '?').join(',')})`).all(...userIds).map(u => [u.id, u.username])) : {};
+      return NextResponse.json({ history: history.map(h => ({ ...h, username: userMap[h.userId] || 'System' })), nextCursor: next ? encodeCursor(next) : null, summarizedThrough: summarizedThrough(shard, itemId) });
     }
     if (path === '/inventory/export') {
-      const items = db.prepare('SELECT * FROM inventoryItems').all();
-      const storeMap = Object.fromEntries(db.prepare('SELECT id, name FROM stores').all().map(s => [s.id, s.name]));
-      const csvData = items.map(item => ({ SKU: item.sku, 'Product Name': item.productName, 'Store': storeMap[item.storeId] || '', 'Current Quantity': item.currentQuantity, 'Reorder Level': item.reorderLevel, 'Unit Cost': item.unitCost, 'Total Value': (item.currentQuantity * item.unitCost).toFixed(2), 'Needs Reorder': item.currentQuantity <= item.reorderLevel ? 'Yes' : 'No' }));
-      return new NextResponse(Papa.unparse(csvData), { headers: { 'Content-Type': 'text/csv', 'Content-Disposition': `attachment; filename="inventory-export-${new Date().toISOString().split('T')[0]}.csv"` } });
+      const shards = searchParams.get('storeId') ? [storeShard(searchParams.get('storeId'))].filter(Boolean) : allShards();
+      const filename = `inventory-export-${new Date().toISOString().split('T')[0]}.csv`, csv = streamInventoryCsv(shards.map(shard => shard.name), searchParams);
+      if (searchParams.get('gzip') === 'true') return new NextResponse(csv.pipeThrough(new CompressionStream('gzip')), { headers: { 'Content-Type': 'application/gzip', 'Content-Disposition': `attachment; filename="${filename}.gz"` } });
+      return new NextResponse(csv, { headers: { 'Content-Type': 'text/csv', 'Content-Disposition': `attachment; filename="${filename}"` } });
     }
     return NextResponse.json({ error: 'Not found' }, { status: 404 });
   } catch (error) {
@@ -108,87 +307,188 @@ export async function GET(request) {
   }
 }
 
-export async function POST(request) {
+async function handlePost(request) {
   try {
     const db = getDatabase();
-    const { pathname } = new URL(request.url);
+    const { pathname, searchParams } = new URL(request.url);
     const path = pathname.replace('/api', '') || '/';
-    const body = await request.json();
+    const contentType = request.headers.get('content-type') || '';
+    const streamingImport = path === '/inventory/import' && (contentType.startsWith('text/csv') || contentType.startsWith('multipart/form-data'));
+    const body = streamingImport ? {} : await request.json().catch(() => ({}));
     if (path === '/auth/register') {
       const { username, password, role } = body;
       if (!username || !password) return NextResponse.json({ error: 'Username and password required' }, { status: 400 });
-      if (db.prepare('SELECT * FROM users WHERE username = ?').get(username)) return NextResponse.json({ error: 'Username already exists' }, { status: 409 });
-      const passwordHash = await bcrypt.hash(password, 10);
+      if (statement('userByUsername').get(username)) return NextResponse.json({ error: 'Username already exists' }, { status: 409 });
+      const passwordHash = await hashPassword(password);
       const newUser = { id: uuidv4(), username, passwordHash, role: role || 'staff', createdAt: new Date().toISOString() };
-      db.prepare('INSERT INTO users (id, username, passwordHash, role, createdAt) VALUES (?, ?, ?, ?, ?)').run(newUser.id, newUser.username, newUser.passwordHash, newUser.role, newUser.createdAt);
-      const token = jwt.sign({ userId: newUser.id, username: newUser.username, role: newUser.role }, JWT_SECRET, { expiresIn: '7d' });
+      statement('insertUser').run(newUser.id, newUser.username, newUser.passwordHash, newUser.role, newUser.createdAt);
+      const token = signToken(newUser);
       return NextResponse.json({ message: 'User registered successfully', token, user: { id: newUser.id, username: newUser.username, role: newUser.role } });
     }
     if (path === '/auth/login') {
       const { username, password } = body;
       if (!username || !password) return NextResponse.json({ error: 'Username and password required' }, { status: 400 });
-      const user = db.prepare('SELECT * FROM users WHERE username = ?').get(username);
-      if (!user || !(await bcrypt.compare(password, user.passwordHash))) return NextResponse.json({ error: 'Invalid credentials' }, { status: 401 });
-      const token = jwt.sign({ userId: user.id, username: user.username, role: user.role }, JWT_SECRET, { expiresIn: '7d' });
+      const user = statement('userByUsername').get(username);
+      if (!user || !(await verifyPassword(password, user.passwordHash))) return NextResponse.json({ error: 'Invalid credentials' }, { status: 401 });
+      if (needsRehash(user.passwordHash)) hashPassword(password).then(passwordHash => statement('updatePasswordHash').run(passwordHash, user.id)).catch(error => console.error('Rehash Error:', error));
+      const token = signToken(user);
       return NextResponse.json({ message: 'Login successful', token, user: { id: user.id, username: user.username, role: user.role } });
     }
     const user = verifyToken(request);
     if (!user) return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
+    if (path === '/dashboard/stats/rebuild') {
+      const mismatches = allShards().flatMap(shard => {
+        const found = checkStoreStats(shard);
+        rebuildStoreStats(shard);
+        return found;
+      });
+      return NextResponse.json({ message: 'Dashboard statistics rebuilt', corrected: mismatches.length, mismatches });
+    }
+    if (path === '/alerts/reevaluate') {
+      const { itemIds, storeId } = body;
+      if (itemIds !== undefined && !(Array.isArray(itemIds) && itemIds.length > 0)) return NextResponse.json({ error: 'itemIds must be a non-empty array' }, { status: 400 });
+      if (storeId && !statement('storeExists').get(storeId)) return NextResponse.json({ error: 'Store not found' }, { status: 404 });
+      const started = performance.now(), result = { created: 0, resolved: 0 };
+      const scopes = itemIds ? [...itemIdsByShard(itemIds)].map(([shard, ids]) => [shard, { itemIds: ids }]) : storeId ? [[storeShard(storeId), { storeId }]] : allShards().map(shard => [shard, {}]);
+      for (const [shard, scope] of scopes) {
+        const { created, resolved } = evaluateAlerts(shard, scope);
+        if (created + resolved > 0) publishStats(shard, storeId ? [storeId] : statement('allStores', shard).all().map(store => store.id));
+        result.created += created; result.resolved += resolved;
+      }
+      return NextResponse.json({ message: 'Alerts re-evaluated', scope: itemIds ? 'items' : storeId ? 'store' : 'catalog', ...result, durationMs: Math.round(performance.now() - started) });
+    }
+    if (path === '/history/compact') {
+      const olderThanDays = body.olderThanDays === undefined ? undefined : Number(body.olderThanDays);
+      if (olderThanDays !== undefined && !(Number.isInteger(olderThanDays) && olderThanDays >= 0)) return NextResponse.json({ error: 'olderThanDays must be a non-negative integer' }, { status: 400 });
+      const result = { compacted: 0, batches: 0 };
+      for (const shard of allShards()) {
+        const { cutoff, compacted, batches } = compactHistory(shard, { olderThanDays });
+        Object.assign(result, { cutoff, compacted: result.compacted + compacted, batches: result.batches + batches });
+      }
+      return NextResponse.json({ message: 'History compacted', ...result });
+    }
+    if (path === '/backups') {
+      if (!BACKUP_DIR) return NextResponse.json({ error: 'Backups are not configured, set BACKUP_DIR' }, { status: 400 });
+      // Copies in small steps between requests, so by default this only starts it; ?wait=true answers once it is done.
+      const snapshot = createSnapshot(allDatabases());
+      if (searchParams.get('wait') !== 'true') {
+        snapshot.catch(error => console.error('Backup failed:', error));
+        return NextResponse.json({ message: 'Backup started', ...backupStatus() }, { status: 202 });
+      }
+      return NextResponse.json({ message: 'Backup complete', snapshot: await snapshot });
+    }
+    if (path === '/inventory/forecast/rebuild') {
+      const started = performance.now(), result = { items: 0, tracked: 0 };
+      for (const shard of allShards()) {
+        const { items, tracked } = rebuildVelocities(shard);
+        result.items += items; result.tracked += tracked;
+      }
+      return NextResponse.json({ message: 'Sales velocities rebuilt', ...result, durationMs: Math.round(performance.now() - started) });
+    }
     if (path === '/stores') {
       const { name, location, contactEmail, contactPhone } = body;
       if (!name || !location) return NextResponse.json({ error: 'Name and location required' }, { status: 400 });
       const newStore = { id: uuidv4(), name, location, contactEmail: contactEmail || '', contactPhone: contactPhone || '', createdAt: new Date().toISOString() };
-      db.prepare('INSERT INTO stores (id, name, location, contactEmail, contactPhone, createdAt) VALUES (?, ?, ?, ?, ?, ?)').run(newStore.id, newStore.name, newStore.location, newStore.contactEmail, newStore.contactPhone, newStore.createdAt);
+      statement('insertStore').run(newStore.id, newStore.name, newStore.location, newStore.contactEmail, newStore.contactPhone, newStore.createdAt);
+      syncStoreShard(newStore.id);
+      publishStats(storeShard(newStore.id), [newStore.id]);
       return NextResponse.json({ message: 'Store created successfully', store: newStore });
     }
     if (path === '/inventory') {
       const { sku, productName, currentQuantity, reorderLevel, unitCost, storeId } = body;
       if (!sku || !productName || currentQuantity === undefined || reorderLevel === undefined || !storeId) return NextResponse.json({ error: 'SKU, product name, quantities, and store ID required' }, { status: 400 });
-      if (db.prepare('SELECT * FROM inventoryItems WHERE sku = ? AND storeId = ?').get(sku, storeId)) return NextResponse.json({ error: 'SKU already exists in this store' }, { status: 409 });
-      const newItem = { id: uuidv4(), sku, productName, currentQuantity: Number(currentQuantity), reorderLevel: Number(reorderLevel), unitCost: Number(unitCost) || 0, storeId, createdAt: new Date().toISOString(), updatedAt: new Date().toISOString() };
-      db.prepare('INSERT INTO inventoryItems (id, sku, productName, currentQuantity, reorderLevel, unitCost, storeId, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)').run(newItem.id, newItem.sku, newItem.productName, newItem.currentQuantity, newItem.reorderLevel, newItem.unitCost, newItem.storeId, newItem.createdAt, newItem.updatedAt);
-      db.prepare('INSERT INTO inventoryHistory (id, itemId, changeType, quantityChange, previousQty, newQty, userId, notes, timestamp) VALUES (?, ?, \'created\', ?, 0, ?, ?, \'Item created\', ?)').run(uuidv4(), newItem.id, currentQuantity, currentQuantity, user.userId, new Date().toISOString());
-      checkAndCreateAlerts(newItem.id);
-      return NextResponse.json({ message: 'Inventory item created successfully', item: newItem });
+      const shard = storeShard(storeId);
+      if (!shard) return NextResponse.json({ error: 'Store not found' }, { status: 404 });
+      return respondWrite(shard, request, user, body, () => {
+        if (statement('itemBySku', shard).get(sku, storeId)) return { status: 409, body: { error: 'SKU already exists in this store' } };
+        const newItem = { id: uuidv4(), sku, productName, currentQuantity: Number(currentQuantity), reorderLevel: Number(reorderLevel), unitCost: Number(unitCost) || 0, storeId, createdAt: new Date().toISOString(), updatedAt: new Date().toISOString(), version: 0 };
+        statement('insertItem', shard).run(newItem.id, newItem.sku, newItem.productName, newItem.currentQuantity, newItem.reorderLevel, newItem.unitCost, newItem.storeId, newItem.createdAt, newItem.updatedAt);
+        statement('insertHistory', shard).run(uuidv4(), newItem.id, 'created', newItem.currentQuantity, 0, newItem.currentQuantity, user.userId, 'Item created', new Date().toISOString());
+        evaluateAlerts(shard, { itemIds: [newItem.id] });
+        publishItems(shard, [newItem.id], { created: true });
+        return { status: 200, body: { message: 'Inventory item created successfully', item: newItem } };
+      });
     }
     if (path === '/inventory/adjust') {
       const { itemId, quantityChange, changeType, notes } = body;
       if (!itemId || quantityChange === undefined) return NextResponse.json({ error: 'Item ID and quantity change required' }, { status: 400 });
-      const item = db.prepare('SELECT * FROM inventoryItems WHERE id = ?').get(itemId);
-      if (!item) return NextResponse.json({ error: 'Item not found' }, { status: 404 });
-      const previousQty = item.currentQuantity, newQty = previousQty + Number(quantityChange);
-      if (newQty < 0) return NextResponse.json({ error: 'Insufficient quantity' }, { status: 400 });
-      db.prepare('UPDATE inventoryItems SET currentQuantity = ?, updatedAt = ? WHERE id = ?').run(newQty, new Date().toISOString(), itemId);
-      db.prepare('INSERT INTO inventoryHistory (id, itemId, changeType, quantityChange, previousQty, newQty, userId, notes, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)').run(uuidv4(), itemId, changeType || 'adjustment', Number(quantityChange), previousQty, newQty, user.userId, notes || '', new Date().toISOString());
-      checkAndCreateAlerts(itemId);
-      return NextResponse.json({ message: 'Inventory adjusted successfully', previousQty, newQty });
+      const shard = itemShard(itemId);
+      if (!shard) return NextResponse.json({ error: 'Item not found' }, { status: 404 });
+      // A single conditional UPDATE ... RETURNING, so concurrent adjustments from any process never lose an update.
+      return respondWrite(shard, request, user, body, () => {
+        const result = applyAdjustments(shard, [{ itemId, quantityChange, changeType, notes }], { userId: user.userId });
+        if (!result.committed) {
+          const { error } = result.errors[0];
+          return { status: error === 'Item not found' ? 404 : 400, body: { error } };
+        }
+        const { previousQty, newQty, version } = result.results[0];
+        return { status: 200, body: { message: 'Inventory adjusted successfully', previousQty, newQty, version }, headers: { ETag: `"${version}"` } };
+      });
+    }
+    if (path === '/inventory/adjust/batch') {
+      const { adjustments, mode } = body;
+      if (!Array.isArray(adjustments) || adjustments.length === 0) return NextResponse.json({ error: 'Adjustments array required' }, { status: 400 });
+      if (adjustments.length > MAX_BATCH_ADJUSTMENTS) return NextResponse.json({ error: `At most ${MAX_BATCH_ADJUSTMENTS} adjustments per batch` }, { status: 400 });
+      if (mode !== undefined && mode !== 'atomic' && mode !== 'bestEffort') return NextResponse.json({ error: 'Invalid mode, expected atomic or bestEffort' }, { status: 400 });
+      const atomic = mode !== 'bestEffort', groups = adjustmentsByShard(adjustments), single = groups.size === 1 && !groups.has(null);
+      if (atomic && !single) {
+        // Shard files commit independently, so a batch can only be all-or-nothing within one of them.
+        if (!groups.has(null)) return NextResponse.json({ error: 'Atomic batches must stay within one shard, use mode bestEffort' }, { status: 400 });
+        const errors = groups.get(null).map(index => ({ index, error: unroutedError(adjustments[index]) }));
+        return NextResponse.json({ error: 'Batch rejected, no adjustments applied', committed: false, applied: 0, failed: errors.length, errors }, { status: 400 });
+      }
+      const shard = single ? groups.keys().next().value : db;
+      return respondWrite(shard, request, user, body, () => {
+        const result = single ? applyAdjustments(shard, adjustments, { userId: user.userId, atomic }) : applyAdjustmentsAcrossShards(groups, adjustments, { userId: user.userId });
+        if (!result.committed) return { status: 400, body: { error: 'Batch rejected, no adjustments applied', ...result } };
+        return { status: 200, body: { message: 'Batch adjusted successfully', ...result } };
+      });
     }
     if (path === '/inventory/import') {
-      const { csvData, storeId } = body;
-      if (!csvData || !storeId) return NextResponse.json({ error: 'CSV data and store ID required' }, { status: 400 });
-      const parsed = Papa.parse(csvData, { header: true }), items = parsed.data.filter(row => row.SKU && row['Product Name']);
-      let imported = 0, skipped = 0, errors = [];
-      for (const row of items) {
-        try {
-          if (db.prepare('SELECT * FROM inventoryItems WHERE sku = ? AND storeId = ?').get(row.SKU, storeId)) { skipped++; continue; }
-          const newItem = { id: uuidv4(), sku: row.SKU, productName: row['Product Name'], currentQuantity: Number(row['Current Quantity'] || 0), reorderLevel: Number(row['Reorder Level'] || 0), unitCost: Number(row['Unit Cost'] || 0), storeId, createdAt: new Date().toISOString(), updatedAt: new Date().toISOString() };
-          db.prepare('INSERT INTO inventoryItems (id, sku, productName, currentQuantity, reorderLevel, unitCost, storeId, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)').run(newItem.id, newItem.sku, newItem.productName, newItem.currentQuantity, newItem.reorderLevel, newItem.unitCost, newItem.storeId, newItem.createdAt, newItem.updatedAt);
-          checkAndCreateAlerts(newItem.id);
-          imported++;
-        } catch (error) {
-          errors.push(`SKU ${row.SKU}: ${error.message}`);
-        }
+      let rows = null, storeId = body.storeId || searchParams.get('storeId'), mode = body.mode || searchParams.get('mode') || 'skip';
+      if (body.csvData) rows = Papa.parse(body.csvData, { header: true, skipEmptyLines: 'greedy' }).data;
+      else if (contentType.startsWith('multipart/form-data')) {
+        // formData() buffers the whole upload before parsing starts; only a text/csv body (what the import dialog's
+        // worker sends) is parsed as it streams in, so large files should be sent that way.
+        const form = await request.formData(), file = form.get('file');
+        storeId = form.get('storeId') || storeId; mode = form.get('mode') || mode;
+        if (file && typeof file.stream === 'function') rows = parseCsvStream(file.stream());
+      } else if (streamingImport && request.body) rows = parseCsvStream(request.body);
+      if (!rows || !storeId) return NextResponse.json({ error: 'CSV data and store ID required' }, { status: 400 });
+      if (!IMPORT_MODES.includes(mode)) return NextResponse.json({ error: `Invalid import mode, expected one of: ${IMPORT_MODES.join(', ')}` }, { status: 400 });
+      if (!statement('storeExists').get(storeId)) return NextResponse.json({ error: 'Store not found' }, { status: 404 });
+      const runImport = (onProgress) => importInventory(storeShard(storeId), rows, { storeId, userId: user.userId, mode, onProgress });
+      if ((request.headers.get('accept') || '').includes('application/x-ndjson')) {
+        const encoder = new TextEncoder();
+        // A client that disconnects cancels the stream; later events are dropped instead of enqueued on the closed stream.
+        let cancelled = false;
+        return new NextResponse(new ReadableStream({
+          async start(controller) {
+            const send = (event) => { if (!cancelled) controller.enqueue(encoder.encode(JSON.stringify(event) + '\n')); };
+            try {
+              send({ type: 'complete', message: 'Import completed', ...await runImport(progress => send({ type: 'progress', ...progress })) });
+            } catch (error) {
+              console.error('Import Error:', error);
+              send({ type: 'error', error: 'Import failed', details: error.message });
+            }
+            if (!cancelled) controller.close();
+          },
+          cancel() {
+            cancelled = true;
+          }
+        }), { headers: { 'Content-Type': 'application/x-ndjson' } });
       }
-      return NextResponse.json({ message: 'Import completed', imported, skipped, errors });
+      return NextResponse.json({ message: 'Import completed', ...await runImport() });
     }
     return NextResponse.json({ error: 'Not found' }, { status: 404 });
   } catch (error) {
+    if (error.code === 'PASSWORD_QUEUE_FULL') return NextResponse.json({ error: 'Server busy, please retry' }, { status: 503, headers: { 'Retry-After': '1' } });
     console.error('POST Error:', error);
     return NextResponse.json({ error: 'Internal server error', details: error.message }, { status: 500 });
   }
 }
 
-export async function PUT(request) {
+async function handlePut(request) {
   try {
     const db = getDatabase();
     const { pathname } = new URL(request.url);
@@ -197,17 +497,30 @@ export async function PUT(request) {
     if (!user) return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
     if (path.includes('/alerts/') && path.endsWith('/resolve')) {
       const alertId = path.split('/')[2];
-      if (db.prepare('UPDATE alerts SET resolved = 1, resolvedBy = ?, resolvedAt = ? WHERE id = ?').run(user.userId, new Date().toISOString(), alertId).changes === 0) return NextResponse.json({ error: 'Alert not found' }, { status: 404 });
+      const shard = alertShard(alertId), alert = shard && statement('resolveAlert', shard).get(user.userId, new Date().toISOString(), alertId);
+      if (!alert) return NextResponse.json({ error: 'Alert not found' }, { status: 404 });
+      publish('alertResolved', alert);
+      publishStats(shard, [alert.storeId]);
       return NextResponse.json({ message: 'Alert resolved successfully' });
     }
     const body = await request.json();
     if (path.startsWith('/stores/')) {
       const storeId = path.split('/')[2], { name, location, contactEmail, contactPhone } = body;
-      if (db.prepare('UPDATE stores SET name = ?, location = ?, contactEmail = ?, contactPhone = ? WHERE id = ?').run(name, location, contactEmail, contactPhone, storeId).changes === 0) return NextResponse.json({ error: 'Store not found' }, { status: 404 });
+      if (statement('updateStore').run(name, location, contactEmail, contactPhone, storeId).changes === 0) return NextResponse.json({ error: 'Store not found' }, { status: 404 });
+      syncStoreShard(storeId);
       return NextResponse.json({ message: 'Store updated successfully' });
     }
     if (path.startsWith('/inventory/') && !path.includes('resolve')) {
       const itemId = path.split('/')[2], { sku, productName, currentQuantity, reorderLevel, unitCost, storeId } = body;
+      const expectedVersion = parseExpectedVersion(request.headers.get('if-match'), body.expectedVersion);
+      if (expectedVersion === null) return NextResponse.json({ error: 'If-Match or expectedVersion must be an item version' }, { status: 400 });
+      const shard = itemShard(itemId);
+      if (!shard) return NextResponse.json({ error: 'Item not found' }, { status: 404 });
+      if (SHARDS_DIR && storeId !== undefined) {
+        const target = storeShard(storeId);
+        if (!target) return NextResponse.json({ error: 'Store not found' }, { status: 404 });
+        if (target !== shard) return NextResponse.json({ error: 'Items cannot move to a store in another shard' }, { status: 409 });
+      }
       const updates = [], params = [];
       if (sku !== undefined) { updates.push('sku = ?'); params.push(sku); }
       if (productName !== undefined) { updates.push('productName = ?'); params.push(productName); }
@@ -215,10 +528,22 @@ export async function PUT(request) {
       if (reorderLevel !== undefined) { updates.push('reorderLevel = ?'); params.push(Number(reorderLevel)); }
       if (unitCost !== undefined) { updates.push('unitCost = ?'); params.push(Number(unitCost)); }
       if (storeId !== undefined) { updates.push('storeId = ?'); params.push(storeId); }
-      updates.push('updatedAt = ?'); params.push(new Date().toISOString()); params.push(itemId);
-      if (db.prepare(`UPDATE inventoryItems SET ${updates.join(', ')} WHERE id = ?`).run(...params).changes === 0) return NextResponse.json({ error: 'Item not found' }, { status: 404 });
-      if (currentQuantity !== undefined || reorderLevel !== undefined) checkAndCreateAlerts(itemId);
-      return NextResponse.json({ message: 'Item updated successfully' });
+      updates.push('updatedAt = ?', 'version = version + 1'); params.push(new Date().toISOString(), itemId);
+      if (expectedVersion !== undefined) params.push(expectedVersion);
+      // The versioned update and the alerts it affects commit together.
+      return respondWrite(shard, request, user, body, () => {
+        const previous = storeId !== undefined ? statement('itemById', shard).get(itemId) : null;
+        const item = prepareCached(shard, `UPDATE inventoryItems SET ${updates.join(', ')} WHERE id = ?${expectedVersion !== undefined ? ' AND version = ?' : ''} RETURNING *`).get(...params);
+        if (!item) {
+          const current = statement('itemById', shard).get(itemId);
+          if (!current) return { status: 404, body: { error: 'Item not found' } };
+          return { status: 412, body: { error: 'Item was changed by another update, reload it and retry', item: current }, headers: { ETag: `"${current.version}"` } };
+        }
+        if (currentQuantity !== undefined || reorderLevel !== undefined) evaluateAlerts(shard, { itemIds: [itemId] });
+        publishItems(shard, [itemId]);
+        if (previous && previous.storeId !== storeId) publishStats(shard, [previous.storeId]);
+        return { status: 200, body: { message: 'Item updated successfully', item }, headers: { ETag: `"${item.version}"` } };
+      });
     }
     return NextResponse.json({ error: 'Not found' }, { status: 404 });
   } catch (error) {
@@ -227,7 +552,7 @@ export async function PUT(request) {
   }
 }
 
-export async function DELETE(request) {
+async function handleDelete(request) {
   try {
     const db = getDatabase();
     const { pathname } = new URL(request.url);
@@ -235,16 +560,22 @@ export async function DELETE(request) {
     const user = verifyToken(request);
     if (!user) return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
     if (path.startsWith('/inventory/')) {
-      const itemId = path.split('/')[2];
-      db.prepare('DELETE FROM alerts WHERE itemId = ?').run(itemId);
-      db.prepare('DELETE FROM inventoryHistory WHERE itemId = ?').run(itemId);
-      if (db.prepare('DELETE FROM inventoryItems WHERE id = ?').run(itemId).changes === 0) return NextResponse.json({ error: 'Item not found' }, { status: 404 });
+      const itemId = path.split('/')[2], shard = itemShard(itemId), item = shard && statement('itemById', shard).get(itemId);
+      if (!item) return NextResponse.json({ error: 'Item not found' }, { status: 404 });
+      statement('deleteItemAlerts', shard).run(itemId);
+      statement('deleteItemHistory', shard).run(itemId);
+      statement('deleteItemHistoryDaily', shard).run(itemId);
+      statement('deleteItem', shard).run(itemId);
+      forgetItemShard(itemId);
+      publishItemDeleted(shard, item);
       return NextResponse.json({ message: 'Item deleted successfully' });
     }
     if (path.startsWith('/stores/')) {
-      const storeId = path.split('/')[2];
-      if (db.prepare('SELECT COUNT(*) as count FROM inventoryItems WHERE storeId = ?').get(storeId).count > 0) return NextResponse.json({ error: 'Cannot delete store with existing inventory items' }, { status: 400 });
-      if (db.prepare('DELETE FROM stores WHERE id = ?').run(storeId).changes === 0) return NextResponse.json({ error: 'Store not found' }, { status: 404 });
+      const storeId = path.split('/')[2], shard = storeShard(storeId);
+      if (shard && statement('countStoreItems', shard).get(storeId).count > 0) return NextResponse.json({ error: 'Cannot delete store with existing inventory items' }, { status: 400 });
+      if (statement('deleteStore').run(storeId).changes === 0) return NextResponse.json({ error: 'Store not found' }, { status: 404 });
+      syncStoreShard(storeId);
+      publishStats(shard, [storeId]);
       return NextResponse.json({ message: 'Store deleted successfully' });
     }
     return NextResponse.json({ error: 'Not found' }, { status: 404 });
@@ -252,4 +583,17 @@ export async function DELETE(request) {
     console.error('DELETE Error:', error);
     return NextResponse.json({ error: 'Internal server error', details: error.message }, { status: 500 });
   }
-}
\ No newline at end of file
+}
+
+// The routes each handler serves, as reported in metrics; any other path is counted as unmatched.
+const ROUTES = {
+  GET: ['/', '/metrics', '/events', '/auth/me', '/stores', '/inventory', '/inventory/forecast', '/inventory/export', '/skus/rollup', '/skus/transfers', '/alerts', '/dashboard/stats', '/dashboard/stats/check', '/backups', '/inventory/:id/history', '/inventory/:id/history/summary'],
+  POST: ['/auth/register', '/auth/login', '/dashboard/stats/rebuild', '/alerts/reevaluate', '/history/compact', '/backups', '/inventory/forecast/rebuild', '/stores', '/inventory', '/inventory/adjust', '/inventory/adjust/batch', '/inventory/import'],
+  PUT: ['/alerts/:id/resolve', '/stores/:id', '/inventory/:id'],
+  DELETE: ['/inventory/:id', '/stores/:id']
+};
+
+export const GET = instrumentRoute('GET', handleGet, ROUTES.GET);
+export const POST = instrumentRoute('POST', handlePost, ROUTES.POST);
+export const PUT = instrumentRoute('PUT', handlePut, ROUTES.PUT);
+export const DELETE = instrumentRoute('DELETE', handleDelete, ROUTES.DELETE);
@@ -1,6 +1,6 @@
 'use client'
 
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import { Button } from '@/components/ui/button'
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card'
 import { Input } from '@/components/ui/input'
@@ -11,21 +11,38 @@ import { Dialog, DialogContent, DialogDescription, DialogFooter, DialogHeader, D
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select'
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '@/components/ui/table'
 import { useToast } from '@/hooks/use-toast'
+import { decodeColumns } from '@/lib/columns'
 import { Toaster } from '@/components/ui/toaster'
 import { AlertCircle, Package, Store, TrendingDown, DollarSign, Download, Upload, Plus, Search, Edit, Trash2, History, CheckCircle } from 'lucide-react'
 
+// Fields the inventory table and alert list show, requested in the compact columnar format.
+const INVENTORY_QUERY = 'format=columns&fields=id,sku,productName,storeId,storeName,currentQuantity,reorderLevel,unitCost,version'
+const ALERTS_QUERY = 'format=columns&fields=id,itemId,sku,productName,storeName,currentQuantity,reorderLevel'
+
+// The inventory table renders only the rows in view (plus INVENTORY_OVERSCAN on each side) inside a fixed-height scroll
+// area, and fetches the next page once the view gets within INVENTORY_PREFETCH_ROWS of the last loaded row.
+const INVENTORY_PAGE_SIZE = 200, INVENTORY_ROW_HEIGHT = 53, INVENTORY_VIEWPORT_HEIGHT = 600, INVENTORY_OVERSCAN = 10, INVENTORY_PREFETCH_ROWS = 50
+const SEARCH_DEBOUNCE_MS = 250
+// Columns the table can be sorted by on the server, as header label and sort parameter.
+const SORTABLE_COLUMNS = { SKU: 'sku', 'Product Name': 'productName', Quantity: 'quantity' }
+
 const App = () => {
   const [token, setToken] = useState(null)
   const [user, setUser] = useState(null)
   const [activeTab, setActiveTab] = useState('dashboard')
   const [stores, setStores] = useState([])
   const [inventory, setInventory] = useState([])
+  const [inventoryCursor, setInventoryCursor] = useState(null)
   const [alerts, setAlerts] = useState([])
   const [stats, setStats] = useState({})
   const [loading, setLoading] = useState(false)
   const [searchTerm, setSearchTerm] = useState('')
   const [filterStore, setFilterStore] = useState('all')
   const [filterLowStock, setFilterLowStock] = useState(false)
+  const [inventorySort, setInventorySort] = useState(null)
+  const [inventoryScrollTop, setInventoryScrollTop] = useState(0)
+  const inventoryScroller = useRef(null)
+  const inventoryRequest = useRef(null)
   const { toast } = useToast()
 
   // Auth states
@@ -45,23 +62,41 @@ const App = () => {
   const [storeForm, setStoreForm] = useState({ name: '', location: '', contactEmail: '', contactPhone: '' })
   const [itemForm, setItemForm] = useState({ sku: '', productName: '', currentQuantity: 0, reorderLevel: 0, unitCost: 0, storeId: '' })
   const [adjustForm, setAdjustForm] = useState({ quantityChange: 0, changeType: 'adjustment', notes: '' })
-  const [csvData, setCsvData] = useState('')
+  const [importFile, setImportFile] = useState(null)
   const [importStoreId, setImportStoreId] = useState('')
+  const [importProgress, setImportProgress] = useState(null)
+  const importWorker = useRef(null)
 
-  // API helper
+  // API helper. GETs are conditional: the last ETag and body per path are kept, and a 304 reuses the body.
+  const responseCache = useRef(new Map())
   const api = async (path, options = {}) => {
     const headers = { 'Content-Type': 'application/json' }
     if (token) {
       headers['Authorization'] = `Bearer ${token}`
     }
+    const method = options.method || 'GET'
+    const cached = method === 'GET' ? responseCache.current.get(path) : null
+    if (cached) {
+      headers['If-None-Match'] = cached.etag
+    }
     const response = await fetch(`/api${path}`, {
       ...options,
+      cache: 'no-store',
       headers: { ...headers, ...options.headers }
     })
+    if (response.status === 304 && cached) {
+      return cached.data
+    }
     const data = await response.json()
     if (!response.ok) {
       throw new Error(data.error || 'Request failed')
     }
+    const etag = response.headers.get('ETag')
+    if (method === 'GET' && etag) {
+      responseCache.current.delete(path)
+      responseCache.current.set(path, { etag, data })
+      if (responseCache.current.size > 100) responseCache.current.delete(responseCache.current.keys().next().value)
+    }
     return data
   }
 
@@ -87,6 +122,7 @@ const App = () => {
   }
 
   const handleLogout = () => {
+    responseCache.current.clear()
     setToken(null)
     setUser(null)
     localStorage.removeItem('token')
@@ -99,10 +135,10 @@ const App = () => {
       setLoading(true)
       const [statsData, alertsData] = await Promise.all([
         api('/dashboard/stats'),
-        api('/alerts?resolved=false')
+        api(`/alerts?resolved=false&${ALERTS_QUERY}`)
       ])
       setStats(statsData.stats)
-      setAlerts(alertsData.alerts)
+      setAlerts(decodeColumns(alertsData.alerts))
     } catch (error) {
       toast({ title: 'Error', description: error.message, variant: 'destructive' })
     } finally {
@@ -119,23 +155,44 @@ const App = () => {
     }
   }
 
-  const loadInventory = async () => {
+  // Loading the first page cancels whatever listing request is still in flight, so a slow response for an old search
+  // or filter never replaces a newer one. Loading a further page is skipped while another request is in flight.
+  const loadInventory = async (after = null) => {
+    if (after && inventoryRequest.current) return
+    inventoryRequest.current?.abort()
+    const controller = new AbortController()
+    inventoryRequest.current = controller
     try {
-      setLoading(true)
-      let query = ''
+      if (!after) setLoading(true)
+      let query = `${INVENTORY_QUERY}&limit=${INVENTORY_PAGE_SIZE}`
       if (searchTerm) query += `&search=${encodeURIComponent(searchTerm)}`
       if (filterStore !== 'all') query += `&storeId=${filterStore}`
       if (filterLowStock) query += `&lowStock=true`
-      
-      const data = await api(`/inventory?${query}`)
-      setInventory(data.items)
+      if (inventorySort) query += `&sort=${inventorySort.field}&order=${inventorySort.order}`
+      if (after) query += `&after=${encodeURIComponent(after)}`
+
+      const data = await api(`/inventory?${query}`, { signal: controller.signal })
+      const items = decodeColumns(data.items)
+      if (!after) {
+        if (inventoryScroller.current) inventoryScroller.current.scrollTop = 0
+        setInventoryScrollTop(0)
+      }
+      setInventory(after ? (current) => [...current, ...items] : items)
+      setInventoryCursor(data.nextCursor)
     } catch (error) {
-      toast({ title: 'Error', description: error.message, variant: 'destructive' })
+      if (error.name !== 'AbortError') toast({ title: 'Error', description: error.message, variant: 'destructive' })
     } finally {
-      setLoading(false)
+      if (inventoryRequest.current === controller) {
+        inventoryRequest.current = null
+        setLoading(false)
+      }
     }
   }
 
+  const sortInventory = (field) => {
+    setInventorySort((current) => (current?.field === field ? { field, order: current.order === 'asc' ? 'desc' : 'asc' } : { field, order: 'asc' }))
+  }
+
   // CRUD functions
   const createStore = async () => {
     try {
@@ -157,6 +214,7 @@ const App = () => {
       if (editingItem) {
         await api(`/inventory/${editingItem.id}`, {
           method: 'PUT',
+          headers: editingItem.version !== undefined ? { 'If-Match': `"${editingItem.version}"` } : {},
           body: JSON.stringify(itemForm)
         })
         toast({ title: 'Success', description: 'Item updated successfully' })
@@ -170,8 +228,6 @@ const App = () => {
       setShowItemDialog(false)
       setEditingItem(null)
       setItemForm({ sku: '', productName: '', currentQuantity: 0, reorderLevel: 0, unitCost: 0, storeId: '' })
-      loadInventory()
-      if (activeTab === 'dashboard') loadDashboard()
     } catch (error) {
       toast({ title: 'Error', description: error.message, variant: 'destructive' })
     }
@@ -182,8 +238,6 @@ const App = () => {
     try {
       await api(`/inventory/${id}`, { method: 'DELETE' })
       toast({ title: 'Success', description: 'Item deleted successfully' })
-      loadInventory()
-      if (activeTab === 'dashboard') loadDashboard()
     } catch (error) {
       toast({ title: 'Error', description: error.message, variant: 'destructive' })
     }
@@ -199,8 +253,6 @@ const App = () => {
       setShowAdjustDialog(false)
       setSelectedItem(null)
       setAdjustForm({ quantityChange: 0, changeType: 'adjustment', notes: '' })
-      loadInventory()
-      if (activeTab === 'dashboard') loadDashboard()
     } catch (error) {
       toast({ title: 'Error', description: error.message, variant: 'destructive' })
     }
@@ -210,7 +262,6 @@ const App = () => {
     try {
       await api(`/alerts/${alertId}/resolve`, { method: 'PUT' })
       toast({ title: 'Success', description: 'Alert resolved' })
-      loadDashboard()
     } catch (error) {
       toast({ title: 'Error', description: error.message, variant: 'destructive' })
     }
@@ -218,7 +269,12 @@ const App = () => {
 
   const exportInventory = async () => {
     try {
-      const response = await fetch('/api/inventory/export', {
+      // Only the list filters: the export endpoint has its own columns and format.
+      let query = ''
+      if (searchTerm) query += `&search=${encodeURIComponent(searchTerm)}`
+      if (filterStore !== 'all') query += `&storeId=${filterStore}`
+      if (filterLowStock) query += `&lowStock=true`
+      const response = await fetch(`/api/inventory/export?${query.slice(1)}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       })
       const blob = await response.blob()
@@ -235,33 +291,81 @@ const App = () => {
     }
   }
 
-  const importInventory = async () => {
-    try {
-      await api('/inventory/import', {
-        method: 'POST',
-        body: JSON.stringify({ csvData, storeId: importStoreId })
-      })
-      toast({ title: 'Success', description: 'Inventory imported successfully' })
+  // Parsing, validation and the chunked upload run in a Web Worker (lib/import-worker.js); this only shows its progress.
+  const importInventory = () => {
+    const worker = new Worker(new URL('../lib/import-worker.js', import.meta.url))
+    importWorker.current = worker
+    setImportProgress({ readBytes: 0, totalBytes: importFile.size, uploaded: 0 })
+    const finish = () => {
+      worker.terminate()
+      importWorker.current = null
+      setImportProgress(null)
+    }
+    worker.onmessage = ({ data }) => {
+      if (data.type === 'progress') return setImportProgress(data)
+      finish()
+      if (data.type === 'error') return toast({ title: 'Error', description: data.error, variant: 'destructive' })
+      toast({ title: 'Success', description: `Imported ${data.imported}, updated ${data.updated}, skipped ${data.skipped}${data.errorCount ? `, ${data.errorCount} rows with errors` : ''}` })
       setShowImportDialog(false)
-      setCsvData('')
+      setImportFile(null)
       setImportStoreId('')
-      loadInventory()
-    } catch (error) {
-      toast({ title: 'Error', description: error.message, variant: 'destructive' })
     }
+    worker.onerror = (event) => {
+      finish()
+      toast({ title: 'Error', description: event.message || 'Import failed', variant: 'destructive' })
+    }
+    worker.postMessage({ file: importFile, storeId: importStoreId, mode: 'skip', token })
+  }
+
+  // Rows already uploaded stay imported; the rest of the file is not sent.
+  const cancelImport = () => {
+    importWorker.current?.terminate()
+    importWorker.current = null
+    setImportProgress(null)
   }
 
   const handleFileUpload = (e) => {
-    const file = e.target.files[0]
-    if (file) {
-      const reader = new FileReader()
-      reader.onload = (event) => {
-        setCsvData(event.target.result)
-      }
-      reader.readAsText(file)
-    }
+    setImportFile(e.target.files[0] || null)
   }
 
+  // Live updates: the change feed (GET /api/events) pushes item, alert and stats deltas that are applied to local state,
+  // so lists are not refetched after every change. The EventSource resumes from the last event id on reconnect.
+  const live = useRef({})
+  live.current = { searchTerm, filterStore, filterLowStock, inventorySort, inventoryCursor, activeTab, loadInventory, loadDashboard }
+
+  useEffect(() => {
+    if (!token) return
+    const source = new EventSource(`/api/events?token=${encodeURIComponent(token)}`)
+    const on = (type, handler) => source.addEventListener(type, (event) => handler(JSON.parse(event.data)))
+    const reload = () => live.current.activeTab === 'inventory' ? live.current.loadInventory() : live.current.loadDashboard()
+    const bySku = (a, b) => (a.sku < b.sku ? -1 : a.sku > b.sku ? 1 : a.id < b.id ? -1 : 1)
+
+    on('item', ({ item, created }) => setInventory((current) => {
+      if (current.some((i) => i.id === item.id)) return current.map((i) => (i.id === item.id ? { ...i, ...item } : i))
+      const { searchTerm, filterStore, filterLowStock, inventorySort, inventoryCursor } = live.current
+      const last = current[current.length - 1]
+      if (!created || searchTerm || inventorySort || (filterStore !== 'all' && item.storeId !== filterStore) || (filterLowStock && item.currentQuantity > item.reorderLevel)) return current
+      if (inventoryCursor && last && bySku(item, last) > 0) return current
+      return [...current, item].sort(bySku)
+    }))
+    on('itemDeleted', ({ id }) => {
+      setInventory((current) => current.filter((i) => i.id !== id))
+      setAlerts((current) => current.filter((a) => a.itemId !== id))
+    })
+    on('alert', (alert) => setAlerts((current) => (current.some((a) => a.id === alert.id) ? current : [alert, ...current])))
+    on('alertResolved', ({ id }) => setAlerts((current) => current.filter((a) => a.id !== id)))
+    on('stats', ({ store, totals }) => setStats((current) => ({
+      ...current,
+      ...totals,
+      stores: [...(current.stores || []).filter((s) => s.storeId !== store.storeId), ...(store.storeName ? [store] : [])]
+        .sort((a, b) => a.storeName.localeCompare(b.storeName))
+    })))
+    on('inventoryChanged', () => live.current.activeTab === 'inventory' && live.current.loadInventory())
+    on('alertsChanged', () => live.current.activeTab === 'dashboard' && live.current.loadDashboard())
+    on('reset', reload)
+    return () => source.close()
+  }, [token])
+
   // Effects
   useEffect(() => {
     const savedToken = localStorage.getItem('token')
@@ -283,9 +387,17 @@ const App = () => {
 
   useEffect(() => {
     if (token && activeTab === 'inventory') {
-      loadInventory()
+      const timer = setTimeout(loadInventory, searchTerm ? SEARCH_DEBOUNCE_MS : 0)
+      return () => clearTimeout(timer)
     }
-  }, [searchTerm, filterStore, filterLowStock])
+  }, [searchTerm, filterStore, filterLowStock, inventorySort])
+
+  const firstVisibleRow = Math.max(Math.floor(inventoryScrollTop / INVENTORY_ROW_HEIGHT) - INVENTORY_OVERSCAN, 0)
+  const lastVisibleRow = Math.min(Math.ceil((inventoryScrollTop + INVENTORY_VIEWPORT_HEIGHT) / INVENTORY_ROW_HEIGHT) + INVENTORY_OVERSCAN, inventory.length)
+
+  useEffect(() => {
+    if (inventoryCursor && !loading && lastVisibleRow >= inventory.length - INVENTORY_PREFETCH_ROWS) loadInventory(inventoryCursor)
+  }, [lastVisibleRow, inventoryCursor, loading])
 
   // Not logged in
   if (!token) {
@@ -520,14 +632,24 @@ const App = () => {
                 ) : inventory.length === 0 ? (
                   <p className="text-center py-8 text-muted-foreground">No items found</p>
                 ) : (
-                  <div className="border rounded-lg">
+                  <div
+                    ref={inventoryScroller}
+                    className="border rounded-lg overflow-auto"
+                    style={{ maxHeight: INVENTORY_VIEWPORT_HEIGHT }}
+                    onScroll={(e) => setInventoryScrollTop(e.currentTarget.scrollTop)}
+                  >
                     <Table>
                       <TableHeader>
                         <TableRow>
-                          <TableHead>SKU</TableHead>
-                          <TableHead>Product Name</TableHead>
+                          {['SKU', 'Product Name'].map((label) => (
+                            <TableHead key={label} className="cursor-pointer select-none" onClick={() => sortInventory(SORTABLE_COLUMNS[label])}>
+                              {label}{inventorySort?.field === SORTABLE_COLUMNS[label] ? (inventorySort.order === 'asc' ? ' ▲' : ' ▼') : ''}
+                            </TableHead>
+                          ))}
                           <TableHead>Store</TableHead>
-                          <TableHead className="text-right">Quantity</TableHead>
+                          <TableHead className="text-right cursor-pointer select-none" onClick={() => sortInventory(SORTABLE_COLUMNS.Quantity)}>
+                            Quantity{inventorySort?.field === SORTABLE_COLUMNS.Quantity ? (inventorySort.order === 'asc' ? ' ▲' : ' ▼') : ''}
+                          </TableHead>
                           <TableHead className="text-right">Reorder Level</TableHead>
                           <TableHead className="text-right">Unit Cost</TableHead>
                           <TableHead className="text-right">Total Value</TableHead>
@@ -536,8 +658,9 @@ const App = () => {
                         </TableRow>
                       </TableHeader>
                       <TableBody>
-                        {inventory.map((item) => (
-                          <TableRow key={item.id}>
+                        {firstVisibleRow > 0 && <tr style={{ height: firstVisibleRow * INVENTORY_ROW_HEIGHT }} />}
+                        {inventory.slice(firstVisibleRow, lastVisibleRow).map((item) => (
+                          <TableRow key={item.id} style={{ height: INVENTORY_ROW_HEIGHT }}>
                             <TableCell className="font-medium">{item.sku}</TableCell>
                             <TableCell>{item.productName}</TableCell>
                             <TableCell>{item.storeName}</TableCell>
@@ -593,8 +716,12 @@ const App = () => {
                             </TableCell>
                           </TableRow>
                         ))}
+                        {lastVisibleRow < inventory.length && <tr style={{ height: (inventory.length - lastVisibleRow) * INVENTORY_ROW_HEIGHT }} />}
                       </TableBody>
                     </Table>
+                    {inventoryCursor && (
+                      <p className="text-center text-sm text-muted-foreground p-2 border-t">Loading more…</p>
+                    )}
                   </div>
                 )}
               </CardContent>
@@ -853,12 +980,23 @@ const App = () => {
                 type="file"
                 accept=".csv"
                 onChange={handleFileUpload}
+                disabled={Boolean(importProgress)}
               />
             </div>
+            {importProgress && (
+              <div className="space-y-1">
+                <div className="h-2 w-full overflow-hidden rounded-full bg-primary/20">
+                  <div className="h-full bg-primary transition-all" style={{ width: `${importProgress.totalBytes ? (100 * importProgress.readBytes) / importProgress.totalBytes : 0}%` }} />
+                </div>
+                <p className="text-sm text-muted-foreground">
+                  {importProgress.uploaded} rows uploaded{importProgress.errorCount ? `, ${importProgress.errorCount} with errors` : ''}
+                </p>
+              </div>
+            )}
           </div>
           <DialogFooter>
-            <Button variant="outline" onClick={() => setShowImportDialog(false)}>Cancel</Button>
-            <Button onClick={importInventory} disabled={!csvData || !importStoreId}>Import</Button>
+            <Button variant="outline" onClick={() => { cancelImport(); setShowImportDialog(false) }}>Cancel</Button>
+            <Button onClick={importInventory} disabled={!importFile || !importStoreId || Boolean(importProgress)}>Import</Button>
           </DialogFooter>
         </DialogContent>
       </Dialog>
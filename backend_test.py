@@ -8,10 +8,12 @@ import requests
 import json
 import sys
 import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Get base URL from environment
-BASE_URL = "https://stocktracker-186.preview.emergentagent.com"
+BASE_URL = os.environ.get("BASE_URL", "https://stocktracker-186.preview.emergentagent.com")
 API_BASE = f"{BASE_URL}/api"
 
 # Global variables to store test data
@@ -71,6 +73,31 @@ def make_request(method, endpoint, data=None, headers=None, expect_json=True):
         print(f"    Error: {str(e)}")
         return None, str(e)
 
+def make_request_with_headers(method, endpoint, data=None, headers=None):
+    """Make an authenticated JSON request, returning status, body and response headers"""
+    headers = dict(headers or {})
+    if auth_token:
+        headers["Authorization"] = f"Bearer {auth_token}"
+    try:
+        response = requests.request(method, f"{API_BASE}{endpoint}", json=data, headers=headers)
+        print(f"    Request: {method} {API_BASE}{endpoint}")
+        print(f"    Status: {response.status_code}")
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        return response.status_code, body, response.headers
+    except Exception as e:
+        print(f"    Error: {str(e)}")
+        return None, str(e), {}
+
+def get_item(store_id, item_id):
+    """Current state of an inventory item, read from the store's inventory list"""
+    status, response = make_request("GET", f"/inventory?storeId={store_id}&limit=1000")
+    if status != 200 or "items" not in response:
+        return None
+    return next((item for item in response["items"] if item["id"] == item_id), None)
+
 def test_authentication():
     """Test user registration, login, and token verification"""
     global auth_token, user_data
@@ -514,6 +541,89 @@ def test_edge_cases():
     
     return duplicate_rejected and negative_rejected and unauthorized_rejected
 
+def test_write_contracts():
+    """Test batch modes, Idempotency-Key replay, If-Match preconditions and isolation of concurrent writes"""
+    print("=== 9. WRITE CONTRACT TESTS ===")
+    results = []
+
+    def check(test_name, success, details=""):
+        print_test_result(test_name, success, details)
+        results.append(success)
+
+    keyboard = get_item(downtown_store_id, keyboard_item_id)
+    laptop = get_item(downtown_store_id, laptop_item_id)
+    monitor = get_item(uptown_store_id, monitor_item_id)
+    if not keyboard or not laptop or not monitor:
+        check("Read Test Items", False, f"KEYBOARD001: {keyboard}, LAPTOP001: {laptop}, MONITOR001: {monitor}")
+        return False
+    keyboard_qty, laptop_qty = keyboard["currentQuantity"], laptop["currentQuantity"]
+
+    def keyboard_quantity():
+        item = get_item(downtown_store_id, keyboard_item_id)
+        return item["currentQuantity"] if item else None
+
+    # Atomic batch: one failing line rolls back the whole batch
+    print("Testing atomic batch rollback...")
+    batch = [{"itemId": keyboard_item_id, "quantityChange": 1}, {"itemId": laptop_item_id, "quantityChange": -1000}]
+    status, response = make_request("POST", "/inventory/adjust/batch", {"adjustments": batch, "mode": "atomic"})
+    after = keyboard_quantity()
+    check("Atomic Batch Rollback", status == 400 and isinstance(response, dict) and response.get("committed") is False and after == keyboard_qty,
+          f"Status: {status}, KEYBOARD001 quantity: {after}, Expected: {keyboard_qty}")
+
+    # Best-effort batch: the valid line commits, the failing one is reported
+    print("Testing best-effort batch...")
+    status, response = make_request("POST", "/inventory/adjust/batch", {"adjustments": batch, "mode": "bestEffort"})
+    after = keyboard_quantity()
+    check("Best-Effort Batch Partial Commit", status == 200 and isinstance(response, dict) and response.get("applied") == 1 and response.get("failed") == 1 and after == keyboard_qty + 1,
+          f"Status: {status}, KEYBOARD001 quantity: {after}, Expected: {keyboard_qty + 1}")
+    keyboard_qty += 1
+
+    # Idempotency-Key: a retry is replayed without applying the adjustment again
+    print("Testing Idempotency-Key replay...")
+    key = str(uuid.uuid4())
+    adjust_data = {"itemId": keyboard_item_id, "quantityChange": 2, "changeType": "reorder", "notes": "Idempotent restock"}
+    first_status, first, _ = make_request_with_headers("POST", "/inventory/adjust", adjust_data, {"Idempotency-Key": key})
+    retry_status, retry, retry_headers = make_request_with_headers("POST", "/inventory/adjust", adjust_data, {"Idempotency-Key": key})
+    after = keyboard_quantity()
+    check("Idempotency-Key Replay", first_status == 200 and retry_status == 200 and retry == first and retry_headers.get("Idempotent-Replayed") == "true" and after == keyboard_qty + 2,
+          f"Statuses: {first_status}/{retry_status}, Replayed: {retry_headers.get('Idempotent-Replayed')}, KEYBOARD001 quantity: {after}, Expected: {keyboard_qty + 2}")
+    keyboard_qty += 2
+
+    # The same key with a different request body is refused
+    print("Testing Idempotency-Key reuse...")
+    status, response, _ = make_request_with_headers("POST", "/inventory/adjust", {**adjust_data, "quantityChange": 3}, {"Idempotency-Key": key})
+    check("Idempotency-Key Reuse Rejection", status == 422, f"Status: {status}, Expected: 422")
+
+    # A failed response is not stored: the key is still free for a different, valid request afterwards
+    print("Testing Idempotency-Key after a failed request...")
+    key = str(uuid.uuid4())
+    failed_status, _, _ = make_request_with_headers("POST", "/inventory/adjust", {"itemId": keyboard_item_id, "quantityChange": -1000}, {"Idempotency-Key": key})
+    retry_status, _, retry_headers = make_request_with_headers("POST", "/inventory/adjust", {"itemId": keyboard_item_id, "quantityChange": 1}, {"Idempotency-Key": key})
+    check("Failed Response Not Stored", failed_status == 400 and retry_status == 200 and "Idempotent-Replayed" not in retry_headers,
+          f"Statuses: {failed_status}/{retry_status}, Expected: 400/200 without Idempotent-Replayed")
+    keyboard_qty += 1
+
+    # If-Match: an update against the current version succeeds, a second one against the now stale version gets 412
+    print("Testing If-Match preconditions...")
+    version = monitor["version"]
+    status, _, headers = make_request_with_headers("PUT", f"/inventory/{monitor_item_id}", {"productName": "4K Monitor Pro"}, {"If-Match": f'"{version}"'})
+    check("Current If-Match Update", status == 200 and headers.get("ETag") == f'"{version + 1}"', f"Status: {status}, ETag: {headers.get('ETag')}, Expected: 200 with \"{version + 1}\"")
+    status, _, headers = make_request_with_headers("PUT", f"/inventory/{monitor_item_id}", {"productName": "4K Monitor (stale)"}, {"If-Match": f'"{version}"'})
+    check("Stale If-Match Rejection", status == 412 and headers.get("ETag") == f'"{version + 1}"', f"Status: {status}, ETag: {headers.get('ETag')}, Expected: 412 with \"{version + 1}\"")
+
+    # Concurrent single-item writes (committed together when the server runs with WRITE_COALESCE_MS > 0):
+    # each failing mutation is rolled back alone while the others commit
+    print("Testing isolation of concurrent writes...")
+    requests_to_send = [{"itemId": keyboard_item_id, "quantityChange": 1}, {"itemId": laptop_item_id, "quantityChange": -1000}] * 4
+    with ThreadPoolExecutor(max_workers=len(requests_to_send)) as pool:
+        statuses = list(pool.map(lambda data: make_request_with_headers("POST", "/inventory/adjust", data)[0], requests_to_send))
+    after = keyboard_quantity()
+    laptop = get_item(downtown_store_id, laptop_item_id)
+    check("Concurrent Write Isolation", statuses.count(200) == 4 and statuses.count(400) == 4 and after == keyboard_qty + 4 and laptop is not None and laptop["currentQuantity"] == laptop_qty,
+          f"Statuses: {statuses}, KEYBOARD001 quantity: {after}, Expected: {keyboard_qty + 4}")
+
+    return all(results)
+
 def main():
     """Run all backend tests"""
     print("Starting Comprehensive Backend API Testing")
@@ -533,6 +643,7 @@ def main():
     test_results.append(("Dashboard Statistics", test_dashboard_stats()))
     test_results.append(("CSV Export", test_csv_export()))
     test_results.append(("Edge Cases", test_edge_cases()))
+    test_results.append(("Write Contracts", test_write_contracts()))
     
     # Print final summary
     print("\n" + "=" * 60)
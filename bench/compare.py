@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Compare two bench.run reports, e.g. from the commits before and after a change.
+
+Usage: python -m bench.compare before.json after.json
+"""
+
+import json
+import sys
+
+COLUMNS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(before, after):
+    """Rows of (endpoint, metric, before, after, relative change) for endpoints present in either report"""
+    endpoints = list(dict.fromkeys([*before["endpoints"], *after["endpoints"], "total"]))
+    rows = []
+    for endpoint in endpoints:
+        old = before["total"] if endpoint == "total" else before["endpoints"].get(endpoint, {})
+        new = after["total"] if endpoint == "total" else after["endpoints"].get(endpoint, {})
+        for column in COLUMNS:
+            rows.append((endpoint, column, old.get(column), new.get(column), change(old.get(column), new.get(column))))
+    return rows
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        sys.exit(__doc__.strip())
+    with open(argv[0]) as f:
+        before = json.load(f)
+    with open(argv[1]) as f:
+        after = json.load(f)
+    print(f"before: {before['meta'].get('commit')}  after: {after['meta'].get('commit')}")
+    print(f"{'endpoint':<14}{'metric':<16}{'before':>12}{'after':>12}{'change':>10}")
+    for endpoint, column, old, new, delta in compare(before, after):
+        print(f"{endpoint:<14}{column:<16}{str(old):>12}{str(new):>12}{delta:>10}")
+
+
+if __name__ == "__main__":
+    main()
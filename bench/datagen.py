@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator for load tests.
+
+Writes stores x SKUs x history rows straight into a fresh SQLite file using the
+base tables from lib/db.js. Indexes, the FTS search tables and the storeStats
+counters are left to the server, which builds them on first start.
+
+Usage: python -m bench.datagen --db bench.db --stores 50 --skus 2000 --history 20
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+# Keep in sync with SCHEMA in lib/db.js (tables only).
+SCHEMA = """
+  CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, username TEXT UNIQUE NOT NULL, passwordHash TEXT NOT NULL, role TEXT NOT NULL, createdAt TEXT NOT NULL);
+  CREATE TABLE IF NOT EXISTS stores (id TEXT PRIMARY KEY, name TEXT NOT NULL, location TEXT NOT NULL, contactEmail TEXT, contactPhone TEXT, createdAt TEXT NOT NULL);
+  CREATE TABLE IF NOT EXISTS inventoryItems (id TEXT PRIMARY KEY, sku TEXT NOT NULL, productName TEXT NOT NULL, currentQuantity INTEGER NOT NULL, reorderLevel INTEGER NOT NULL, unitCost REAL NOT NULL DEFAULT 0, storeId TEXT NOT NULL, createdAt TEXT NOT NULL, updatedAt TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0, FOREIGN KEY (storeId) REFERENCES stores(id), UNIQUE(sku, storeId));
+  CREATE TABLE IF NOT EXISTS alerts (id TEXT PRIMARY KEY, itemId TEXT NOT NULL, storeId TEXT NOT NULL, sku TEXT NOT NULL, productName TEXT NOT NULL, currentQuantity INTEGER NOT NULL, reorderLevel INTEGER NOT NULL, alertType TEXT NOT NULL, triggered TEXT NOT NULL, resolved INTEGER NOT NULL DEFAULT 0, resolvedBy TEXT, resolvedAt TEXT, FOREIGN KEY (itemId) REFERENCES inventoryItems(id));
+  CREATE TABLE IF NOT EXISTS inventoryHistory (id TEXT PRIMARY KEY, itemId TEXT NOT NULL, changeType TEXT NOT NULL, quantityChange INTEGER NOT NULL, previousQty INTEGER NOT NULL, newQty INTEGER NOT NULL, userId TEXT, notes TEXT, timestamp TEXT NOT NULL, FOREIGN KEY (itemId) REFERENCES inventoryItems(id));
+"""
+
+CATEGORIES = ["ELEC", "FURN", "STAT", "KITC", "TOOL", "TOYS", "GARD", "SPRT", "BATH", "PETS"]
+ADJECTIVES = ["Wireless", "Compact", "Deluxe", "Ergonomic", "Portable", "Heavy-Duty", "Classic", "Smart", "Organic", "Premium"]
+NOUNS = ["Mouse", "Cable", "Stand", "Chair", "Notebook", "Kettle", "Drill", "Lamp", "Bottle", "Backpack", "Charger", "Shelf"]
+CITIES = ["New York, NY", "Los Angeles, CA", "Chicago, IL", "Houston, TX", "Phoenix, AZ", "Seattle, WA", "Denver, CO", "Boston, MA"]
+
+BATCH_SIZE = 10000
+
+
+def iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}Z"
+
+
+def sku_for(index):
+    """Deterministic SKU so the same index names the same product in every store"""
+    return f"{CATEGORIES[index % len(CATEGORIES)]}-{index:06d}"
+
+
+def product_name(index):
+    return f"{ADJECTIVES[index // len(NOUNS) % len(ADJECTIVES)]} {NOUNS[index % len(NOUNS)]} {index // (len(NOUNS) * len(ADJECTIVES)) + 1}"
+
+
+def history_rows(rng, item_id, final_qty, depth, created, now):
+    """History ending at final_qty: a 'created' row followed by depth-1 sales/receipts spread up to now"""
+    changes = [rng.choice((-1, -1, -2, -3, 5, 10, 20)) for _ in range(max(depth - 1, 0))]
+    qty = max(final_qty - sum(changes), 0)
+    step = (now - created) / max(depth, 1)
+    rows = [(str(uuid.uuid4()), item_id, "created", qty, 0, qty, None, "Generated", iso(created))]
+    for n, change in enumerate(changes, start=1):
+        change = max(change, -qty)
+        rows.append((str(uuid.uuid4()), item_id, "adjustment", change, qty, qty + change, None, "Generated", iso(created + step * n)))
+        qty += change
+    return rows, qty
+
+
+def generate(path, stores=10, skus=1000, history=10, low_stock_ratio=0.1, days=90, seed=42):
+    """Create a fresh database at path and return a summary of what was written"""
+    rng = random.Random(seed)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + SCHEMA)
+    now = datetime.now(timezone.utc)
+    counts = {"stores": 0, "items": 0, "history": 0, "alerts": 0}
+
+    conn.execute("BEGIN")
+    for s in range(stores):
+        store_id = str(uuid.uuid4())
+        conn.execute(
+            "INSERT INTO stores (id, name, location, contactEmail, contactPhone, createdAt) VALUES (?, ?, ?, ?, ?, ?)",
+            (store_id, f"Store {s + 1:04d}", f"{s + 1} Main St, {CITIES[s % len(CITIES)]}", f"store{s + 1}@example.com", f"(555) {s % 1000:03d}-{s % 10000:04d}", iso(now - timedelta(days=days))),
+        )
+        counts["stores"] += 1
+        items, events, alerts = [], [], []
+        for index in range(skus):
+            item_id = str(uuid.uuid4())
+            reorder = rng.randint(5, 50)
+            low = rng.random() < low_stock_ratio
+            target = rng.randint(0, reorder) if low else rng.randint(reorder + 1, reorder * 10)
+            created = now - timedelta(days=days, minutes=rng.randint(0, 1440))
+            rows, qty = history_rows(rng, item_id, target, history, created, now)
+            updated = rows[-1][8]
+            items.append((item_id, sku_for(index), product_name(index), qty, reorder, round(rng.uniform(0.5, 500), 2), store_id, iso(created), updated))
+            events.extend(rows)
+            if qty <= reorder:
+                alerts.append((str(uuid.uuid4()), item_id, store_id, sku_for(index), product_name(index), qty, reorder, "reorder", updated))
+            if len(events) >= BATCH_SIZE:
+                flush(conn, items, events, alerts, counts)
+        flush(conn, items, events, alerts, counts)
+    conn.execute("COMMIT")
+    conn.close()
+    return {"path": path, "seconds": round(time.perf_counter() - started, 2), **counts}
+
+
+def flush(conn, items, events, alerts, counts):
+    conn.executemany("INSERT INTO inventoryItems (id, sku, productName, currentQuantity, reorderLevel, unitCost, storeId, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", items)
+    conn.executemany("INSERT INTO inventoryHistory (id, itemId, changeType, quantityChange, previousQty, newQty, userId, notes, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", events)
+    conn.executemany("INSERT INTO alerts (id, itemId, storeId, sku, productName, currentQuantity, reorderLevel, alertType, triggered, resolved) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)", alerts)
+    counts["items"] += len(items)
+    counts["history"] += len(events)
+    counts["alerts"] += len(alerts)
+    items.clear()
+    events.clear()
+    alerts.clear()
+
+
+def sample_targets(path, limit=5000):
+    """Store ids and an evenly spread, repeatable sample of items for the workloads to pick from"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        stores = [row[0] for row in conn.execute("SELECT id FROM stores ORDER BY name")]
+        total = conn.execute("SELECT COUNT(*) FROM inventoryItems").fetchone()[0]
+        items = conn.execute(
+            "SELECT id, sku, productName, storeId FROM inventoryItems WHERE rowid % ? = 0 ORDER BY rowid LIMIT ?",
+            (max(total // limit, 1), limit),
+        ).fetchall()
+    finally:
+        conn.close()
+    return {"stores": stores, "items": [{"id": i, "sku": s, "productName": p, "storeId": st} for i, s, p, st in items]}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic inventory database")
+    parser.add_argument("--db", default="bench.db", help="output database file (replaced if it exists)")
+    parser.add_argument("--stores", type=int, default=10)
+    parser.add_argument("--skus", type=int, default=1000, help="SKUs per store")
+    parser.add_argument("--history", type=int, default=10, help="history rows per item")
+    parser.add_argument("--low-stock-ratio", type=float, default=0.1)
+    parser.add_argument("--days", type=int, default=90, help="span of generated history")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print(json.dumps(generate(args.db, args.stores, args.skus, args.history, args.low_stock_ratio, args.days, args.seed), indent=2))
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Concurrent load test for the inventory API.
+
+Generates (or reuses) a synthetic database, starts a local Next server on it (or targets --base-url), then runs
+--concurrency asyncio workers over one pooled aiohttp session for --duration seconds, each picking a workload from
+--mix per request. Prints a JSON report with throughput and p50/p95/p99 latency per workload, tagged with the git
+commit so reports from different commits can be diffed with bench.compare.
+
+Usage:
+  python -m bench.run --generate --stores 50 --skus 2000 --history 20 --concurrency 32 --duration 60 --output before.json
+  python -m bench.run --base-url http://localhost:3000 --db inventory.db --mix search=50,adjust=50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import aiohttp
+
+from bench.datagen import generate, sample_targets
+from bench.server import REPO_ROOT, next_server
+from bench.workloads import WORKLOADS, parse_mix
+
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, max(0, int(-(-p * len(sorted_samples) // 100)) - 1))
+    return round(sorted_samples[index], 2)
+
+
+def summarize(samples, elapsed):
+    """Latency percentiles (ms), throughput and status counts for one workload's samples"""
+    latencies = sorted(ms for ms, status, _ in samples if status is not None and status < 400)
+    statuses = defaultdict(int)
+    for _, status, _ in samples:
+        statuses[str(status or "error")] += 1
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(latencies),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        "bytes": sum(size for _, _, size in samples),
+        "statuses": dict(statuses),
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+async def authenticate(session):
+    """Register a throwaway user and return its token"""
+    credentials = {"username": f"bench-{int(time.time() * 1000)}", "password": "bench-password"}
+    async with session.post("/api/auth/register", json=credentials) as response:
+        body = await response.json()
+        if response.status != 200 or "token" not in body:
+            raise RuntimeError(f"Registration failed: {response.status} {body}")
+        return body["token"]
+
+
+async def worker(session, targets, mix, rng, deadline, warmup_until, samples):
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            status, size = await WORKLOADS[name](session, targets, rng)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status, size = None, 0
+        if time.monotonic() >= warmup_until:
+            samples[name].append(((time.perf_counter() - started) * 1000, status, size))
+
+
+async def run_load(base_url, targets, mix, concurrency, duration, warmup, seed, timeout):
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(base_url=base_url, connector=connector, timeout=client_timeout) as session:
+        token = await authenticate(session)
+        session.headers["Authorization"] = f"Bearer {token}"
+        samples = defaultdict(list)
+        started = time.monotonic()
+        warmup_until, deadline = started + warmup, started + warmup + duration
+        await asyncio.gather(*(
+            worker(session, targets, mix, random.Random(seed + n), deadline, warmup_until, samples)
+            for n in range(concurrency)
+        ))
+        elapsed = time.monotonic() - warmup_until
+    all_samples = [sample for workload in samples.values() for sample in workload]
+    return {
+        "endpoints": {name: summarize(samples[name], elapsed) for name in mix if samples[name]},
+        "total": summarize(all_samples, elapsed),
+        "elapsed_seconds": round(elapsed, 2),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test for the inventory API")
+    parser.add_argument("--base-url", help="target an already running server instead of starting one")
+    parser.add_argument("--db", default="bench.db", help="database the server runs on; also sampled for ids")
+    parser.add_argument("--generate", action="store_true", help="(re)generate --db before the run")
+    parser.add_argument("--stores", type=int, default=10)
+    parser.add_argument("--skus", type=int, default=1000, help="SKUs per store")
+    parser.add_argument("--history", type=int, default=10, help="history rows per item")
+    parser.add_argument("--server-mode", choices=("start", "dev"), default="start", help="npm script used to run the server")
+    parser.add_argument("--build", action="store_true", help="run `npm run build` before `npm run start`")
+    parser.add_argument("--port", type=int, default=3100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds of load before measuring starts")
+    parser.add_argument("--mix", help="weighted workloads, e.g. search=40,adjust=30,export=5 (default: a mixed profile)")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mix = parse_mix(args.mix)
+    dataset = None
+    if args.generate:
+        print(f"Generating {args.stores} stores x {args.skus} SKUs x {args.history} history rows into {args.db}...", file=sys.stderr)
+        dataset = generate(args.db, args.stores, args.skus, args.history, seed=args.seed)
+    if not os.path.exists(args.db):
+        sys.exit(f"Database {args.db} not found; pass --generate or point --db at the server's database")
+    targets = sample_targets(args.db)
+    if not targets["items"]:
+        sys.exit(f"Database {args.db} has no inventory items to load test against")
+
+    def load(base_url):
+        return asyncio.run(run_load(base_url, targets, mix, args.concurrency, args.duration, args.warmup, args.seed, args.timeout))
+
+    if args.base_url:
+        base_url, results = args.base_url.rstrip("/"), load(args.base_url.rstrip("/"))
+    else:
+        with next_server(args.db, port=args.port, mode=args.server_mode, build=args.build) as base_url:
+            results = load(base_url)
+
+    report = {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "base_url": base_url,
+            "server_mode": None if args.base_url else args.server_mode,
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "mix": mix,
+            "dataset": dataset or {"path": args.db, "stores": len(targets["stores"])},
+        },
+        **results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Starts a local Next.js server against a given database for the duration of a benchmark run.
+"""
+
+import contextlib
+import os
+import signal
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until_ready(base_url, timeout, process=None):
+    """Poll GET /api until it answers. The first request opens the database and builds the search index and
+    store counters for a freshly generated file, so the timeout has to cover that too."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} before becoming ready")
+        try:
+            with urllib.request.urlopen(f"{base_url}/api", timeout=timeout) as response:
+                if response.status == 200:
+                    return
+        except urllib.error.HTTPError:
+            return
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            time.sleep(0.5)
+    raise TimeoutError(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+@contextlib.contextmanager
+def next_server(db_path, port=3100, mode="start", build=False, log_path="bench-server.log", timeout=300):
+    """Run `npm run <mode>` (start or dev) on localhost:<port> with DB_PATH pointed at db_path; yields the base URL"""
+    env = {**os.environ, "DB_PATH": os.path.abspath(db_path), "NEXT_TELEMETRY_DISABLED": "1"}
+    if mode == "start" and (build or not os.path.isdir(os.path.join(REPO_ROOT, ".next"))):
+        subprocess.run(["npm", "run", "build"], cwd=REPO_ROOT, env=env, check=True)
+
+    base_url = f"http://localhost:{port}"
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            ["npm", "run", mode, "--", "-p", str(port)],
+            cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+        )
+        try:
+            wait_until_ready(base_url, timeout, process)
+            yield base_url
+        finally:
+            # npm spawns next as a child, so signal the whole process group.
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(process.pid, signal.SIGTERM)
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Contention stress test for stock adjustments and versioned item updates.
+
+Starts --servers Next servers on the same database (or targets each --base-url), then has --concurrency asyncio
+workers hammer a handful of hot items for --duration seconds: most requests are POST /inventory/adjust with small
++/- quantity changes, the rest (--put-share) are optimistic read-modify-write updates that bump reorderLevel with
+PUT /inventory/:id and If-Match, refreshing from the 412 body on a conflict. Afterwards the database is checked
+against what the server acknowledged:
+
+  quantity      final currentQuantity == initial + sum of acknowledged quantity changes
+  history       one history row per acknowledged adjustment, with the same sum
+  reorderLevel  final == initial + acknowledged PUTs (no increment lost to a concurrent update)
+  version       final == initial + acknowledged adjustments + acknowledged PUTs
+  responses     newQty - previousQty == quantityChange for every acknowledged adjustment
+
+Requests that fail without a response may or may not have been applied, so any of them makes the check
+inconclusive rather than failed. The report has the same endpoints/total shape as bench.run, so throughput under
+contention can be diffed across commits with bench.compare. Exits non-zero when a check fails. Commits before item
+versioning answer PUT without the updated item, so run them with --put-share 0 (their version check fails).
+
+Usage:
+  python -m bench.stress --generate --servers 2 --hot-items 4 --concurrency 64 --duration 30 --output after.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import aiohttp
+
+from bench.datagen import generate, sample_targets
+from bench.run import authenticate, git_revision, summarize
+from bench.server import next_server
+
+QUANTITY_CHANGES = (-1, -1, -2, 1, 1, 3)
+# Hot items start with enough stock that rejections for insufficient quantity stay rare.
+INITIAL_QUANTITY = 100000
+
+
+def read_items(path, item_ids, tag=None):
+    """Current quantity, reorder level and version of each item, plus history totals for rows noted with `tag`"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        items = {}
+        for item_id in item_ids:
+            quantity, reorder_level, version = conn.execute("SELECT currentQuantity, reorderLevel, version FROM inventoryItems WHERE id = ?", (item_id,)).fetchone()
+            events, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(quantityChange), 0) FROM inventoryHistory WHERE itemId = ? AND notes = ?", (item_id, tag)).fetchone()
+            items[item_id] = {"quantity": quantity, "reorderLevel": reorder_level, "version": version, "historyEvents": events, "historySum": total}
+        return items
+    finally:
+        conn.close()
+
+
+def prepare_hot_items(path, item_ids):
+    """Give the hot items plenty of stock. Written directly, before the servers open the database."""
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.executemany("UPDATE inventoryItems SET currentQuantity = ? WHERE id = ?", [(INITIAL_QUANTITY, item_id) for item_id in item_ids])
+    finally:
+        conn.close()
+
+
+class Ledger:
+    """What the servers acknowledged, per item"""
+
+    def __init__(self, items):
+        self.applied = defaultdict(int)
+        self.adjustments = defaultdict(int)
+        self.puts = defaultdict(int)
+        self.known = {item_id: {"version": state["version"], "reorderLevel": state["reorderLevel"]} for item_id, state in items.items()}
+        self.mismatched_responses = 0
+        self.conflicts = 0
+        self.rejected = 0
+        self.unknown = 0
+
+
+async def adjust(session, item_id, rng, tag, ledger):
+    change = rng.choice(QUANTITY_CHANGES)
+    async with session.post("/api/inventory/adjust", json={"itemId": item_id, "quantityChange": change, "notes": tag}) as response:
+        body = await response.read()
+        if response.status == 200:
+            result = json.loads(body)
+            ledger.applied[item_id] += change
+            ledger.adjustments[item_id] += 1
+            if result["newQty"] - result["previousQty"] != change:
+                ledger.mismatched_responses += 1
+        elif response.status == 400:
+            ledger.rejected += 1
+        return response.status, len(body)
+
+
+async def put(session, item_id, ledger):
+    known = ledger.known[item_id]
+    headers = {"If-Match": f'"{known["version"]}"'}
+    async with session.put(f"/api/inventory/{item_id}", json={"reorderLevel": known["reorderLevel"] + 1}, headers=headers) as response:
+        body = await response.read()
+        if response.status == 200:
+            ledger.puts[item_id] += 1
+            item = json.loads(body)["item"]
+            ledger.known[item_id] = {"version": item["version"], "reorderLevel": item["reorderLevel"]}
+        elif response.status == 412:
+            ledger.conflicts += 1
+            item = json.loads(body)["item"]
+            ledger.known[item_id] = {"version": item["version"], "reorderLevel": item["reorderLevel"]}
+        return response.status, len(body)
+
+
+async def worker(session, item_ids, put_share, rng, tag, deadline, ledger, samples):
+    while time.monotonic() < deadline:
+        item_id = rng.choice(item_ids)
+        name = "put" if rng.random() < put_share else "adjust"
+        started = time.perf_counter()
+        try:
+            status, size = await (put(session, item_id, ledger) if name == "put" else adjust(session, item_id, rng, tag, ledger))
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status, size = None, 0
+            ledger.unknown += 1
+        samples[name].append(((time.perf_counter() - started) * 1000, status, size))
+
+
+async def run_stress(base_urls, item_ids, items, concurrency, duration, put_share, seed, timeout, tag):
+    ledger = Ledger(items)
+    samples = defaultdict(list)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with contextlib.AsyncExitStack() as stack:
+        sessions = []
+        for base_url in base_urls:
+            connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+            sessions.append(await stack.enter_async_context(aiohttp.ClientSession(base_url=base_url, connector=connector, timeout=client_timeout)))
+        token = await authenticate(sessions[0])
+        for session in sessions:
+            session.headers["Authorization"] = f"Bearer {token}"
+        started = time.monotonic()
+        await asyncio.gather(*(
+            worker(sessions[n % len(sessions)], item_ids, put_share, random.Random(seed + n), tag, started + duration, ledger, samples)
+            for n in range(concurrency)
+        ))
+        elapsed = time.monotonic() - started
+    all_samples = [sample for workload in samples.values() for sample in workload]
+    return ledger, {
+        "endpoints": {name: summarize(samples[name], elapsed) for name in ("adjust", "put") if samples[name]},
+        "total": summarize(all_samples, elapsed),
+        "elapsed_seconds": round(elapsed, 2),
+    }
+
+
+def verify(initial, final, ledger):
+    """Per-item expected vs. actual values; `ok` is None when unacknowledged requests make the result inconclusive"""
+    items, failed = {}, False
+    for item_id, before in initial.items():
+        after = final[item_id]
+        expected = {
+            "quantity": before["quantity"] + ledger.applied[item_id],
+            "historyEvents": ledger.adjustments[item_id],
+            "historySum": ledger.applied[item_id],
+            "reorderLevel": before["reorderLevel"] + ledger.puts[item_id],
+            "version": before["version"] + ledger.adjustments[item_id] + ledger.puts[item_id],
+        }
+        mismatches = {key: {"expected": value, "actual": after[key]} for key, value in expected.items() if after[key] != value}
+        failed = failed or bool(mismatches)
+        items[item_id] = {"adjustments": ledger.adjustments[item_id], "puts": ledger.puts[item_id], "lostQuantity": expected["quantity"] - after["quantity"], "mismatches": mismatches}
+    failed = failed or ledger.mismatched_responses > 0
+    return {
+        "ok": None if ledger.unknown else not failed,
+        "unacknowledged": ledger.unknown,
+        "mismatchedResponses": ledger.mismatched_responses,
+        "rejectedAdjustments": ledger.rejected,
+        "versionConflicts": ledger.conflicts,
+        "items": items,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Contention stress test for adjustments and versioned updates")
+    parser.add_argument("--base-url", action="append", help="target an already running server (repeat for several); needs --db pointing at its database")
+    parser.add_argument("--db", default="bench.db", help="database the servers run on; read directly before and after the run")
+    parser.add_argument("--generate", action="store_true", help="(re)generate --db before the run")
+    parser.add_argument("--stores", type=int, default=2)
+    parser.add_argument("--skus", type=int, default=200, help="SKUs per store")
+    parser.add_argument("--history", type=int, default=2, help="history rows per item")
+    parser.add_argument("--servers", type=int, default=2, help="server processes to start on consecutive ports")
+    parser.add_argument("--server-mode", choices=("start", "dev"), default="start", help="npm script used to run the servers")
+    parser.add_argument("--build", action="store_true", help="run `npm run build` before `npm run start`")
+    parser.add_argument("--port", type=int, default=3100, help="port of the first server")
+    parser.add_argument("--hot-items", type=int, default=4, help="items all workers contend on")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--put-share", type=float, default=0.2, help="fraction of requests that are If-Match updates")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    dataset = None
+    if args.generate:
+        print(f"Generating {args.stores} stores x {args.skus} SKUs x {args.history} history rows into {args.db}...", file=sys.stderr)
+        dataset = generate(args.db, args.stores, args.skus, args.history, seed=args.seed)
+    if not os.path.exists(args.db):
+        sys.exit(f"Database {args.db} not found; pass --generate or point --db at the servers' database")
+    item_ids = [item["id"] for item in sample_targets(args.db, limit=args.hot_items)["items"]][:args.hot_items]
+    if not item_ids:
+        sys.exit(f"Database {args.db} has no inventory items to stress")
+    tag = f"stress-{int(time.time() * 1000)}"
+
+    def stress(base_urls):
+        initial = read_items(args.db, item_ids)
+        ledger, results = asyncio.run(run_stress(base_urls, item_ids, initial, args.concurrency, args.duration, args.put_share, args.seed, args.timeout, tag))
+        return results, verify(initial, read_items(args.db, item_ids, tag), ledger)
+
+    if args.base_url:
+        base_urls = [url.rstrip("/") for url in args.base_url]
+        results, verification = stress(base_urls)
+    else:
+        prepare_hot_items(args.db, item_ids)
+        with contextlib.ExitStack() as stack:
+            # Started one after another, so only the first one builds.
+            base_urls = [
+                stack.enter_context(next_server(args.db, port=args.port + n, mode=args.server_mode, build=args.build and n == 0, log_path="bench-server.log" if n == 0 else f"bench-server-{n}.log"))
+                for n in range(args.servers)
+            ]
+            results, verification = stress(base_urls)
+
+    report = {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "base_urls": base_urls,
+            "server_mode": None if args.base_url else args.server_mode,
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "hot_items": len(item_ids),
+            "put_share": args.put_share,
+            "dataset": dataset or {"path": args.db},
+        },
+        **results,
+        "verification": verification,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if verification["ok"] is False:
+        sys.exit("Lost or inconsistent updates detected, see verification in the report")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Request mixes for the load test. Each workload issues one API call through the shared session and returns the
+response status and body size; timing and bookkeeping happen in bench.run.
+"""
+
+import itertools
+import json
+
+DEFAULT_MIX = {"search": 30, "browse": 15, "adjust": 25, "adjust_batch": 5, "dashboard": 10, "alerts": 5, "export": 5, "import": 5}
+
+BATCH_LINES = 20
+IMPORT_ROWS = 200
+
+_import_runs = itertools.count(1)
+
+
+async def call(session, method, path, **kwargs):
+    async with session.request(method, f"/api{path}", **kwargs) as response:
+        body = await response.read()
+        return response.status, len(body)
+
+
+async def search(session, targets, rng):
+    item = rng.choice(targets["items"])
+    # A whole word or a prefix of one, from any word of the name (which may be a single word, or empty).
+    words = item["productName"].split() or [item["sku"]]
+    term = rng.choice((item["sku"][:7], rng.choice(words), rng.choice(words)[:4]))
+    params = {"search": term, "limit": "50"}
+    if rng.random() < 0.1:
+        params["fuzzy"] = "true"
+    return await call(session, "GET", "/inventory", params=params)
+
+
+async def browse(session, targets, rng):
+    params = {"storeId": rng.choice(targets["stores"]), "limit": "100"}
+    if rng.random() < 0.2:
+        params["lowStock"] = "true"
+    return await call(session, "GET", "/inventory", params=params)
+
+
+async def adjust(session, targets, rng):
+    item = rng.choice(targets["items"])
+    body = {"itemId": item["id"], "quantityChange": rng.choice((-1, -1, -2, 1, 5)), "notes": "bench"}
+    return await call(session, "POST", "/inventory/adjust", json=body)
+
+
+async def adjust_batch(session, targets, rng):
+    lines = [{"itemId": item["id"], "quantityChange": rng.choice((-1, 1, 2)), "notes": "bench"} for item in rng.sample(targets["items"], min(BATCH_LINES, len(targets["items"])))]
+    return await call(session, "POST", "/inventory/adjust/batch", json={"adjustments": lines, "mode": "bestEffort"})
+
+
+async def dashboard(session, targets, rng):
+    params = {"storeId": rng.choice(targets["stores"])} if rng.random() < 0.5 else None
+    return await call(session, "GET", "/dashboard/stats", params=params)
+
+
+async def alerts(session, targets, rng):
+    return await call(session, "GET", "/alerts", params={"resolved": "false"})
+
+
+async def export(session, targets, rng):
+    return await call(session, "GET", "/inventory/export", params={"storeId": rng.choice(targets["stores"])})
+
+
+async def import_csv(session, targets, rng):
+    """Upsert a CSV that updates existing SKUs of one store and adds new ones, streamed as text/csv"""
+    store_id = rng.choice(targets["stores"])
+    existing = [item for item in targets["items"] if item["storeId"] == store_id][: IMPORT_ROWS // 2]
+    run = next(_import_runs)
+    rows = [(item["sku"], item["productName"]) for item in existing]
+    rows += [(f"BENCH-{run:05d}-{n:04d}", f"Bench Product {run}-{n}") for n in range(IMPORT_ROWS - len(rows))]
+    lines = ["SKU,Product Name,Current Quantity,Reorder Level,Unit Cost"]
+    lines += [f"{sku},{json.dumps(name)},{rng.randint(0, 500)},{rng.randint(5, 50)},{rng.uniform(1, 200):.2f}" for sku, name in rows]
+    return await call(
+        session, "POST", "/inventory/import",
+        params={"storeId": store_id, "mode": "upsert"}, data="\n".join(lines).encode(), headers={"Content-Type": "text/csv"},
+    )
+
+
+WORKLOADS = {
+    "search": search,
+    "browse": browse,
+    "adjust": adjust,
+    "adjust_batch": adjust_batch,
+    "dashboard": dashboard,
+    "alerts": alerts,
+    "export": export,
+    "import": import_csv,
+}
+
+
+def parse_mix(spec):
+    """'search=40,adjust=30' -> {'search': 40, 'adjust': 30}; unknown names are rejected"""
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in WORKLOADS:
+            raise ValueError(f"Unknown workload '{name}', expected one of: {', '.join(WORKLOADS)}")
+        mix[name] = float(weight or 1)
+    return mix
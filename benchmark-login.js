@@ -0,0 +1,44 @@
+// Fires CONCURRENCY simultaneous logins for ROUNDS rounds against a running server while probing a cheap
+// authenticated GET, and reports login and probe latency percentiles. Usage: node benchmark-login.js [baseUrl]
+const BASE_URL = process.argv[2] || process.env.BASE_URL || 'http://localhost:3000';
+const CONCURRENCY = Number(process.env.CONCURRENCY) || 50, ROUNDS = Number(process.env.ROUNDS) || 5;
+
+const percentile = (sorted, p) => sorted[Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1)];
+const summarize = (samples) => {
+  const sorted = [...samples].sort((a, b) => a - b);
+  return { count: sorted.length, p50: percentile(sorted, 50), p95: percentile(sorted, 95), p99: percentile(sorted, 99), max: sorted[sorted.length - 1] };
+};
+
+async function timed(url, options) {
+  const started = performance.now();
+  const response = await fetch(url, options);
+  await response.arrayBuffer();
+  return { ms: performance.now() - started, status: response.status };
+}
+
+async function benchmark() {
+  const credentials = { username: `bench-${Date.now()}`, password: 'bench-password' };
+  const registered = await fetch(`${BASE_URL}/api/auth/register`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(credentials) }).then(r => r.json());
+  if (!registered.token) throw new Error(`Registration failed: ${JSON.stringify(registered)}`);
+  const login = () => timed(`${BASE_URL}/api/auth/login`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(credentials) });
+  const probe = () => timed(`${BASE_URL}/api/stores`, { headers: { Authorization: `Bearer ${registered.token}` } });
+
+  const logins = [], probes = [], failures = {};
+  for (let round = 0; round < ROUNDS; round++) {
+    let storming = true;
+    const probing = (async () => { while (storming) probes.push((await probe()).ms); })();
+    const results = await Promise.all(Array.from({ length: CONCURRENCY }, login));
+    storming = false;
+    await probing;
+    for (const { ms, status } of results) {
+      if (status === 200) logins.push(ms);
+      else failures[status] = (failures[status] || 0) + 1;
+    }
+  }
+  console.log(JSON.stringify({ baseUrl: BASE_URL, concurrency: CONCURRENCY, rounds: ROUNDS, loginMs: summarize(logins), probeDuringStormMs: summarize(probes), failures }, null, 2));
+}
+
+benchmark().catch(error => {
+  console.error('Error running login benchmark:', error);
+  process.exit(1);
+});
@@ -0,0 +1,31 @@
+import Database from 'better-sqlite3';
+import path from 'path';
+import { HISTORY_RETENTION_DAYS, compactHistory, ensureHistoryRollups } from './lib/history.js';
+
+// Usage: node compact-history.js [db] [olderThanDays] [--vacuum]
+const args = process.argv.slice(2).filter(arg => arg !== '--vacuum');
+const DB_PATH = args[0] || path.join(process.cwd(), 'inventory.db');
+const OLDER_THAN_DAYS = args[1] !== undefined ? Number(args[1]) : HISTORY_RETENTION_DAYS;
+const db = new Database(DB_PATH);
+
+function compact() {
+  console.log(`🗜  Compacting history older than ${OLDER_THAN_DAYS} days in ${DB_PATH}...`);
+  const started = Date.now();
+  db.pragma('busy_timeout = 5000');
+  ensureHistoryRollups(db);
+  const { compacted, batches, cutoff } = compactHistory(db, { olderThanDays: OLDER_THAN_DAYS });
+  console.log(`✓ Rolled ${compacted} events before ${cutoff} into daily summaries in ${batches} batches (${Date.now() - started} ms)`);
+  if (process.argv.includes('--vacuum')) {
+    db.exec('VACUUM');
+    console.log('✓ Vacuumed database file');
+  }
+  db.close();
+}
+
+try {
+  compact();
+} catch (error) {
+  console.error('Error compacting history:', error);
+  db.close();
+  process.exit(1);
+}
@@ -0,0 +1,52 @@
+import { v4 as uuidv4 } from 'uuid';
+import { evaluateAlerts } from './alerts.js';
+import { publishItems } from './events.js';
+import { prepareCached, writeTransaction } from './statements.js';
+
+export const MAX_BATCH_ADJUSTMENTS = 10000;
+
+// Applies a batch of stock adjustments ({ itemId | sku + storeId, quantityChange, changeType, notes }) in one
+// transaction, each line in its own savepoint. With `atomic`, any failing line rolls back the whole batch; otherwise
+// failing lines are reported and the rest commit. Reorder alerts are evaluated once per touched item.
+export function applyAdjustments(db, adjustments, { userId, atomic = true }) {
+  const findBySku = prepareCached(db, 'SELECT id FROM inventoryItems WHERE sku = ? AND storeId = ?');
+  const itemExists = prepareCached(db, 'SELECT 1 FROM inventoryItems WHERE id = ?');
+  const adjust = prepareCached(db, 'UPDATE inventoryItems SET currentQuantity = currentQuantity + ?, updatedAt = ?, version = version + 1 WHERE id = ? AND currentQuantity + ? >= 0 RETURNING currentQuantity, version');
+  const recordHistory = prepareCached(db, 'INSERT INTO inventoryHistory (id, itemId, changeType, quantityChange, previousQty, newQty, userId, notes, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)');
+
+  const applyLine = db.transaction((line, now) => {
+    if (!line || (!line.itemId && !(line.sku && line.storeId))) throw new Error('Item ID or SKU and store ID required');
+    const quantityChange = Number(line.quantityChange);
+    if (line.quantityChange === undefined || !Number.isFinite(quantityChange)) throw new Error('Quantity change required');
+    const itemId = line.itemId || findBySku.get(line.sku, line.storeId)?.id;
+    const updated = itemId ? adjust.get(quantityChange, now, itemId, quantityChange) : null;
+    if (!updated) throw new Error(itemId && itemExists.get(itemId) ? 'Insufficient quantity' : 'Item not found');
+    const previousQty = updated.currentQuantity - quantityChange, newQty = updated.currentQuantity;
+    recordHistory.run(uuidv4(), itemId, line.changeType || 'adjustment', quantityChange, previousQty, newQty, userId, line.notes || '', now);
+    return { itemId, previousQty, newQty, version: updated.version };
+  });
+
+  const applyBatch = writeTransaction(db, () => {
+    const now = new Date().toISOString();
+    const results = adjustments.map((line, index) => {
+      try {
+        return { index, ...applyLine(line, now) };
+      } catch (error) {
+        return { index, error: error.message };
+      }
+    });
+    const failed = results.filter(result => result.error).length;
+    if (atomic && failed > 0) throw Object.assign(new Error('Batch rejected'), { errors: results.filter(result => result.error) });
+    const itemIds = new Set(results.filter(result => !result.error).map(result => result.itemId));
+    const alerts = evaluateAlerts(db, { itemIds });
+    publishItems(db, itemIds);
+    return { committed: true, applied: results.length - failed, failed, alertsCreated: alerts.created, alertsResolved: alerts.resolved, results };
+  });
+
+  try {
+    return applyBatch();
+  } catch (error) {
+    if (!error.errors) throw error;
+    return { committed: false, applied: 0, failed: error.errors.length, errors: error.errors };
+  }
+}
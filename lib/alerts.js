@@ -0,0 +1,67 @@
+import { publish } from './events.js';
+import { STOCKOUT_ALERT_DAYS, projectedStockoutCondition } from './forecast.js';
+import { prepareCached, writeTransaction } from './statements.js';
+
+// Set-based reorder alert engine. evaluateAlerts re-evaluates a scope of items with two statements in one transaction:
+// one UPDATE resolves open alerts whose item is back above its reorder level, one INSERT ... SELECT opens an alert for
+// every low-stock item without one. A partial unique index guarantees at most one open alert per item, even with
+// several processes writing the same database. With STOCKOUT_ALERT_DAYS > 0, an item whose sales velocity projects a
+// stockout within that many days is treated as low too (alertType 'stockout' while still above its reorder level).
+
+// Above this many alert changes in one evaluation, subscribers get a single alertsChanged event instead of one each.
+const MAX_ALERT_EVENTS = 500;
+
+const ALERTS_SCHEMA = `CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_one_open ON alerts(itemId) WHERE resolved = 0`;
+
+// Random version 4 UUID in the same format as uuid's v4(), generated per row inside INSERT ... SELECT.
+const UUID_SQL = `lower(hex(randomblob(4)) || '-' || hex(randomblob(2)) || '-4' || substr(hex(randomblob(2)), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(hex(randomblob(2)), 2) || '-' || hex(randomblob(6)))`;
+
+// Creates the one-open-alert-per-item index, first resolving duplicates (keeping the newest) that older versions could
+// leave behind.
+export function ensureAlertIndex(db) {
+  if (db.prepare("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_alerts_one_open'").get()) return;
+  writeTransaction(db, () => {
+    prepareCached(db, `UPDATE alerts SET resolved = 1, resolvedBy = 'system', resolvedAt = ? WHERE resolved = 0 AND rowid NOT IN (SELECT MAX(rowid) FROM alerts WHERE resolved = 0 GROUP BY itemId)`).run(new Date().toISOString());
+    db.exec(ALERTS_SCHEMA);
+  })();
+}
+
+// Item-side conditions for a scope: explicit `itemIds`, or every item of `storeId` (optionally only those updated
+// since `updatedSince`), or the whole catalog when neither is given.
+function itemScope({ itemIds, storeId, updatedSince }) {
+  if (itemIds) return { sql: ' AND i.id IN (SELECT value FROM json_each(?))', params: [JSON.stringify([...itemIds])] };
+  let sql = '';
+  const params = [];
+  if (storeId) { sql += ' AND i.storeId = ?'; params.push(storeId); }
+  if (updatedSince) { sql += ' AND i.updatedAt >= ?'; params.push(updatedSince); }
+  return { sql, params };
+}
+
+export function evaluateAlerts(db, { itemIds, storeId, updatedSince } = {}) {
+  const now = new Date().toISOString(), scope = itemScope({ itemIds, storeId, updatedSince });
+  // Explicit ids probe their alerts by itemId; store and catalog sweeps walk the open alerts instead of every item.
+  const resolveFilter = itemIds ? ' AND itemId IN (SELECT value FROM json_each(?))' : '', resolveItemCondition = itemIds ? '' : scope.sql;
+  const projected = STOCKOUT_ALERT_DAYS > 0 ? projectedStockoutCondition(now.slice(0, 10), STOCKOUT_ALERT_DAYS) : { sql: '', params: [] };
+  return writeTransaction(db, () => {
+    const resolved = prepareCached(db, `
+      UPDATE alerts SET resolved = 1, resolvedAt = ?, resolvedBy = 'system'
+      WHERE resolved = 0${resolveFilter} AND EXISTS (SELECT 1 FROM inventoryItems i WHERE i.id = alerts.itemId AND i.currentQuantity > i.reorderLevel${projected.sql && ` AND NOT ${projected.sql}`}${resolveItemCondition})
+      RETURNING id, itemId, storeId, resolvedBy, resolvedAt
+    `).all(now, ...(itemIds ? [...scope.params, ...projected.params] : [...projected.params, ...scope.params]));
+    const created = prepareCached(db, `
+      INSERT INTO alerts (id, itemId, storeId, sku, productName, currentQuantity, reorderLevel, alertType, triggered, resolved)
+      SELECT ${UUID_SQL}, i.id, i.storeId, i.sku, i.productName, i.currentQuantity, i.reorderLevel, CASE WHEN i.currentQuantity <= i.reorderLevel THEN 'reorder' ELSE 'stockout' END, ?, 0 FROM inventoryItems i
+      WHERE (i.currentQuantity <= i.reorderLevel${projected.sql && ` OR ${projected.sql}`})${scope.sql} AND NOT EXISTS (SELECT 1 FROM alerts a WHERE a.itemId = i.id AND a.resolved = 0)
+      ON CONFLICT DO NOTHING
+      RETURNING *
+    `).all(now, ...projected.params, ...scope.params);
+    if (created.length + resolved.length > MAX_ALERT_EVENTS) {
+      publish('alertsChanged', { created: created.length, resolved: resolved.length });
+    } else {
+      const storeName = prepareCached(db, 'SELECT name FROM stores WHERE id = ?');
+      for (const alert of resolved) publish('alertResolved', alert);
+      for (const alert of created) publish('alert', { ...alert, resolved: false, storeName: storeName.get(alert.storeId)?.name || 'Unknown' });
+    }
+    return { created: created.length, resolved: resolved.length };
+  })();
+}
@@ -0,0 +1,132 @@
+import Database from 'better-sqlite3';
+import fs from 'fs';
+import path from 'path';
+import { recordBackup, recordBackupProgress } from './metrics.js';
+
+// Online snapshots through SQLite's backup API. Each database file (the main one, plus every shard when sharded) is
+// copied BACKUP_PAGES_PER_STEP pages at a time, yielding to the event loop between steps, so requests keep being served
+// and writers only wait for one step. Pages changed through the same connection during the copy are carried over;
+// writes from another process restart it. A snapshot is a directory holding one file per database and a
+// manifest.json. It is built under a .partial name, each copy switched to a rollback journal (a single self-contained
+// file) and checked with quick_check, and only then renamed into place, so a listed snapshot is always complete.
+// Snapshots of several files are each consistent but not taken at the same instant, like writes across shards.
+
+export const BACKUP_DIR = process.env.BACKUP_DIR || null;
+export const BACKUP_INTERVAL_MINUTES = Number(process.env.BACKUP_INTERVAL_MINUTES) || 0;
+export const BACKUP_KEEP = Number(process.env.BACKUP_KEEP) || 7;
+const BACKUP_PAGES_PER_STEP = Number(process.env.BACKUP_PAGES_PER_STEP) || 256;
+const MANIFEST = 'manifest.json', PARTIAL_SUFFIX = '.partial';
+
+let running = null, lastSnapshot = null, lastError = null;
+
+const snapshotName = () => new Date().toISOString().replace(/[:.]/g, '-');
+
+// Switches a finished copy to a rollback journal and checks it. Returns its size and the number of items it holds.
+function verifyCopy(file) {
+  const copy = new Database(file, { fileMustExist: true });
+  try {
+    copy.pragma('journal_mode = DELETE');
+    const result = copy.pragma('quick_check', { simple: true });
+    if (result !== 'ok') throw new Error(`${path.basename(file)} failed quick_check: ${result}`);
+    const items = copy.prepare("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'inventoryItems'").get() ? copy.prepare('SELECT COUNT(*) AS count FROM inventoryItems').get().count : 0;
+    return { bytes: fs.statSync(file).size, items };
+  } finally {
+    copy.close();
+  }
+}
+
+// `pagesPerStep` 0 copies the rest of the file in one step, which another process's writes cannot restart.
+async function copyDatabase(connection, file, pagesPerStep) {
+  const started = performance.now(), name = path.basename(file);
+  const { totalPages } = await connection.backup(file, {
+    progress: ({ totalPages, remainingPages }) => {
+      recordBackupProgress(name, totalPages, remainingPages);
+      return pagesPerStep || remainingPages;
+    }
+  });
+  return { file: name, pages: totalPages, ...verifyCopy(file), durationMs: Math.round(performance.now() - started) };
+}
+
+// Snapshots `connections` (each saved under its own file name) into a new directory of `dir`, then keeps only the
+// newest `keep` snapshots there. Only one snapshot runs at a time; a call while one is running gets that one.
+export function createSnapshot(connections, { dir = BACKUP_DIR, keep = BACKUP_KEEP, pagesPerStep = BACKUP_PAGES_PER_STEP } = {}) {
+  if (!dir) return Promise.reject(new Error('BACKUP_DIR is not set'));
+  if (running) return running;
+  const started = performance.now(), name = snapshotName(), target = path.join(dir, name + PARTIAL_SUFFIX);
+  running = (async () => {
+    try {
+      fs.mkdirSync(target, { recursive: true });
+      const databases = [];
+      for (const connection of connections) databases.push(await copyDatabase(connection, path.join(target, path.basename(connection.name)), pagesPerStep));
+      const manifest = { name, createdAt: new Date().toISOString(), databases, bytes: databases.reduce((sum, database) => sum + database.bytes, 0), durationMs: Math.round(performance.now() - started) };
+      fs.writeFileSync(path.join(target, MANIFEST), JSON.stringify(manifest, null, 2));
+      fs.renameSync(target, path.join(dir, name));
+      // The snapshot is complete at this point; failing to delete old ones does not make it a failed backup.
+      try {
+        rotateSnapshots(dir, keep, target);
+      } catch (error) {
+        console.error(`Rotating snapshots in ${dir} failed:`, error);
+      }
+      recordBackup({ ok: true, durationMs: manifest.durationMs, bytes: manifest.bytes });
+      lastSnapshot = manifest; lastError = null;
+      return manifest;
+    } catch (error) {
+      fs.rmSync(target, { recursive: true, force: true });
+      recordBackup({ ok: false, durationMs: performance.now() - started });
+      lastError = { message: error.message, at: new Date().toISOString() };
+      throw error;
+    } finally {
+      running = null;
+    }
+  })();
+  return running;
+}
+
+// Complete snapshots in `dir`, newest first.
+export function listSnapshots(dir = BACKUP_DIR) {
+  if (!dir || !fs.existsSync(dir)) return [];
+  return fs.readdirSync(dir)
+    .filter(name => fs.existsSync(path.join(dir, name, MANIFEST)))
+    .sort().reverse()
+    .map(name => JSON.parse(fs.readFileSync(path.join(dir, name, MANIFEST), 'utf8')));
+}
+
+// Deletes all but the newest `keep` snapshots, and partial ones left behind by an interrupted run (other than
+// `inProgress`, the .partial directory of a snapshot still being written).
+export function rotateSnapshots(dir = BACKUP_DIR, keep = BACKUP_KEEP, inProgress = null) {
+  const removed = listSnapshots(dir).slice(keep).map(snapshot => snapshot.name);
+  removed.push(...fs.readdirSync(dir).filter(name => name.endsWith(PARTIAL_SUFFIX) && name !== path.basename(inProgress || '')));
+  for (const name of removed) fs.rmSync(path.join(dir, name), { recursive: true, force: true });
+  return removed;
+}
+
+export function backupStatus() {
+  return { running: Boolean(running), lastSnapshot, lastError };
+}
+
+// Copies every database of a snapshot into `targetDir`, which must not already hold them, and checks the copies.
+// Uses copy-on-write clones where the filesystem supports them, so even large snapshots restore in seconds.
+export function restoreSnapshot(snapshotDir, targetDir) {
+  const manifest = JSON.parse(fs.readFileSync(path.join(snapshotDir, MANIFEST), 'utf8'));
+  fs.mkdirSync(targetDir, { recursive: true });
+  for (const { file } of manifest.databases) {
+    if (fs.existsSync(path.join(targetDir, file))) throw new Error(`${path.join(targetDir, file)} already exists`);
+  }
+  return manifest.databases.map(({ file, items }) => {
+    const target = path.join(targetDir, file);
+    fs.copyFileSync(path.join(snapshotDir, file), target, fs.constants.COPYFILE_FICLONE);
+    const restored = verifyCopy(target);
+    if (restored.items !== items) throw new Error(`${file} restored with ${restored.items} items, the snapshot has ${items}`);
+    return { file, ...restored };
+  });
+}
+
+// Takes a snapshot of `connections()` every BACKUP_INTERVAL_MINUTES when BACKUP_DIR is set.
+export function scheduleBackups(connections) {
+  if (!BACKUP_DIR || BACKUP_INTERVAL_MINUTES <= 0) return;
+  setInterval(() => {
+    createSnapshot(connections())
+      .then(snapshot => console.log(`Backed up ${snapshot.databases.length} databases (${snapshot.bytes} bytes) to ${path.join(BACKUP_DIR, snapshot.name)} in ${snapshot.durationMs} ms`))
+      .catch(error => console.error('Backup failed:', error));
+  }, BACKUP_INTERVAL_MINUTES * 60 * 1000).unref();
+}
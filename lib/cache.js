@@ -0,0 +1,109 @@
+// Versioned read cache for list endpoints. Every table has an in-process version counter that prepared write
+// statements bump (see statements.js), and PRAGMA data_version catches writes made by other connections or processes
+// (CLI scripts). A cached response is keyed by path and query and stamped with the versions of the tables it read, so it
+// is reused until one of them changes. The same stamp is the ETag: a matching If-None-Match is answered with 304 after
+// a version check alone, without touching the cache or running a query. Bodies are compressed with brotli or gzip as the
+// client accepts, once per cached entry and encoding, so repeated requests pay neither serialization nor compression;
+// each encoding's bytes get their own strong ETag, the stamp suffixed with the encoding. Writes that bypass prepareCached
+// (db.exec, directly prepared statements) cannot be attributed to a table and bump a write epoch that is part of every
+// stamp instead (see trackWrites in statements.js).
+
+import zlib from 'zlib';
+
+const MAX_ENTRIES = 500, MAX_CACHED_CHARS = 32 * 1024 * 1024, MIN_COMPRESSED_CHARS = 1024;
+
+// In order of preference. Brotli at quality 4 compresses JSON better than gzip at about the same speed.
+const ENCODERS = {
+  br: (body) => zlib.brotliCompressSync(body, { params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 4, [zlib.constants.BROTLI_PARAM_SIZE_HINT]: body.length } }),
+  gzip: (body) => zlib.gzipSync(body, { level: 6 })
+};
+
+const ENCODING_SUFFIX = new RegExp(`-(?:${Object.keys(ENCODERS).join('|')})"$`);
+
+// Distinguishes this process's counters from those of a previous run, so ETags never collide across restarts.
+const BOOT_ID = Date.now().toString(36);
+const tableVersions = new Map();
+let writeEpoch = 0;
+const entries = new Map();
+let cachedChars = 0;
+
+const WRITE_TARGET = /^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+(?:main\.)?["`[]?(\w+)/i;
+
+// Name of the table a statement writes to, or null for reads and temp tables.
+export function writeTarget(sql) {
+  const match = WRITE_TARGET.exec(sql);
+  return match && match[1].toLowerCase() !== 'temp' ? match[1] : null;
+}
+
+export function bumpTableVersion(table) {
+  tableVersions.set(table, (tableVersions.get(table) || 0) + 1);
+}
+
+// Invalidates every cached response, for a write to tables that are not known.
+export function bumpAllVersions() {
+  writeEpoch++;
+}
+
+function versionTag(db, tables) {
+  const dataVersions = [].concat(db).map(connection => connection.pragma('data_version', { simple: true })).join('-');
+  return `${BOOT_ID}.${writeEpoch}.${dataVersions}.${tables.map(table => tableVersions.get(table) || 0).join('.')}`;
+}
+
+function evict() {
+  for (const [oldestKey, oldest] of entries) {
+    if (entries.size <= MAX_ENTRIES && cachedChars <= MAX_CACHED_CHARS) break;
+    entries.delete(oldestKey);
+    cachedChars -= oldest.size;
+  }
+}
+
+function remember(key, entry) {
+  const previous = entries.get(key);
+  if (previous) { entries.delete(key); cachedChars -= previous.size; }
+  entries.set(key, entry);
+  cachedChars += entry.size;
+  evict();
+}
+
+// Preferred encoding the request accepts (ignoring q-values other than q=0), or null.
+function negotiateEncoding(request) {
+  const accepted = (request.headers.get('accept-encoding') || '').split(',').map(part => part.trim().split(/\s*;\s*/))
+    .filter(([, quality]) => !quality || !/^q=0(\.0*)?$/.test(quality)).map(([name]) => name);
+  return Object.keys(ENCODERS).find(encoding => accepted.includes(encoding)) || null;
+}
+
+// The entry's body in `encoding`, compressed on first use and kept with the entry (counted against the cache size).
+function encodedBody(entry, encoding) {
+  if (!encoding || entry.body.length < MIN_COMPRESSED_CHARS) return null;
+  let encoded = entry.encoded[encoding];
+  if (!encoded) {
+    encoded = entry.encoded[encoding] = ENCODERS[encoding](entry.body);
+    entry.size += encoded.length;
+    if (entries.get(entry.key) === entry) { cachedChars += encoded.length; evict(); }
+  }
+  return encoded;
+}
+
+// Serves `compute()` (a JSON-serializable value that depends only on the request URL and `tables`) from the cache,
+// with ETag / If-None-Match support. `db` is the connection read, or an array of them (shards) for a scatter-gather.
+export function cachedJson(db, request, tables, compute) {
+  const { pathname, searchParams } = new URL(request.url);
+  const key = `${pathname}?${[...searchParams].filter(([name]) => name !== 'token').sort().map(pair => pair.join('=')).join('&')}`;
+  const version = versionTag(db, tables), headers = { 'Cache-Control': 'private, no-cache', Vary: 'Accept-Encoding' };
+  // A tag for any encoding of this version is current.
+  const ifNoneMatch = request.headers.get('if-none-match');
+  const matched = ifNoneMatch && ifNoneMatch.split(',').map(tag => tag.trim().replace(/^W\//, '')).find(tag => tag.replace(ENCODING_SUFFIX, '"') === `"${version}"`);
+  if (matched) return new Response(null, { status: 304, headers: { ...headers, ETag: matched } });
+  let entry = entries.get(key);
+  if (entry && entry.version === version) {
+    entries.delete(key);
+    entries.set(key, entry);
+  } else {
+    const body = JSON.stringify(compute());
+    entry = { key, version, body, encoded: {}, size: body.length };
+    remember(key, entry);
+  }
+  const encoding = negotiateEncoding(request), encoded = encodedBody(entry, encoding);
+  if (encoded) return new Response(encoded, { headers: { ...headers, ETag: `"${version}-${encoding}"`, 'Content-Type': 'application/json', 'Content-Encoding': encoding } });
+  return new Response(entry.body, { headers: { ...headers, ETag: `"${version}"`, 'Content-Type': 'application/json' } });
+}
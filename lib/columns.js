@@ -0,0 +1,46 @@
+// Field projection and the columnar list encoding, shared by the API (encoding) and the client (decoding).
+//
+// A columnar list is { format: 'columns', length, fields, columns, dictionaries }: one array of values per field, so
+// keys are sent once per response instead of once per row. Fields listed as dictionary fields (store ids and names,
+// which repeat on most rows) are sent as indexes into dictionaries[field].
+
+export const LIST_FORMATS = ['rows', 'columns'];
+
+// The requested `fields` (comma-separated, default all of `available`, which maps each field to its SQL expression)
+// plus `required`, with the SELECT list for them. Null when a requested field is unknown.
+export function projectFields(fields, available, required = []) {
+  const requested = fields ? fields.split(',').map(field => field.trim()).filter(Boolean) : Object.keys(available);
+  if (requested.some(field => !Object.hasOwn(available, field))) return null;
+  const selected = [...new Set([...required, ...requested])];
+  return { fields: selected, sql: selected.map(field => `${available[field]} AS ${field}`).join(', ') };
+}
+
+export function encodeColumns(rows, fields, dictionaryFields = []) {
+  const columns = {}, dictionaries = {};
+  for (const field of fields) {
+    if (!dictionaryFields.includes(field)) {
+      columns[field] = rows.map(row => row[field]);
+      continue;
+    }
+    const indexes = new Map(), values = [];
+    columns[field] = rows.map(row => {
+      let index = indexes.get(row[field]);
+      if (index === undefined) { indexes.set(row[field], index = values.length); values.push(row[field]); }
+      return index;
+    });
+    dictionaries[field] = values;
+  }
+  return { format: 'columns', length: rows.length, fields, columns, dictionaries };
+}
+
+// Rows of a list in either format.
+export function decodeColumns(list) {
+  if (Array.isArray(list)) return list;
+  const { length, fields, columns, dictionaries } = list, rows = new Array(length);
+  for (let index = 0; index < length; index++) {
+    const row = {};
+    for (const field of fields) row[field] = dictionaries[field] ? dictionaries[field][columns[field][index]] : columns[field][index];
+    rows[index] = row;
+  }
+  return rows;
+}
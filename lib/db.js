@@ -0,0 +1,182 @@
+import Database from 'better-sqlite3';
+import fs from 'fs';
+import path from 'path';
+import { prepareCached, trackWrites, writeTransaction } from './statements.js';
+import { ensureSearchIndex } from './search.js';
+import { ensureStoreStats } from './stats.js';
+import { ensureSkuTotals } from './skus.js';
+import { ensureAlertIndex } from './alerts.js';
+import { HISTORY_RETENTION_DAYS, compactHistory, ensureHistoryRollups } from './history.js';
+import { ensureIdempotencyKeys, purgeIdempotencyKeys } from './idempotency.js';
+import { ensureForecast } from './forecast.js';
+import { scheduleBackups } from './backup.js';
+import { SHARDS_DIR, cachedItemShard, registerShard, registeredShard, registeredShards, rememberItemShard, shardKey, shardPath } from './shards.js';
+
+export { prepareCached };
+export { SHARDS_DIR, forgetItemShard } from './shards.js';
+
+export const DB_PATH = process.env.DB_PATH || path.join(process.cwd(), 'inventory.db');
+
+const PRAGMAS = ['journal_mode = WAL', 'synchronous = NORMAL', 'busy_timeout = 5000', 'mmap_size = 268435456', 'cache_size = -65536', 'temp_store = MEMORY'];
+const CHECKPOINT_INTERVAL_MS = 60 * 1000, OPTIMIZE_INTERVAL_MS = 60 * 60 * 1000, COMPACT_HISTORY_INTERVAL_MS = 6 * 60 * 60 * 1000, PURGE_IDEMPOTENCY_INTERVAL_MS = 60 * 60 * 1000;
+
+const SCHEMA = `
+  CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, username TEXT UNIQUE NOT NULL, passwordHash TEXT NOT NULL, role TEXT NOT NULL, createdAt TEXT NOT NULL);
+  CREATE TABLE IF NOT EXISTS stores (id TEXT PRIMARY KEY, name TEXT NOT NULL, location TEXT NOT NULL, contactEmail TEXT, contactPhone TEXT, createdAt TEXT NOT NULL);
+  CREATE TABLE IF NOT EXISTS inventoryItems (id TEXT PRIMARY KEY, sku TEXT NOT NULL, productName TEXT NOT NULL, currentQuantity INTEGER NOT NULL, reorderLevel INTEGER NOT NULL, unitCost REAL NOT NULL DEFAULT 0, storeId TEXT NOT NULL, createdAt TEXT NOT NULL, updatedAt TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0, FOREIGN KEY (storeId) REFERENCES stores(id), UNIQUE(sku, storeId));
+  CREATE TABLE IF NOT EXISTS alerts (id TEXT PRIMARY KEY, itemId TEXT NOT NULL, storeId TEXT NOT NULL, sku TEXT NOT NULL, productName TEXT NOT NULL, currentQuantity INTEGER NOT NULL, reorderLevel INTEGER NOT NULL, alertType TEXT NOT NULL, triggered TEXT NOT NULL, resolved INTEGER NOT NULL DEFAULT 0, resolvedBy TEXT, resolvedAt TEXT, FOREIGN KEY (itemId) REFERENCES inventoryItems(id));
+  CREATE TABLE IF NOT EXISTS inventoryHistory (id TEXT PRIMARY KEY, itemId TEXT NOT NULL, changeType TEXT NOT NULL, quantityChange INTEGER NOT NULL, previousQty INTEGER NOT NULL, newQty INTEGER NOT NULL, userId TEXT, notes TEXT, timestamp TEXT NOT NULL, FOREIGN KEY (itemId) REFERENCES inventoryItems(id));
+  CREATE INDEX IF NOT EXISTS idx_items_store_sku ON inventoryItems(storeId, sku, id);
+  CREATE INDEX IF NOT EXISTS idx_items_low_stock ON inventoryItems(storeId, sku, id) WHERE currentQuantity <= reorderLevel;
+  CREATE INDEX IF NOT EXISTS idx_alerts_item_resolved ON alerts(itemId, resolved);
+  CREATE INDEX IF NOT EXISTS idx_alerts_resolved_triggered ON alerts(resolved, triggered);
+  CREATE INDEX IF NOT EXISTS idx_history_item_timestamp ON inventoryHistory(itemId, timestamp);
+`;
+
+// Columns added after a table was first released, as [table, column, definition]. Added to existing databases on open.
+const COLUMN_MIGRATIONS = [['inventoryItems', 'version', 'INTEGER NOT NULL DEFAULT 0']];
+
+// Statements used by the route handlers, compiled once on first use by statement(name).
+const STATEMENTS = {
+  userById: 'SELECT id, username, role, createdAt FROM users WHERE id = ?',
+  userByUsername: 'SELECT * FROM users WHERE username = ?',
+  insertUser: 'INSERT INTO users (id, username, passwordHash, role, createdAt) VALUES (?, ?, ?, ?, ?)',
+  updatePasswordHash: 'UPDATE users SET passwordHash = ? WHERE id = ?',
+  allStores: 'SELECT * FROM stores',
+  storeExists: 'SELECT 1 FROM stores WHERE id = ?',
+  insertStore: 'INSERT INTO stores (id, name, location, contactEmail, contactPhone, createdAt) VALUES (?, ?, ?, ?, ?, ?)',
+  updateStore: 'UPDATE stores SET name = ?, location = ?, contactEmail = ?, contactPhone = ? WHERE id = ?',
+  deleteStore: 'DELETE FROM stores WHERE id = ?',
+  countStoreItems: 'SELECT COUNT(*) as count FROM inventoryItems WHERE storeId = ?',
+  itemById: 'SELECT * FROM inventoryItems WHERE id = ?',
+  itemBySku: 'SELECT * FROM inventoryItems WHERE sku = ? AND storeId = ?',
+  insertItem: 'INSERT INTO inventoryItems (id, sku, productName, currentQuantity, reorderLevel, unitCost, storeId, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+  deleteItem: 'DELETE FROM inventoryItems WHERE id = ?',
+  insertHistory: 'INSERT INTO inventoryHistory (id, itemId, changeType, quantityChange, previousQty, newQty, userId, notes, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+  deleteItemHistory: 'DELETE FROM inventoryHistory WHERE itemId = ?',
+  deleteItemHistoryDaily: 'DELETE FROM inventoryHistoryDaily WHERE itemId = ?',
+  resolveAlert: 'UPDATE alerts SET resolved = 1, resolvedBy = ?, resolvedAt = ? WHERE id = ? RETURNING id, itemId, storeId, resolvedBy, resolvedAt',
+  deleteItemAlerts: 'DELETE FROM alerts WHERE itemId = ?'
+};
+
+let db = null;
+
+// Checked again inside the write lock, so processes opening an old database at the same time add each column once.
+function migrateColumns(connection) {
+  const missing = () => COLUMN_MIGRATIONS.filter(([table, column]) => !connection.pragma(`table_info(${table})`).some(info => info.name === column));
+  if (missing().length === 0) return;
+  writeTransaction(connection, () => {
+    for (const [table, column, definition] of missing()) connection.exec(`ALTER TABLE ${table} ADD COLUMN ${column} ${definition}`);
+  })();
+}
+
+// Opens a connection to `file` (the main database by default) with the storage pragmas applied and writes tracked for
+// the read cache. Read-only connections skip the journal-mode switch.
+export function openDatabase(options = {}, file = DB_PATH) {
+  const connection = trackWrites(new Database(file, options));
+  for (const pragma of PRAGMAS) if (!options.readonly || !pragma.startsWith('journal_mode')) connection.pragma(pragma);
+  return connection;
+}
+
+// Creates or upgrades the schema, builds derived indexes and counters missing from existing data, and schedules the
+// periodic maintenance. Used for the main database and for every shard.
+function prepareDatabase(connection) {
+  connection.exec(SCHEMA);
+  migrateColumns(connection);
+  ensureAlertIndex(connection);
+  ensureSearchIndex(connection);
+  ensureStoreStats(connection);
+  ensureSkuTotals(connection);
+  ensureHistoryRollups(connection);
+  ensureForecast(connection);
+  ensureIdempotencyKeys(connection);
+  connection.pragma('optimize');
+  setInterval(() => connection.pragma('wal_checkpoint(PASSIVE)'), CHECKPOINT_INTERVAL_MS).unref();
+  setInterval(() => connection.pragma('optimize'), OPTIMIZE_INTERVAL_MS).unref();
+  setInterval(() => purgeIdempotencyKeys(connection), PURGE_IDEMPOTENCY_INTERVAL_MS).unref();
+  if (HISTORY_RETENTION_DAYS > 0) {
+    setInterval(() => {
+      try {
+        const { compacted, cutoff } = compactHistory(connection);
+        if (compacted > 0) console.log(`Compacted ${compacted} history events before ${cutoff} into daily rollups in ${connection.name}`);
+      } catch (error) {
+        console.error('History compaction failed:', error);
+      }
+    }, COMPACT_HISTORY_INTERVAL_MS).unref();
+  }
+  return connection;
+}
+
+export function getDatabase() {
+  if (!db) {
+    db = prepareDatabase(openDatabase());
+    if (SHARDS_DIR) for (const key of new Set(statement('allStores').all().map(store => shardKey(store.id)))) openShard(key);
+    scheduleBackups(allDatabases);
+  }
+  return db;
+}
+
+// Every database file: the main one, plus each shard when sharded. What a backup snapshot holds.
+export function allDatabases() {
+  getDatabase();
+  return SHARDS_DIR ? [db, ...registeredShards()] : [db];
+}
+
+// Replaces a shard's copies of its stores with the current rows from the main database.
+function syncShardStores(shard, key) {
+  const stores = statement('allStores').all().filter(store => shardKey(store.id) === key);
+  writeTransaction(shard, () => {
+    prepareCached(shard, 'DELETE FROM stores WHERE id NOT IN (SELECT value FROM json_each(?))').run(JSON.stringify(stores.map(store => store.id)));
+    const copy = prepareCached(shard, 'INSERT INTO stores (id, name, location, contactEmail, contactPhone, createdAt) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET name = excluded.name, location = excluded.location, contactEmail = excluded.contactEmail, contactPhone = excluded.contactPhone');
+    for (const store of stores) copy.run(store.id, store.name, store.location, store.contactEmail, store.contactPhone, store.createdAt);
+  })();
+}
+
+function openShard(key) {
+  let shard = registeredShard(key);
+  if (!shard) {
+    fs.mkdirSync(SHARDS_DIR, { recursive: true });
+    shard = prepareDatabase(openDatabase({}, shardPath(key)));
+    registerShard(key, shard);
+    syncShardStores(shard, key);
+  }
+  return shard;
+}
+
+// Call after creating, updating or deleting a store in the main database, to update its shard's copy.
+export function syncStoreShard(storeId) {
+  if (SHARDS_DIR) syncShardStores(openShard(shardKey(storeId)), shardKey(storeId));
+}
+
+// Connection holding a store's inventory: the main database unless sharded, null for an unknown store when sharded.
+export function storeShard(storeId) {
+  if (!SHARDS_DIR) return getDatabase();
+  return statement('storeExists').get(storeId) ? openShard(shardKey(storeId)) : null;
+}
+
+// Every connection holding inventory, for reads and maintenance that span all stores.
+export function allShards() {
+  getDatabase();
+  return SHARDS_DIR ? registeredShards() : [db];
+}
+
+// Connection holding an item: the main database unless sharded, null for an unknown item when sharded.
+export function itemShard(itemId) {
+  if (!SHARDS_DIR) return getDatabase();
+  const cached = cachedItemShard(itemId);
+  if (cached) return cached;
+  const shard = allShards().find(connection => prepareCached(connection, 'SELECT 1 FROM inventoryItems WHERE id = ?').get(itemId));
+  if (shard) rememberItemShard(itemId, shard);
+  return shard || null;
+}
+
+export function alertShard(alertId) {
+  if (!SHARDS_DIR) return getDatabase();
+  return allShards().find(connection => prepareCached(connection, 'SELECT 1 FROM alerts WHERE id = ?').get(alertId)) || null;
+}
+
+// `connection` defaults to the main database; pass a shard for inventory statements.
+export function statement(name, connection = getDatabase()) {
+  if (!STATEMENTS[name]) throw new Error(`Unknown statement: ${name}`);
+  return prepareCached(connection, STATEMENTS[name]);
+}
@@ -0,0 +1,76 @@
+import { afterCommit, prepareCached } from './statements.js';
+import { SHARDS_DIR, registeredShards } from './shards.js';
+import { readStatsTotals, readStoreStats } from './stats.js';
+
+// In-process change feed behind GET /api/events (server-sent events). Write paths publish item, alert and stats
+// changes; every event gets the next sequence number and is kept in a bounded replay buffer, so a client reconnecting
+// with Last-Event-ID receives exactly what it missed, or a `reset` when that is no longer available. Sequence numbers
+// are seeded from the clock, so they keep increasing across server restarts and stale ids are detected as such.
+// Events published inside a writeTransaction are emitted only once it commits, so clients never see rolled-back changes.
+
+const MAX_BUFFERED_EVENTS = 10000, MAX_QUEUED_PER_CLIENT = 1000, HEARTBEAT_MS = 15000, RETRY_MS = 3000;
+
+let sequence = Date.now() * 1000;
+const buffer = [], subscribers = new Set();
+
+export function publish(type, data) {
+  afterCommit(() => {
+    const event = { id: ++sequence, type, data };
+    buffer.push(event);
+    if (buffer.length > MAX_BUFFERED_EVENTS) buffer.splice(0, buffer.length - MAX_BUFFERED_EVENTS);
+    for (const send of subscribers) send(event);
+  });
+}
+
+// Publishes the current state of each item (with its store name) plus stats for the affected stores.
+export function publishItems(db, itemIds, { created = false } = {}) {
+  const items = prepareCached(db, `SELECT i.*, COALESCE(s.name, 'Unknown') AS storeName FROM inventoryItems i LEFT JOIN stores s ON s.id = i.storeId WHERE i.id IN (SELECT value FROM json_each(?))`).all(JSON.stringify([...itemIds]));
+  for (const item of items) publish('item', { item, created });
+  publishStats(db, items.map(item => item.storeId));
+}
+
+export function publishItemDeleted(db, item) {
+  publish('itemDeleted', { id: item.id, storeId: item.storeId });
+  publishStats(db, [item.storeId]);
+}
+
+// Dashboard counters of each store plus the new totals, so clients can update the dashboard without refetching it.
+// `db` holds the stores; with sharding the totals are summed over every shard.
+export function publishStats(db, storeIds) {
+  const unique = [...new Set(storeIds)];
+  if (unique.length === 0) return;
+  const totals = readStatsTotals(SHARDS_DIR ? registeredShards() : db);
+  for (const storeId of unique) publish('stats', { store: readStoreStats(db, storeId).stores[0] || { storeId }, totals });
+}
+
+const formatEvent = ({ id, type, data }) => `id: ${id}\nevent: ${type}\ndata: ${JSON.stringify(data)}\n\n`;
+
+// SSE stream for one client. `lastEventId` (from the Last-Event-ID header or query) resumes after that event.
+export function eventStream(lastEventId, signal) {
+  const encoder = new TextEncoder();
+  let close = () => {};
+  return new ReadableStream({
+    start(controller) {
+      const write = (text) => controller.enqueue(encoder.encode(text));
+      const send = (event) => {
+        // A client that stops reading is dropped rather than buffered without bound; it resumes via Last-Event-ID.
+        if (controller.desiredSize < -MAX_QUEUED_PER_CLIENT) close();
+        else write(formatEvent(event));
+      };
+      write(`retry: ${RETRY_MS}\n\n`);
+      const resumeFrom = Number(lastEventId), oldest = buffer.length > 0 ? buffer[0].id : sequence + 1;
+      if (!lastEventId) write(formatEvent({ id: sequence, type: 'ready', data: { sequence } }));
+      else if (!Number.isInteger(resumeFrom) || resumeFrom < oldest - 1 || resumeFrom > sequence) write(formatEvent({ id: sequence, type: 'reset', data: { sequence } }));
+      else for (const event of buffer) if (event.id > resumeFrom) write(formatEvent(event));
+      const heartbeat = setInterval(() => write(': ping\n\n'), HEARTBEAT_MS);
+      subscribers.add(send);
+      close = () => {
+        if (!subscribers.delete(send)) return;
+        clearInterval(heartbeat);
+        try { controller.close(); } catch (error) { /* already closed by the client */ }
+      };
+      signal?.addEventListener('abort', () => close());
+    },
+    cancel: () => close()
+  });
+}
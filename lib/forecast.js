@@ -0,0 +1,124 @@
+import { prepareCached, writeTransaction } from './statements.js';
+
+// Consumption velocity and stockout forecasting. itemVelocity keeps, per item with outflow, an exponentially weighted
+// moving average of daily units out (span VELOCITY_SPAN_DAYS) over the days before `salesDay`, plus the units out so far
+// on `salesDay`. A trigger on inventoryHistory folds each outflow event in as it is written, so adjustments maintain it
+// in their own transaction; days without outflow are applied lazily when the next one arrives or when it is read.
+// stockoutDay is the day the item runs out at the rate as of its last change, kept up to date by triggers and indexed,
+// so the forecast reads only the items it returns. Rates only decay between outflows, so the real stockout is never
+// earlier than stockoutDay: it is a safe filter, and readers recompute the exact projection for the rows they return.
+
+export const VELOCITY_SPAN_DAYS = 14;
+export const STOCKOUT_ALERT_DAYS = Number(process.env.STOCKOUT_ALERT_DAYS) || 0;
+export const DEFAULT_LEAD_TIME_DAYS = 7, DEFAULT_COVER_DAYS = 14;
+const SMOOTHING = 2 / (VELOCITY_SPAN_DAYS + 1), MAX_PROJECTION_DAYS = 3650, BACKFILL_BATCH_SIZE = 5000, DAY_MS = 24 * 60 * 60 * 1000;
+
+// Initial stock and CSV imports are corrections, not consumption.
+const NOT_CONSUMPTION = "('created', 'import')";
+// Daily rate if `salesDay` ended now: today's units folded into the average.
+const RATE_SQL = (alias = '') => `(${SMOOTHING} * ${alias}salesToday + ${1 - SMOOTHING} * ${alias}velocity)`;
+// Day `quantity` runs out at RATE_SQL, counting from salesDay; null when not moving or beyond MAX_PROJECTION_DAYS.
+const STOCKOUT_SQL = (quantity) => `CASE WHEN ${RATE_SQL()} <= 0 OR MAX(${quantity}, 0) > ${MAX_PROJECTION_DAYS} * ${RATE_SQL()} THEN NULL ELSE date(salesDay, '+' || CAST(MAX(${quantity}, 0) / ${RATE_SQL()} AS INTEGER) || ' days') END`;
+
+// The smoothing factor is built into the triggers; changing VELOCITY_SPAN_DAYS needs the triggers dropped and a backfill.
+const FORECAST_SCHEMA = `
+  CREATE TABLE IF NOT EXISTS itemVelocity (itemId TEXT PRIMARY KEY, storeId TEXT NOT NULL, velocity REAL NOT NULL, salesDay TEXT NOT NULL, salesToday INTEGER NOT NULL, stockoutDay TEXT) WITHOUT ROWID;
+  CREATE INDEX IF NOT EXISTS idx_velocity_stockout ON itemVelocity(stockoutDay) WHERE stockoutDay IS NOT NULL;
+  CREATE INDEX IF NOT EXISTS idx_velocity_store_stockout ON itemVelocity(storeId, stockoutDay) WHERE stockoutDay IS NOT NULL;
+  CREATE TRIGGER IF NOT EXISTS item_velocity_history_ai AFTER INSERT ON inventoryHistory WHEN new.quantityChange < 0 AND new.changeType NOT IN ${NOT_CONSUMPTION} BEGIN
+    INSERT INTO itemVelocity (itemId, storeId, velocity, salesDay, salesToday) SELECT id, storeId, 0, substr(new.timestamp, 1, 10), -new.quantityChange FROM inventoryItems WHERE id = new.itemId
+      ON CONFLICT(itemId) DO UPDATE SET
+        velocity = CASE WHEN excluded.salesDay > salesDay THEN pow(${1 - SMOOTHING}, julianday(excluded.salesDay) - julianday(salesDay) - 1) * ${RATE_SQL()} ELSE velocity END,
+        salesToday = CASE WHEN excluded.salesDay > salesDay THEN excluded.salesToday ELSE salesToday + excluded.salesToday END,
+        salesDay = MAX(salesDay, excluded.salesDay);
+    UPDATE itemVelocity SET stockoutDay = ${STOCKOUT_SQL('(SELECT currentQuantity FROM inventoryItems WHERE id = new.itemId)')} WHERE itemId = new.itemId;
+  END;
+  CREATE TRIGGER IF NOT EXISTS item_velocity_item_au AFTER UPDATE OF currentQuantity, storeId ON inventoryItems BEGIN
+    UPDATE itemVelocity SET storeId = new.storeId, stockoutDay = ${STOCKOUT_SQL('new.currentQuantity')} WHERE itemId = new.id;
+  END;
+  CREATE TRIGGER IF NOT EXISTS item_velocity_item_ad AFTER DELETE ON inventoryItems BEGIN
+    DELETE FROM itemVelocity WHERE itemId = old.id;
+  END;
+`;
+
+// Per item: the EWMA over every day before its last day with outflow, in closed form (each day's units weighted by
+// SMOOTHING * (1 - SMOOTHING)^(days before the last day - 1)), and the units on that last day. Days come from retained
+// events and from the daily rollups of compacted ones (whose units out do not distinguish imports).
+const BACKFILL_SQL = `
+  INSERT INTO itemVelocity (itemId, storeId, velocity, salesDay, salesToday)
+  SELECT d.itemId, i.storeId, COALESCE(SUM(CASE WHEN d.day < d.lastDay THEN ${SMOOTHING} * pow(${1 - SMOOTHING}, julianday(d.lastDay) - julianday(d.day) - 1) * d.outflow END), 0), d.lastDay, SUM(CASE WHEN d.day = d.lastDay THEN d.outflow ELSE 0 END)
+  FROM (
+    SELECT itemId, day, SUM(outflow) AS outflow, MAX(day) OVER (PARTITION BY itemId) AS lastDay FROM (
+      SELECT itemId, substr(timestamp, 1, 10) AS day, -quantityChange AS outflow FROM inventoryHistory WHERE itemId IN (SELECT value FROM json_each(?)) AND quantityChange < 0 AND changeType NOT IN ${NOT_CONSUMPTION}
+      UNION ALL SELECT itemId, day, sales FROM inventoryHistoryDaily WHERE itemId IN (SELECT value FROM json_each(?)) AND sales > 0
+    ) GROUP BY itemId, day
+  ) d JOIN inventoryItems i ON i.id = d.itemId
+  GROUP BY d.itemId
+`;
+
+// Creates the velocity table and its triggers, backfilling from history the first time (returning the backfill's
+// counts, or null when the table already existed). Needs inventoryHistoryDaily.
+export function ensureForecast(db) {
+  const exists = db.prepare("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'itemVelocity'").get();
+  db.exec(FORECAST_SCHEMA);
+  return exists ? null : rebuildVelocities(db);
+}
+
+// Recomputes every item's velocity from its full history, BACKFILL_BATCH_SIZE items per write transaction so request
+// writes can interleave. Items with no outflow end up without a row.
+export function rebuildVelocities(db, { batchSize = BACKFILL_BATCH_SIZE } = {}) {
+  const rebuildBatch = writeTransaction(db, (after) => {
+    const ids = prepareCached(db, 'SELECT id FROM inventoryItems WHERE id > ? ORDER BY id LIMIT ?').all(after, batchSize).map(item => item.id);
+    if (ids.length === 0) return { ids, tracked: 0 };
+    const batch = JSON.stringify(ids);
+    prepareCached(db, 'DELETE FROM itemVelocity WHERE itemId IN (SELECT value FROM json_each(?))').run(batch);
+    const tracked = prepareCached(db, BACKFILL_SQL).run(batch, batch).changes;
+    prepareCached(db, `UPDATE itemVelocity SET stockoutDay = ${STOCKOUT_SQL('(SELECT currentQuantity FROM inventoryItems WHERE id = itemVelocity.itemId)')} WHERE itemId IN (SELECT value FROM json_each(?))`).run(batch);
+    return { ids, tracked };
+  });
+  let items = 0, tracked = 0, after = '';
+  for (let batch; (batch = rebuildBatch(after)).ids.length > 0; after = batch.ids[batch.ids.length - 1]) {
+    items += batch.ids.length; tracked += batch.tracked;
+  }
+  return { items, tracked };
+}
+
+const addDays = (day, days) => new Date(Date.parse(`${day}T00:00:00Z`) + days * DAY_MS).toISOString().slice(0, 10);
+
+// SQL condition on an inventoryItems row `i`: projected to run out within `days` days of `today` at its rate decayed
+// to today. The indexed stockoutDay bound narrows the candidates, the quantity check applies the exact rate.
+export function projectedStockoutCondition(today, days) {
+  return {
+    sql: `EXISTS (SELECT 1 FROM itemVelocity v WHERE v.itemId = i.id AND v.stockoutDay IS NOT NULL AND v.stockoutDay <= ? AND i.currentQuantity <= ? * pow(${1 - SMOOTHING}, julianday(?) - julianday(v.salesDay)) * ${RATE_SQL('v.')})`,
+    params: [addDays(today, days), days, today]
+  };
+}
+
+// Up to `limit` + 1 candidates to run out within `withinDays` (stockoutDay in range), soonest first by (stockoutDay, id),
+// each projected as of `today`. `after` is the [stockoutDay, id] keyset of the last candidate of the previous page.
+export function forecastCandidates(db, { storeId, withinDays, leadTimeDays = DEFAULT_LEAD_TIME_DAYS, coverDays = DEFAULT_COVER_DAYS, after, limit, today = new Date().toISOString().slice(0, 10) }) {
+  const conditions = ['v.stockoutDay IS NOT NULL', 'v.stockoutDay <= ?'], params = [addDays(today, withinDays)];
+  if (storeId) { conditions.push('v.storeId = ?'); params.push(storeId); }
+  if (after) { conditions.push('(v.stockoutDay, v.itemId) > (?, ?)'); params.push(...after); }
+  const rows = prepareCached(db, `
+    SELECT i.id, i.sku, i.productName, i.storeId, COALESCE(s.name, 'Unknown') AS storeName, i.currentQuantity, i.reorderLevel, v.velocity, v.salesDay, v.salesToday, v.stockoutDay
+    FROM itemVelocity v JOIN inventoryItems i ON i.id = v.itemId LEFT JOIN stores s ON s.id = i.storeId
+    WHERE ${conditions.join(' AND ')} ORDER BY v.stockoutDay, v.itemId LIMIT ?
+  `).all(...params, limit + 1);
+  return rows.map(row => projectStockout(row, { today, leadTimeDays, coverDays }));
+}
+
+// Velocity as of `today` (units per day), days to stockout and a suggested order: enough for the lead time plus
+// `coverDays` of demand on top of the reorder level.
+export function projectStockout({ velocity, salesDay, salesToday, ...item }, { today, leadTimeDays, coverDays }) {
+  const elapsed = Math.max(Math.round((Date.parse(today) - Date.parse(salesDay)) / DAY_MS), 0);
+  const rate = Math.pow(1 - SMOOTHING, elapsed) * (SMOOTHING * salesToday + (1 - SMOOTHING) * velocity);
+  const daysToStockout = rate > 0 ? Math.max(item.currentQuantity, 0) / rate : null;
+  return {
+    ...item,
+    velocity: Math.round(rate * 100) / 100,
+    daysToStockout: daysToStockout === null ? null : Math.round(daysToStockout * 10) / 10,
+    projectedStockout: daysToStockout === null ? null : addDays(today, Math.floor(daysToStockout)),
+    suggestedReorderQty: Math.max(Math.ceil(item.reorderLevel + rate * (leadTimeDays + coverDays) - item.currentQuantity), 0)
+  };
+}
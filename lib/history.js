@@ -0,0 +1,114 @@
+import { prepareCached, writeTransaction } from './statements.js';
+
+// History retention. Raw inventoryHistory events older than HISTORY_RETENTION_DAYS are folded into one
+// inventoryHistoryDaily row per item and UTC day (net change, units out, units in, event count, opening and closing
+// quantity) and then deleted, so the hot table only holds the recent window. Summaries read the rollups plus whatever
+// raw events are still retained, so they cover the full range regardless of where the cutoff currently is.
+
+export const HISTORY_RETENTION_DAYS = Number(process.env.HISTORY_RETENTION_DAYS ?? 90);
+export const HISTORY_BUCKETS = ['day', 'week'];
+const COMPACT_BATCH_SIZE = 5000, DAY_MS = 24 * 60 * 60 * 1000;
+
+const HISTORY_SCHEMA = `
+  CREATE TABLE IF NOT EXISTS inventoryHistoryDaily (itemId TEXT NOT NULL, day TEXT NOT NULL, netChange INTEGER NOT NULL, sales INTEGER NOT NULL, receipts INTEGER NOT NULL, events INTEGER NOT NULL, openingQty INTEGER NOT NULL, closingQty INTEGER NOT NULL, firstAt TEXT NOT NULL, lastAt TEXT NOT NULL, PRIMARY KEY (itemId, day)) WITHOUT ROWID;
+  CREATE INDEX IF NOT EXISTS idx_history_timestamp ON inventoryHistory(timestamp);
+`;
+
+// Per item and day: totals plus the quantity before the first and after the last event of the day.
+const DAILY_SQL = (where) => `
+  SELECT itemId, day, SUM(quantityChange) AS netChange, SUM(MAX(-quantityChange, 0)) AS sales, SUM(MAX(quantityChange, 0)) AS receipts, COUNT(*) AS events,
+    MIN(openingQty) AS openingQty, MIN(closingQty) AS closingQty, MIN(timestamp) AS firstAt, MAX(timestamp) AS lastAt
+  FROM (
+    SELECT itemId, substr(timestamp, 1, 10) AS day, quantityChange, timestamp,
+      first_value(previousQty) OVER w AS openingQty, last_value(newQty) OVER w AS closingQty
+    FROM inventoryHistory WHERE ${where}
+    WINDOW w AS (PARTITION BY itemId, substr(timestamp, 1, 10) ORDER BY timestamp, rowid ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+  ) WHERE true GROUP BY itemId, day
+`;
+
+export function ensureHistoryRollups(db) {
+  db.exec(HISTORY_SCHEMA);
+}
+
+// Date-only `to` values are inclusive of that whole day. Returns null when either bound is not a valid date.
+export function parseHistoryRange(from, to) {
+  const parse = (value, endOfDay) => {
+    if (!value) return undefined;
+    const time = Date.parse(value);
+    if (Number.isNaN(time)) return null;
+    return new Date(endOfDay && /^\d{4}-\d{2}-\d{2}$/.test(value) ? time + DAY_MS : time).toISOString();
+  };
+  const range = { from: parse(from, false), to: parse(to, true) };
+  return range.from === null || range.to === null ? null : range;
+}
+
+// Raw events of one item, newest first. `before` is the [timestamp, rowid] keyset of the last row of the previous page.
+export function historyPage(db, itemId, { from, to, before, limit }) {
+  const conditions = ['itemId = ?'], params = [itemId];
+  if (from) { conditions.push('timestamp >= ?'); params.push(from); }
+  if (to) { conditions.push('timestamp < ?'); params.push(to); }
+  if (before) { conditions.push('(timestamp, rowid) < (?, ?)'); params.push(...before); }
+  const rows = prepareCached(db, `SELECT rowid AS seq, * FROM inventoryHistory WHERE ${conditions.join(' AND ')} ORDER BY timestamp DESC, rowid DESC LIMIT ?`).all(...params, limit + 1);
+  const events = rows.slice(0, limit).map(({ seq, ...event }) => event), last = rows[limit - 1];
+  return { events, next: rows.length > limit ? [last.timestamp, last.seq] : null };
+}
+
+// Last day already folded into rollups for an item, i.e. raw events before the day after it are no longer retained.
+export function summarizedThrough(db, itemId) {
+  return prepareCached(db, 'SELECT MAX(day) AS day FROM inventoryHistoryDaily WHERE itemId = ?').get(itemId).day;
+}
+
+const bucketStart = (day, bucket) => {
+  if (bucket === 'day') return day;
+  const date = new Date(`${day}T00:00:00Z`);
+  return new Date(date.getTime() - ((date.getUTCDay() + 6) % 7) * DAY_MS).toISOString().slice(0, 10);
+};
+
+// Daily or weekly (ISO weeks starting Monday) buckets for one item over [from, to), from rollups and retained events.
+export function summarizeHistory(db, itemId, { bucket = 'day', from, to } = {}) {
+  const fromDay = from?.slice(0, 10), toDay = to ? new Date(Date.parse(to) - 1).toISOString().slice(0, 10) : undefined;
+  const rollupConditions = ['itemId = ?'], rawConditions = ['itemId = ?'], rollupParams = [itemId], rawParams = [itemId];
+  if (fromDay) { rollupConditions.push('day >= ?'); rollupParams.push(fromDay); rawConditions.push('timestamp >= ?'); rawParams.push(from); }
+  if (toDay) { rollupConditions.push('day <= ?'); rollupParams.push(toDay); rawConditions.push('timestamp < ?'); rawParams.push(to); }
+  const days = prepareCached(db, `
+    SELECT day, netChange, sales, receipts, events, openingQty, closingQty, firstAt, lastAt FROM inventoryHistoryDaily WHERE ${rollupConditions.join(' AND ')}
+    UNION ALL SELECT day, netChange, sales, receipts, events, openingQty, closingQty, firstAt, lastAt FROM (${DAILY_SQL(rawConditions.join(' AND '))})
+    ORDER BY day, firstAt
+  `).all(...rollupParams, ...rawParams);
+  const buckets = [];
+  for (const day of days) {
+    const start = bucketStart(day.day, bucket), current = buckets[buckets.length - 1];
+    if (current && current.start === start) {
+      current.netChange += day.netChange; current.sales += day.sales; current.receipts += day.receipts; current.events += day.events;
+      current.closingQty = day.closingQty;
+    } else {
+      buckets.push({ start, netChange: day.netChange, sales: day.sales, receipts: day.receipts, events: day.events, openingQty: day.openingQty, closingQty: day.closingQty });
+    }
+  }
+  return buckets;
+}
+
+// Folds raw events older than `olderThanDays` (cut at a UTC day boundary) into the daily rollups and deletes them, in
+// batches of COMPACT_BATCH_SIZE events per write transaction so request writes can interleave.
+export function compactHistory(db, { olderThanDays = HISTORY_RETENTION_DAYS, batchSize = COMPACT_BATCH_SIZE } = {}) {
+  const cutoff = new Date(Math.floor(Date.now() / DAY_MS - olderThanDays) * DAY_MS).toISOString();
+  prepareCached(db, 'CREATE TEMP TABLE IF NOT EXISTS compactBatch (id INTEGER PRIMARY KEY)').run();
+  prepareCached(db, 'DELETE FROM temp.compactBatch').run();
+  const compactBatch = writeTransaction(db, () => {
+    const selected = prepareCached(db, 'INSERT INTO temp.compactBatch (id) SELECT rowid FROM inventoryHistory WHERE timestamp < ? ORDER BY timestamp LIMIT ?').run(cutoff, batchSize).changes;
+    if (selected === 0) return 0;
+    prepareCached(db, `
+      INSERT INTO inventoryHistoryDaily (itemId, day, netChange, sales, receipts, events, openingQty, closingQty, firstAt, lastAt)
+      ${DAILY_SQL('rowid IN (SELECT id FROM temp.compactBatch)')}
+      ON CONFLICT(itemId, day) DO UPDATE SET netChange = netChange + excluded.netChange, sales = sales + excluded.sales, receipts = receipts + excluded.receipts, events = events + excluded.events,
+        openingQty = CASE WHEN excluded.firstAt < firstAt THEN excluded.openingQty ELSE openingQty END, closingQty = CASE WHEN excluded.lastAt >= lastAt THEN excluded.closingQty ELSE closingQty END,
+        firstAt = MIN(firstAt, excluded.firstAt), lastAt = MAX(lastAt, excluded.lastAt)
+    `).run();
+    prepareCached(db, 'DELETE FROM inventoryHistory WHERE rowid IN (SELECT id FROM temp.compactBatch)').run();
+    prepareCached(db, 'DELETE FROM temp.compactBatch').run();
+    return selected;
+  });
+  let compacted = 0, batches = 0;
+  for (let selected; (selected = compactBatch()) > 0; batches++) compacted += selected;
+  return { cutoff, compacted, batches };
+}
@@ -0,0 +1,43 @@
+import { createHash } from 'crypto';
+import { prepareCached } from './statements.js';
+
+// Idempotency-Key support for mutations. The first successful response to a (user, key) pair is stored in the same
+// transaction as the mutation itself, so a retry either finds the stored response (the original committed) or runs
+// the mutation again (it did not). Failed responses are not stored: nothing was applied, so retrying them is safe.
+// A key reused for a different request is refused rather than replayed. Keys expire after IDEMPOTENCY_TTL_HOURS.
+
+export const IDEMPOTENCY_TTL_HOURS = Number(process.env.IDEMPOTENCY_TTL_HOURS ?? 24);
+const MAX_KEY_LENGTH = 255;
+
+const IDEMPOTENCY_SCHEMA = `
+  CREATE TABLE IF NOT EXISTS idempotencyKeys (userId TEXT NOT NULL, key TEXT NOT NULL, fingerprint TEXT NOT NULL, status INTEGER NOT NULL, body TEXT NOT NULL, createdAt TEXT NOT NULL, PRIMARY KEY (userId, key)) WITHOUT ROWID;
+  CREATE INDEX IF NOT EXISTS idx_idempotency_created ON idempotencyKeys(createdAt);
+`;
+
+export function ensureIdempotencyKeys(db) {
+  db.exec(IDEMPOTENCY_SCHEMA);
+}
+
+export function requestFingerprint(method, path, body) {
+  return createHash('sha256').update(`${method} ${path} ${JSON.stringify(body)}`).digest('base64url');
+}
+
+// Runs `mutation()` (returning { status, body, headers }) unless `key` already has a stored response, which is
+// returned instead with an Idempotent-Replayed header. Must run inside the mutation's write transaction.
+export function withIdempotency(db, { userId, key, fingerprint }, mutation) {
+  if (!key) return mutation();
+  if (key.length > MAX_KEY_LENGTH) return { status: 400, body: { error: `Idempotency-Key must be at most ${MAX_KEY_LENGTH} characters` } };
+  const stored = prepareCached(db, 'SELECT fingerprint, status, body FROM idempotencyKeys WHERE userId = ? AND key = ?').get(userId, key);
+  if (stored) {
+    if (stored.fingerprint !== fingerprint) return { status: 422, body: { error: 'Idempotency-Key was already used for a different request' } };
+    return { status: stored.status, body: JSON.parse(stored.body), headers: { 'Idempotent-Replayed': 'true' } };
+  }
+  const response = mutation();
+  if (response.status < 300) prepareCached(db, 'INSERT INTO idempotencyKeys (userId, key, fingerprint, status, body, createdAt) VALUES (?, ?, ?, ?, ?, ?)').run(userId, key, fingerprint, response.status, JSON.stringify(response.body), new Date().toISOString());
+  return response;
+}
+
+export function purgeIdempotencyKeys(db) {
+  const cutoff = new Date(Date.now() - IDEMPOTENCY_TTL_HOURS * 60 * 60 * 1000).toISOString();
+  return prepareCached(db, 'DELETE FROM idempotencyKeys WHERE createdAt < ?').run(cutoff).changes;
+}
@@ -0,0 +1,84 @@
+import Papa from 'papaparse'
+
+// Web Worker behind the CSV import dialog. Parses and validates the file off the main thread, reading it CHUNK_BYTES at
+// a time, and uploads the valid rows to /api/inventory/import as text/csv in requests of UPLOAD_ROWS rows, one at a
+// time (parsing pauses while a request is in flight), posting progress after each.
+//   in:  { file, storeId, mode, token }
+//   out: { type: 'progress' | 'done', readBytes, totalBytes, parsed, uploaded, imported, updated, skipped, errorCount, errors }
+//        { type: 'error', error }
+
+const CHUNK_BYTES = 1024 * 1024, UPLOAD_ROWS = 5000, MAX_REPORTED_ERRORS = 100
+const COLUMNS = ['SKU', 'Product Name', 'Current Quantity', 'Reorder Level', 'Unit Cost']
+
+// The server's rules, so rows it would reject are reported here without being uploaded.
+function validate(row) {
+  if (!row.SKU || !row['Product Name']) return 'SKU and Product Name required'
+  if (!['Current Quantity', 'Reorder Level', 'Unit Cost'].every((column) => Number.isFinite(Number(row[column] || 0)))) return 'Quantities and unit cost must be numbers'
+  return null
+}
+
+self.onmessage = ({ data: { file, storeId, mode = 'skip', token } }) => {
+  const totals = { readBytes: 0, totalBytes: file.size, parsed: 0, uploaded: 0, imported: 0, updated: 0, skipped: 0, errorCount: 0, errors: [] }
+  const report = (type) => self.postMessage({ type, ...totals })
+  const addError = (message) => {
+    totals.errorCount++
+    if (totals.errors.length < MAX_REPORTED_ERRORS) totals.errors.push(message)
+  }
+  let pending = [], uploads = Promise.resolve(), failed = false
+
+  const upload = async (rows) => {
+    const response = await fetch(`/api/inventory/import?storeId=${encodeURIComponent(storeId)}&mode=${mode}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'text/csv', 'Authorization': `Bearer ${token}` },
+      body: Papa.unparse(rows, { columns: COLUMNS })
+    })
+    const result = await response.json()
+    if (!response.ok) throw new Error(result.error || 'Import failed')
+    totals.uploaded += rows.length
+    totals.imported += result.imported; totals.updated += result.updated; totals.skipped += result.skipped
+    for (const error of result.errors || []) addError(`Upload ${Math.ceil(totals.uploaded / UPLOAD_ROWS)}: ${error}`)
+  }
+  const fail = (error) => {
+    if (failed) return
+    failed = true
+    self.postMessage({ type: 'error', error: error.message })
+  }
+
+  let line = 1
+  Papa.parse(file, {
+    header: true,
+    skipEmptyLines: 'greedy',
+    chunkSize: CHUNK_BYTES,
+    chunk: ({ data }, parser) => {
+      for (const row of data) {
+        line++
+        const error = validate(row)
+        if (error) addError(`Row ${line}${row.SKU ? ` (SKU ${row.SKU})` : ''}: ${error}`)
+        else pending.push(row)
+      }
+      totals.parsed += data.length
+      totals.readBytes = Math.min(totals.readBytes + CHUNK_BYTES, file.size)
+      if (pending.length < UPLOAD_ROWS) return report('progress')
+      const rows = pending
+      pending = []
+      parser.pause()
+      uploads = uploads.then(async () => {
+        for (let start = 0; start < rows.length; start += UPLOAD_ROWS) await upload(rows.slice(start, start + UPLOAD_ROWS))
+        report('progress')
+        parser.resume()
+      }).catch((error) => {
+        parser.abort()
+        fail(error)
+      })
+    },
+    complete: () => {
+      uploads.then(async () => {
+        if (failed) return
+        if (pending.length > 0) await upload(pending)
+        totals.readBytes = file.size
+        report('done')
+      }).catch(fail)
+    },
+    error: fail
+  })
+}
@@ -0,0 +1,73 @@
+import Papa from 'papaparse';
+import { Readable, pipeline } from 'stream';
+import { v4 as uuidv4 } from 'uuid';
+import { evaluateAlerts } from './alerts.js';
+import { publish, publishStats } from './events.js';
+import { prepareCached, writeTransaction } from './statements.js';
+
+export const IMPORT_MODES = ['skip', 'upsert'];
+const IMPORT_BATCH_SIZE = 5000, MAX_REPORTED_ERRORS = 1000;
+
+// Parses a web ReadableStream of CSV text incrementally into an async iterable of row objects keyed by header.
+export function parseCsvStream(body) {
+  return pipeline(Readable.fromWeb(body, { encoding: 'utf8' }), Papa.parse(Papa.NODE_STREAM_INPUT, { header: true, skipEmptyLines: 'greedy' }), () => {});
+}
+
+// Loads CSV rows (any iterable or async iterable of row objects) into a store, IMPORT_BATCH_SIZE rows per transaction.
+// Existing SKUs are skipped or, in 'upsert' mode, overwritten. Each row is applied in its own savepoint so a bad row is
+// reported in `errors` without failing its batch. Reorder alerts are evaluated once for the whole store at the end, and
+// subscribers to the change feed get one inventoryChanged event rather than one per row.
+export async function importInventory(db, rows, { storeId, userId, mode = 'skip', onProgress }) {
+  const startedAt = new Date().toISOString();
+  const findExisting = prepareCached(db, 'SELECT id, currentQuantity FROM inventoryItems WHERE sku = ? AND storeId = ?');
+  const writeItem = prepareCached(db, `INSERT INTO inventoryItems (id, sku, productName, currentQuantity, reorderLevel, unitCost, storeId, createdAt, updatedAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(sku, storeId) DO ${mode === 'upsert' ? 'UPDATE SET productName = excluded.productName, currentQuantity = excluded.currentQuantity, reorderLevel = excluded.reorderLevel, unitCost = excluded.unitCost, updatedAt = excluded.updatedAt, version = version + 1' : 'NOTHING'} RETURNING id`);
+  const recordHistory = prepareCached(db, 'INSERT INTO inventoryHistory (id, itemId, changeType, quantityChange, previousQty, newQty, userId, notes, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)');
+  const result = { processed: 0, imported: 0, updated: 0, skipped: 0, errorCount: 0, errors: [] };
+
+  const writeRow = db.transaction((row, now) => {
+    if (!row.SKU || !row['Product Name']) throw new Error('SKU and Product Name required');
+    const currentQuantity = Number(row['Current Quantity'] || 0), reorderLevel = Number(row['Reorder Level'] || 0), unitCost = Number(row['Unit Cost'] || 0);
+    if (![currentQuantity, reorderLevel, unitCost].every(Number.isFinite)) throw new Error('Quantities and unit cost must be numbers');
+    const existing = mode === 'upsert' ? findExisting.get(row.SKU, storeId) : null;
+    const written = writeItem.get(uuidv4(), row.SKU, row['Product Name'], currentQuantity, reorderLevel, unitCost, storeId, now, now);
+    if (!written) {
+      result.skipped++;
+    } else if (!existing) {
+      recordHistory.run(uuidv4(), written.id, 'created', currentQuantity, 0, currentQuantity, userId, 'Imported from CSV', now);
+      result.imported++;
+    } else {
+      if (existing.currentQuantity !== currentQuantity) recordHistory.run(uuidv4(), written.id, 'import', currentQuantity - existing.currentQuantity, existing.currentQuantity, currentQuantity, userId, 'Updated by CSV import', now);
+      result.updated++;
+    }
+  });
+  const writeBatch = writeTransaction(db, (batch) => {
+    const now = new Date().toISOString();
+    for (const { row, line } of batch) {
+      try {
+        writeRow(row, now);
+      } catch (error) {
+        result.errorCount++;
+        if (result.errors.length < MAX_REPORTED_ERRORS) result.errors.push(`Row ${line}${row.SKU ? ` (SKU ${row.SKU})` : ''}: ${error.message}`);
+      }
+    }
+  });
+
+  let batch = [], line = 1;
+  const flush = () => {
+    writeBatch(batch);
+    result.processed += batch.length;
+    batch = [];
+    if (onProgress) onProgress({ processed: result.processed, imported: result.imported, updated: result.updated, skipped: result.skipped, errorCount: result.errorCount });
+  };
+  for await (const row of rows) {
+    batch.push({ row, line: ++line });
+    if (batch.length >= IMPORT_BATCH_SIZE) flush();
+  }
+  if (batch.length > 0) flush();
+  const alerts = evaluateAlerts(db, { storeId, updatedSince: startedAt });
+  if (result.imported + result.updated > 0) {
+    publish('inventoryChanged', { storeId, imported: result.imported, updated: result.updated });
+    publishStats(db, [storeId]);
+  }
+  return { ...result, alertsCreated: alerts.created, alertsResolved: alerts.resolved };
+}
@@ -0,0 +1,183 @@
+import { AsyncLocalStorage } from 'async_hooks';
+import { createHash, timingSafeEqual } from 'crypto';
+
+// In-process latency/size metrics exposed in Prometheus text format by GET /api/metrics.
+//
+// The output includes SQL statement text and route latencies, so the endpoint needs authentication like the rest of
+// the API: a user's JWT, or METRICS_TOKEN (when set) as a bearer token for scrapers that cannot log in.
+//
+// Histograms are log-linear (HDR-style): values below SUB_BUCKETS are counted exactly, larger ones in SUB_BUCKETS
+// linear sub-buckets per power of two, so any quantile is within ~6% of the true value while recording stays a
+// couple of arithmetic ops and one array increment. Durations are recorded in microseconds.
+
+const SUB_BUCKETS = 16, SUB_BUCKET_BITS = 4, MAX_EXPONENT = 48;
+const MAX_SQL_SERIES = 1000, SLOW_QUERY_MS = Number(process.env.SLOW_QUERY_MS) || 200;
+const QUANTILES = [0.5, 0.9, 0.99];
+const METRICS_TOKEN = process.env.METRICS_TOKEN || null;
+
+const requestContext = new AsyncLocalStorage();
+const routeLatency = new Map(), routeBytes = new Map(), routeStatus = new Map(), sqlLatency = new Map();
+const lockWait = createHistogram(), writeBatchSize = createHistogram(), backupDuration = createHistogram();
+const backup = { file: null, totalPages: 0, remainingPages: 0, lastSuccess: 0, lastBytes: 0, failures: 0 };
+let busyErrors = 0;
+
+function createHistogram() {
+  return { counts: new Float64Array((MAX_EXPONENT - SUB_BUCKET_BITS + 2) * SUB_BUCKETS), count: 0, sum: 0 };
+}
+
+function bucketIndex(value) {
+  const v = Math.max(0, Math.round(value));
+  if (v < SUB_BUCKETS) return v;
+  const exponent = Math.min(Math.floor(Math.log2(v)), MAX_EXPONENT);
+  return (exponent - SUB_BUCKET_BITS + 1) * SUB_BUCKETS + Math.min(Math.floor(v / 2 ** (exponent - SUB_BUCKET_BITS)), 2 * SUB_BUCKETS - 1) - SUB_BUCKETS;
+}
+
+function bucketMidpoint(index) {
+  if (index < SUB_BUCKETS) return index;
+  const exponent = Math.floor(index / SUB_BUCKETS) + SUB_BUCKET_BITS - 1, width = 2 ** (exponent - SUB_BUCKET_BITS);
+  return ((index % SUB_BUCKETS) + SUB_BUCKETS + 0.5) * width;
+}
+
+function record(histogram, value) {
+  histogram.counts[bucketIndex(value)]++;
+  histogram.count++;
+  histogram.sum += value;
+}
+
+function quantile(histogram, q) {
+  let remaining = Math.ceil(q * histogram.count);
+  for (let i = 0; i < histogram.counts.length; i++) if ((remaining -= histogram.counts[i]) <= 0) return bucketMidpoint(i);
+  return 0;
+}
+
+function histogramFor(series, key) {
+  let histogram = series.get(key);
+  if (!histogram) series.set(key, histogram = createHistogram());
+  return histogram;
+}
+
+// Label for the routes a handler serves, given as patterns such as /inventory/:id/history (a :name segment matches
+// any one path segment). Paths matching none of them share UNMATCHED_ROUTE, so arbitrary request paths cannot add series.
+export const UNMATCHED_ROUTE = 'unmatched';
+
+export function routeMatcher(patterns) {
+  const compiled = patterns.map(pattern => [pattern, new RegExp(`^${pattern.replace(/:\w+/g, '[^/]+')}$`)]);
+  return (path) => compiled.find(([, regex]) => regex.test(path || '/'))?.[0] || UNMATCHED_ROUTE;
+}
+
+// Times one SQL call, attributing the duration to the statement and to the current request's Server-Timing total.
+export function timeSql(sql, rowCount, call) {
+  const started = performance.now();
+  try {
+    const result = call();
+    const elapsedMs = performance.now() - started, rows = rowCount(result);
+    const context = requestContext.getStore();
+    if (context) { context.sqlMs += elapsedMs; context.queries++; }
+    if (sqlLatency.has(sql) || sqlLatency.size < MAX_SQL_SERIES) {
+      const series = histogramFor(sqlLatency, sql);
+      record(series, elapsedMs * 1000);
+      series.rows = (series.rows || 0) + rows;
+    }
+    if (elapsedMs >= SLOW_QUERY_MS) console.warn(`Slow query (${elapsedMs.toFixed(1)} ms, ${rows} rows${context ? `, ${context.route}` : ''}): ${sql}`);
+    return result;
+  } catch (error) {
+    if (error.code === 'SQLITE_BUSY') busyErrors++;
+    throw error;
+  }
+}
+
+export function recordLockWait(elapsedMs) {
+  record(lockWait, elapsedMs * 1000);
+}
+
+export function recordWriteBatch(operations) {
+  record(writeBatchSize, operations);
+}
+
+// Called after each backup step with the file being copied and its page counts.
+export function recordBackupProgress(file, totalPages, remainingPages) {
+  Object.assign(backup, { file, totalPages, remainingPages });
+}
+
+export function recordBackup({ ok, durationMs, bytes }) {
+  record(backupDuration, durationMs * 1000);
+  backup.file = null;
+  if (ok) Object.assign(backup, { lastSuccess: Date.now(), lastBytes: bytes });
+  else backup.failures++;
+}
+
+// Wraps a route handler: records latency, status and response size per route (one of `routes`, the patterns it
+// serves) and adds a Server-Timing header that splits the handler time into SQL and everything else (validation, JS
+// work, JSON serialization).
+export function instrumentRoute(method, handler, routes) {
+  const routeLabel = routeMatcher(routes);
+  return async (request, ...args) => {
+    const started = performance.now(), route = `${method} ${routeLabel(new URL(request.url).pathname.replace('/api', ''))}`;
+    const context = { route, sqlMs: 0, queries: 0 };
+    const response = await requestContext.run(context, () => handler(request, ...args));
+    const elapsedMs = performance.now() - started;
+    record(histogramFor(routeLatency, route), elapsedMs * 1000);
+    const statusKey = `${route} ${response.status}`;
+    routeStatus.set(statusKey, (routeStatus.get(statusKey) || 0) + 1);
+    response.headers.set('Server-Timing', `sql;desc="${context.queries} queries";dur=${context.sqlMs.toFixed(2)}, app;dur=${(elapsedMs - context.sqlMs).toFixed(2)}, total;dur=${elapsedMs.toFixed(2)}`);
+    if (!response.body) return response;
+    let bytes = 0;
+    const counted = response.body.pipeThrough(new TransformStream({
+      transform(chunk, controller) { bytes += chunk.byteLength; controller.enqueue(chunk); },
+      flush() { record(histogramFor(routeBytes, route), bytes); }
+    }));
+    return new Response(counted, { status: response.status, statusText: response.statusText, headers: response.headers });
+  };
+}
+
+const escapeLabel = (value) => String(value).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\s+/g, ' ');
+
+function summaryLines(name, labels, histogram, scale) {
+  return [
+    ...QUANTILES.map(q => `${name}{${labels}${labels ? ',' : ''}quantile="${q}"} ${Number((quantile(histogram, q) * scale).toPrecision(6))}`),
+    `${name}_sum${labels ? `{${labels}}` : ''} ${Number((histogram.sum * scale).toPrecision(9))}`,
+    `${name}_count${labels ? `{${labels}}` : ''} ${histogram.count}`
+  ];
+}
+
+const digest = (value) => createHash('sha256').update(value).digest();
+
+// True when the request carries METRICS_TOKEN as its bearer token.
+export function hasMetricsToken(request) {
+  const authHeader = request.headers.get('authorization');
+  if (!METRICS_TOKEN || !authHeader || !authHeader.startsWith('Bearer ')) return false;
+  return timingSafeEqual(digest(authHeader.substring(7)), digest(METRICS_TOKEN));
+}
+
+export function renderMetrics() {
+  const routeLabels = (route) => { const [method, path] = route.split(' '); return `method="${method}",route="${escapeLabel(path)}"`; };
+  const lines = [
+    '# HELP http_request_duration_seconds Route handler latency.', '# TYPE http_request_duration_seconds summary',
+    ...[...routeLatency].flatMap(([route, histogram]) => summaryLines('http_request_duration_seconds', routeLabels(route), histogram, 1e-6)),
+    '# HELP http_requests_total Requests by route and status.', '# TYPE http_requests_total counter',
+    ...[...routeStatus].map(([key, count]) => { const [method, path, status] = key.split(' '); return `http_requests_total{${routeLabels(`${method} ${path}`)},status="${status}"} ${count}`; }),
+    '# HELP http_response_size_bytes Response body size.', '# TYPE http_response_size_bytes summary',
+    ...[...routeBytes].flatMap(([route, histogram]) => summaryLines('http_response_size_bytes', routeLabels(route), histogram, 1)),
+    '# HELP sqlite_statement_duration_seconds Execution time per prepared statement.', '# TYPE sqlite_statement_duration_seconds summary',
+    ...[...sqlLatency].flatMap(([sql, histogram]) => summaryLines('sqlite_statement_duration_seconds', `statement="${escapeLabel(sql)}"`, histogram, 1e-6)),
+    '# HELP sqlite_statement_rows_total Rows returned or changed per prepared statement.', '# TYPE sqlite_statement_rows_total counter',
+    ...[...sqlLatency].map(([sql, histogram]) => `sqlite_statement_rows_total{statement="${escapeLabel(sql)}"} ${histogram.rows || 0}`),
+    '# HELP sqlite_lock_wait_seconds Time spent acquiring the write lock for write transactions.', '# TYPE sqlite_lock_wait_seconds summary',
+    ...summaryLines('sqlite_lock_wait_seconds', '', lockWait, 1e-6),
+    '# HELP sqlite_write_batch_operations Mutations committed together by the write queue.', '# TYPE sqlite_write_batch_operations summary',
+    ...summaryLines('sqlite_write_batch_operations', '', writeBatchSize, 1),
+    '# HELP sqlite_busy_errors_total Statements that failed with SQLITE_BUSY after busy_timeout.', '# TYPE sqlite_busy_errors_total counter',
+    `sqlite_busy_errors_total ${busyErrors}`,
+    '# HELP sqlite_backup_duration_seconds Time to take a snapshot of every database file.', '# TYPE sqlite_backup_duration_seconds summary',
+    ...summaryLines('sqlite_backup_duration_seconds', '', backupDuration, 1e-6),
+    '# HELP sqlite_backup_pages Pages of the file being backed up (total, remaining), 0 when idle.', '# TYPE sqlite_backup_pages gauge',
+    `sqlite_backup_pages{state="total"} ${backup.file ? backup.totalPages : 0}`, `sqlite_backup_pages{state="remaining"} ${backup.file ? backup.remainingPages : 0}`,
+    '# HELP sqlite_backup_last_success_timestamp_seconds When the last snapshot completed.', '# TYPE sqlite_backup_last_success_timestamp_seconds gauge',
+    `sqlite_backup_last_success_timestamp_seconds ${Math.floor(backup.lastSuccess / 1000)}`,
+    '# HELP sqlite_backup_last_size_bytes Size of the last completed snapshot.', '# TYPE sqlite_backup_last_size_bytes gauge',
+    `sqlite_backup_last_size_bytes ${backup.lastBytes}`,
+    '# HELP sqlite_backup_failures_total Snapshots that failed.', '# TYPE sqlite_backup_failures_total counter',
+    `sqlite_backup_failures_total ${backup.failures}`
+  ];
+  return lines.join('\n') + '\n';
+}
@@ -0,0 +1,12 @@
+import { parentPort } from 'worker_threads';
+import bcrypt from 'bcryptjs';
+
+// Worker thread of the bcryptjs pool in passwords.js. A module file rather than an eval'd string, so the bundler and the
+// standalone output's file tracing see the bcryptjs dependency.
+parentPort.on('message', ({ op, password, hash, cost }) => {
+  try {
+    parentPort.postMessage({ result: op === 'hash' ? bcrypt.hashSync(password, cost) : bcrypt.compareSync(password, hash) });
+  } catch (error) {
+    parentPort.postMessage({ error: error.message });
+  }
+});
@@ -0,0 +1,130 @@
+import { Worker } from 'worker_threads';
+import { createRequire } from 'module';
+import os from 'os';
+import path from 'path';
+
+// Password hashing kept off the request event loop. By default bcryptjs runs in a small worker-thread pool with a
+// bounded queue; PASSWORD_HASHER=bcrypt or =argon2 switches to those native packages (optional, not in package.json),
+// which hash on libuv's thread pool. verifyPassword accepts any supported format, and needsRehash reports hashes
+// that should be upgraded to the configured hasher/cost after a successful login.
+
+const PASSWORD_HASHER = process.env.PASSWORD_HASHER || 'bcryptjs';
+const BCRYPT_COST = Number(process.env.BCRYPT_COST) || 10;
+const POOL_SIZE = Number(process.env.PASSWORD_WORKERS) || Math.max(1, Math.min(4, os.availableParallelism() - 1));
+const MAX_QUEUED_JOBS = Number(process.env.PASSWORD_QUEUE_LIMIT) || 256;
+
+const requireOptional = createRequire(path.join(process.cwd(), 'package.json'));
+const nativeModules = {};
+
+function loadNative(name) {
+  if (!(name in nativeModules)) {
+    try {
+      nativeModules[name] = requireOptional(name);
+    } catch (error) {
+      console.warn(`Password hasher '${name}' is not installed, falling back to bcryptjs workers`);
+      nativeModules[name] = null;
+    }
+  }
+  return nativeModules[name];
+}
+
+let workers = null;
+const idleWorkers = [], queuedJobs = [];
+
+function spawnWorker() {
+  const worker = new Worker(new URL('./password-worker.js', import.meta.url));
+  worker.on('message', ({ result, error }) => {
+    const job = worker.job;
+    worker.job = null;
+    if (error) job.reject(new Error(error));
+    else job.resolve(result);
+    runNext(worker);
+  });
+  // A worker that crashes or exits is replaced by a fresh one, which takes the next queued job straight away. An error
+  // is followed by an exit, so each worker is replaced once.
+  worker.on('online', () => { worker.started = true; });
+  worker.on('error', (error) => replaceWorker(worker, error));
+  worker.on('exit', (code) => replaceWorker(worker, new Error(`Password worker exited with code ${code}`)));
+  return worker;
+}
+
+function replaceWorker(worker, error) {
+  if (worker.replaced) return;
+  worker.replaced = true;
+  if (idleWorkers.includes(worker)) idleWorkers.splice(idleWorkers.indexOf(worker), 1);
+  if (worker.job) worker.job.reject(error);
+  worker.job = null;
+  // One that failed before starting (bcryptjs missing, say) is not replaced, so a broken setup cannot respawn forever.
+  // Once none are left, queued jobs fail and the next call starts a new pool.
+  if (!worker.started) {
+    workers = workers.filter(w => w !== worker);
+    if (workers.length === 0) {
+      workers = null;
+      for (const job of queuedJobs.splice(0)) job.reject(error);
+    }
+    return;
+  }
+  const replacement = spawnWorker();
+  workers = workers.filter(w => w !== worker).concat(replacement);
+  runNext(replacement);
+}
+
+// Workers hold the process open only while they have a job, so an idle pool never blocks shutdown.
+function assign(worker, job) {
+  worker.job = job;
+  worker.ref();
+  worker.postMessage(job.message);
+}
+
+function runNext(worker) {
+  const job = queuedJobs.shift();
+  if (job) {
+    assign(worker, job);
+  } else {
+    worker.unref();
+    idleWorkers.push(worker);
+  }
+}
+
+function runInPool(message) {
+  if (!workers) {
+    workers = Array.from({ length: POOL_SIZE }, spawnWorker);
+    workers.forEach(runNext);
+  }
+  return new Promise((resolve, reject) => {
+    const job = { message, resolve, reject }, worker = idleWorkers.pop();
+    if (worker) {
+      assign(worker, job);
+    } else if (queuedJobs.length >= MAX_QUEUED_JOBS) {
+      reject(Object.assign(new Error('Password hashing queue is full'), { code: 'PASSWORD_QUEUE_FULL' }));
+    } else {
+      queuedJobs.push(job);
+    }
+  });
+}
+
+const isArgon2Hash = (hash) => hash.startsWith('$argon2');
+
+export async function hashPassword(password) {
+  const native = PASSWORD_HASHER === 'bcryptjs' ? null : loadNative(PASSWORD_HASHER);
+  if (native && PASSWORD_HASHER === 'argon2') return native.hash(password, { type: native.argon2id });
+  if (native) return native.hash(password, BCRYPT_COST);
+  return runInPool({ op: 'hash', password, cost: BCRYPT_COST });
+}
+
+export async function verifyPassword(password, hash) {
+  if (isArgon2Hash(hash)) {
+    const argon2 = loadNative('argon2');
+    if (!argon2) throw new Error('argon2 password hash found but the argon2 package is not installed');
+    return argon2.verify(hash, password);
+  }
+  const bcrypt = PASSWORD_HASHER === 'bcryptjs' ? null : loadNative('bcrypt');
+  if (bcrypt) return bcrypt.compare(password, hash);
+  return runInPool({ op: 'compare', password, hash });
+}
+
+// True when `hash` was produced by a different algorithm or cost than the one currently configured.
+export function needsRehash(hash) {
+  if (PASSWORD_HASHER === 'argon2' && loadNative('argon2')) return !isArgon2Hash(hash) || loadNative('argon2').needsRehash(hash);
+  return isArgon2Hash(hash) || Number(hash.split('$')[2]) !== BCRYPT_COST;
+}
@@ -0,0 +1,63 @@
+// Full-text search over inventoryItems.sku / productName.
+//
+// inventorySearch is a unicode61 index (SKU punctuation kept inside tokens) used for token and
+// prefix matching; inventoryTrigram indexes the same columns by trigram for substring and fuzzy
+// SKU matching. Both are external-content tables keyed by inventoryItems.rowid and kept in sync by
+// triggers; `rank` is bm25 with SKU hits weighted 10x. rowids of inventoryItems are not stable across
+// VACUUM, so rebuild the index afterwards.
+
+const SEARCH_SCHEMA = `
+  CREATE VIRTUAL TABLE IF NOT EXISTS inventorySearch USING fts5(sku, productName, content='inventoryItems', content_rowid='rowid', tokenize="unicode61 tokenchars '-_./'", prefix='2 3');
+  CREATE VIRTUAL TABLE IF NOT EXISTS inventoryTrigram USING fts5(sku, productName, content='inventoryItems', content_rowid='rowid', tokenize='trigram');
+  CREATE TRIGGER IF NOT EXISTS inventory_search_ai AFTER INSERT ON inventoryItems BEGIN
+    INSERT INTO inventorySearch(rowid, sku, productName) VALUES (new.rowid, new.sku, new.productName);
+    INSERT INTO inventoryTrigram(rowid, sku, productName) VALUES (new.rowid, new.sku, new.productName);
+  END;
+  CREATE TRIGGER IF NOT EXISTS inventory_search_ad AFTER DELETE ON inventoryItems BEGIN
+    INSERT INTO inventorySearch(inventorySearch, rowid, sku, productName) VALUES ('delete', old.rowid, old.sku, old.productName);
+    INSERT INTO inventoryTrigram(inventoryTrigram, rowid, sku, productName) VALUES ('delete', old.rowid, old.sku, old.productName);
+  END;
+  CREATE TRIGGER IF NOT EXISTS inventory_search_au AFTER UPDATE OF sku, productName ON inventoryItems BEGIN
+    INSERT INTO inventorySearch(inventorySearch, rowid, sku, productName) VALUES ('delete', old.rowid, old.sku, old.productName);
+    INSERT INTO inventoryTrigram(inventoryTrigram, rowid, sku, productName) VALUES ('delete', old.rowid, old.sku, old.productName);
+    INSERT INTO inventorySearch(rowid, sku, productName) VALUES (new.rowid, new.sku, new.productName);
+    INSERT INTO inventoryTrigram(rowid, sku, productName) VALUES (new.rowid, new.sku, new.productName);
+  END;
+`;
+
+const quote = (term) => `"${term.replace(/"/g, '""')}"`;
+
+export function ensureSearchIndex(db) {
+  const exists = db.prepare("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inventorySearch'").get();
+  db.exec(SEARCH_SCHEMA);
+  if (!exists) rebuildSearchIndex(db);
+}
+
+export function rebuildSearchIndex(db) {
+  db.transaction(() => {
+    db.exec(SEARCH_SCHEMA);
+    db.prepare("INSERT INTO inventorySearch(inventorySearch, rank) VALUES ('rank', 'bm25(10.0, 1.0)')").run();
+    db.prepare("INSERT INTO inventoryTrigram(inventoryTrigram, rank) VALUES ('rank', 'bm25(10.0, 1.0)')").run();
+    db.prepare("INSERT INTO inventorySearch(inventorySearch) VALUES ('rebuild')").run();
+    db.prepare("INSERT INTO inventoryTrigram(inventoryTrigram) VALUES ('rebuild')").run();
+  })();
+  db.prepare("INSERT INTO inventorySearch(inventorySearch) VALUES ('optimize')").run();
+  db.prepare("INSERT INTO inventoryTrigram(inventoryTrigram) VALUES ('optimize')").run();
+  return db.prepare('SELECT COUNT(*) as count FROM inventoryItems').get().count;
+}
+
+// Returns a subquery yielding (rowid, relevance) for items matching `search`, lower relevance is better.
+// Every term must match as a token prefix, or (for terms of 3+ chars) as a substring of sku/productName.
+// With `fuzzy`, SKUs sharing any trigram with the terms match too, ranked after the exact matches.
+export function searchMatches(search, { fuzzy = false } = {}) {
+  const terms = search.trim().split(/\s+/).filter(Boolean);
+  if (terms.length === 0) return null;
+  const branches = ['SELECT rowid, rank AS score FROM inventorySearch WHERE inventorySearch MATCH ?'], params = [terms.map(term => `${quote(term)}*`).join(' ')];
+  const substrings = terms.filter(term => [...term].length >= 3);
+  if (substrings.length === terms.length) { branches.push('SELECT rowid, rank FROM inventoryTrigram WHERE inventoryTrigram MATCH ?'); params.push(substrings.map(quote).join(' ')); }
+  if (fuzzy && substrings.length > 0) {
+    const trigrams = [...new Set(substrings.flatMap(term => { const chars = [...term.toLowerCase()]; return chars.slice(2).map((_, i) => chars.slice(i, i + 3).join('')); }))];
+    branches.push('SELECT rowid, rank + 1000 FROM inventoryTrigram WHERE inventoryTrigram MATCH ?'); params.push(`sku : (${trigrams.map(quote).join(' OR ')})`);
+  }
+  return { sql: `SELECT rowid, MIN(score) AS relevance FROM (${branches.join(' UNION ALL ')}) GROUP BY rowid`, params };
+}
@@ -0,0 +1,55 @@
+import path from 'path';
+
+// Optional per-store sharding. With SHARDS_DIR set, inventory items, alerts and history live in one SQLite file per
+// store (or per store group with SHARD_GROUPS=N, stores hashed into N files), so a long write to one store's file does
+// not block writes to the others. Each shard keeps a copy of its own stores' rows so joins on store names work as in a
+// single database, while DB_PATH holds users and the authoritative store list. This module only maps stores to shard
+// files and keeps the open connections; db.js opens them and routes requests.
+
+export const SHARDS_DIR = process.env.SHARDS_DIR || null;
+export const SHARD_GROUPS = Number(process.env.SHARD_GROUPS) || 0;
+const MAX_CACHED_ITEMS = 100000;
+
+const shards = new Map(), itemShards = new Map();
+
+// 32-bit FNV-1a, so the store-to-group mapping is stable across processes and restarts.
+function hash(value) {
+  let h = 0x811c9dc5;
+  for (let i = 0; i < value.length; i++) h = Math.imul(h ^ value.charCodeAt(i), 0x01000193);
+  return h >>> 0;
+}
+
+export function shardKey(storeId, groups = SHARD_GROUPS) {
+  if (groups > 0) return `group-${hash(storeId) % groups}`;
+  return /^[\w-]{1,64}$/.test(storeId) ? `store-${storeId}` : `store-${hash(storeId).toString(16)}`;
+}
+
+export function shardPath(key, dir = SHARDS_DIR) {
+  return path.join(dir, `${key}.db`);
+}
+
+export function registerShard(key, connection) {
+  shards.set(key, connection);
+}
+
+export function registeredShard(key) {
+  return shards.get(key);
+}
+
+export function registeredShards() {
+  return [...shards.values()];
+}
+
+// Which shard holds an item, remembered after the first lookup since items only move within their shard.
+export function cachedItemShard(itemId) {
+  return itemShards.get(itemId);
+}
+
+export function rememberItemShard(itemId, connection) {
+  if (itemShards.size >= MAX_CACHED_ITEMS) itemShards.delete(itemShards.keys().next().value);
+  itemShards.set(itemId, connection);
+}
+
+export function forgetItemShard(itemId) {
+  itemShards.delete(itemId);
+}
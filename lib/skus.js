@@ -0,0 +1,116 @@
+import { prepareCached, writeTransaction } from './statements.js';
+import { VALUE_SCALE, formatValue } from './stats.js';
+
+// Cross-store views of a SKU. skuTotals holds per-SKU counters (stores stocking it, units on hand, value, stores at or
+// below their reorder level) maintained by triggers on inventoryItems like storeStats, so a rollup page reads one row
+// per SKU; per-store breakdowns and transfer donors come straight from inventoryItems through the (sku, storeId)
+// unique index and a partial index on each item's surplus above its reorder level.
+
+export const DEFAULT_DONORS_PER_SKU = 5;
+
+const ITEM_VALUE = (row) => `CAST(ROUND(${row}.currentQuantity * ${row}.unitCost * ${VALUE_SCALE}) AS INTEGER)`;
+const ADD_ITEM = (row) => `
+    INSERT INTO skuTotals (sku, storeCount, totalQuantity, totalValueScaled, lowStockCount) VALUES (${row}.sku, 1, ${row}.currentQuantity, ${ITEM_VALUE(row)}, ${row}.currentQuantity <= ${row}.reorderLevel)
+      ON CONFLICT(sku) DO UPDATE SET storeCount = storeCount + 1, totalQuantity = totalQuantity + excluded.totalQuantity, totalValueScaled = totalValueScaled + excluded.totalValueScaled, lowStockCount = lowStockCount + excluded.lowStockCount;`;
+const REMOVE_ITEM = (row) => `
+    UPDATE skuTotals SET storeCount = storeCount - 1, totalQuantity = totalQuantity - ${row}.currentQuantity, totalValueScaled = totalValueScaled - ${ITEM_VALUE(row)}, lowStockCount = lowStockCount - (${row}.currentQuantity <= ${row}.reorderLevel) WHERE sku = ${row}.sku;
+    DELETE FROM skuTotals WHERE sku = ${row}.sku AND storeCount = 0;`;
+
+// A donor keeps at least reorderLevel + 1 units, the least that does not put it on alert itself.
+const SKU_SCHEMA = `
+  CREATE TABLE IF NOT EXISTS skuTotals (sku TEXT PRIMARY KEY, storeCount INTEGER NOT NULL, totalQuantity INTEGER NOT NULL, totalValueScaled INTEGER NOT NULL, lowStockCount INTEGER NOT NULL) WITHOUT ROWID;
+  CREATE INDEX IF NOT EXISTS idx_sku_totals_low_stock ON skuTotals(sku) WHERE lowStockCount > 0;
+  CREATE INDEX IF NOT EXISTS idx_items_sku_surplus ON inventoryItems(sku, currentQuantity - reorderLevel) WHERE currentQuantity - reorderLevel > 1;
+  CREATE TRIGGER IF NOT EXISTS sku_totals_item_ai AFTER INSERT ON inventoryItems BEGIN${ADD_ITEM('new')}
+  END;
+  CREATE TRIGGER IF NOT EXISTS sku_totals_item_ad AFTER DELETE ON inventoryItems BEGIN${REMOVE_ITEM('old')}
+  END;
+  CREATE TRIGGER IF NOT EXISTS sku_totals_item_au AFTER UPDATE OF sku, currentQuantity, reorderLevel, unitCost ON inventoryItems BEGIN${REMOVE_ITEM('old')}${ADD_ITEM('new')}
+  END;
+`;
+
+const RECOMPUTE_SQL = `SELECT sku, COUNT(*) AS storeCount, SUM(currentQuantity) AS totalQuantity, SUM(${ITEM_VALUE('inventoryItems')}) AS totalValueScaled, SUM(currentQuantity <= reorderLevel) AS lowStockCount FROM inventoryItems GROUP BY sku`;
+
+export function ensureSkuTotals(db) {
+  const exists = db.prepare("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'skuTotals'").get();
+  db.exec(SKU_SCHEMA);
+  if (!exists) rebuildSkuTotals(db);
+}
+
+export function rebuildSkuTotals(db) {
+  writeTransaction(db, () => {
+    prepareCached(db, 'DELETE FROM skuTotals').run();
+    prepareCached(db, `INSERT INTO skuTotals (sku, storeCount, totalQuantity, totalValueScaled, lowStockCount) ${RECOMPUTE_SQL}`).run();
+  })();
+}
+
+// One page of SKUs in sku order after `after`, totalled over a connection or an array of them (shards), each with its
+// per-store breakdown unless `breakdown` is false. `next` is the last SKU of the page when more follow.
+export function skuRollup(db, { sku, lowStock, after, limit, breakdown = true }) {
+  const dbs = [].concat(db), conditions = [], params = [];
+  if (sku) { conditions.push('sku = ?'); params.push(sku); }
+  if (lowStock) conditions.push('lowStockCount > 0');
+  if (after) { conditions.push('sku > ?'); params.push(after); }
+  const query = `SELECT sku FROM skuTotals ${conditions.length ? `WHERE ${conditions.join(' AND ')}` : ''} ORDER BY sku LIMIT ?`;
+  const keys = [...new Set(dbs.flatMap(connection => prepareCached(connection, query).all(...params, limit + 1).map(row => row.sku)))];
+  if (dbs.length > 1) keys.sort();
+  const page = keys.slice(0, limit), batch = JSON.stringify(page), rollups = new Map();
+  for (const key of page) rollups.set(key, { sku: key, storeCount: 0, totalQuantity: 0, totalValueScaled: 0, lowStockCount: 0, stores: breakdown ? [] : undefined });
+  for (const connection of dbs) {
+    for (const { sku: key, ...totals } of prepareCached(connection, 'SELECT * FROM skuTotals WHERE sku IN (SELECT value FROM json_each(?))').all(batch)) {
+      const rollup = rollups.get(key);
+      for (const field of Object.keys(totals)) rollup[field] += totals[field];
+    }
+    if (!breakdown) continue;
+    const stores = prepareCached(connection, `
+      SELECT i.sku, i.id AS itemId, i.storeId, COALESCE(s.name, 'Unknown') AS storeName, i.productName, i.currentQuantity, i.reorderLevel
+      FROM inventoryItems i LEFT JOIN stores s ON s.id = i.storeId WHERE i.sku IN (SELECT value FROM json_each(?)) ORDER BY i.sku, i.storeId
+    `).all(batch);
+    for (const { sku: key, ...store } of stores) rollups.get(key).stores.push({ ...store, lowStock: store.currentQuantity <= store.reorderLevel });
+  }
+  const skus = [...rollups.values()].map(({ totalValueScaled, ...rollup }) => ({ ...rollup, totalValue: formatValue(totalValueScaled) }));
+  if (breakdown && dbs.length > 1) for (const rollup of skus) rollup.stores.sort((a, b) => (a.storeId < b.storeId ? -1 : a.storeId > b.storeId ? 1 : 0));
+  return { skus, next: keys.length > limit ? page[page.length - 1] : null };
+}
+
+// Open alerts, newest first, with their item's current quantities. `before` is the [triggered, id] keyset of the last
+// alert of the previous page.
+export function openAlertsPage(db, { storeId, sku, before, limit }) {
+  const conditions = ['a.resolved = 0'], params = [];
+  if (storeId) { conditions.push('a.storeId = ?'); params.push(storeId); }
+  if (sku) { conditions.push('a.sku = ?'); params.push(sku); }
+  if (before) { conditions.push('(a.triggered, a.id) < (?, ?)'); params.push(...before); }
+  return prepareCached(db, `
+    SELECT a.id, a.itemId, a.storeId, COALESCE(s.name, 'Unknown') AS storeName, a.sku, a.productName, i.currentQuantity, i.reorderLevel, a.triggered
+    FROM alerts a JOIN inventoryItems i ON i.id = a.itemId LEFT JOIN stores s ON s.id = a.storeId
+    WHERE ${conditions.join(' AND ')} ORDER BY a.triggered DESC, a.id DESC LIMIT ?
+  `).all(...params, limit);
+}
+
+// The `perSku` items of each SKU with the most units to spare, read from the surplus index.
+export function surplusDonors(db, skus, perSku = DEFAULT_DONORS_PER_SKU) {
+  return prepareCached(db, `
+    SELECT d.id AS itemId, d.sku, d.storeId, COALESCE(s.name, 'Unknown') AS storeName, d.currentQuantity - d.reorderLevel - 1 AS surplus
+    FROM json_each(?) k JOIN inventoryItems d ON d.id IN (SELECT id FROM inventoryItems WHERE sku = k.value AND currentQuantity - reorderLevel > 1 ORDER BY currentQuantity - reorderLevel DESC LIMIT ?)
+    LEFT JOIN stores s ON s.id = d.storeId
+  `).all(JSON.stringify(skus), perSku);
+}
+
+// Pairs each alert, in order, with donors of the same SKU in other stores, largest surplus first, asking for enough
+// units to lift it just above its reorder level. A donor's surplus is shared across the alerts it is suggested for.
+export function allocateTransfers(alerts, donors) {
+  const bySku = new Map();
+  for (const donor of donors) bySku.has(donor.sku) ? bySku.get(donor.sku).push({ ...donor }) : bySku.set(donor.sku, [{ ...donor }]);
+  return alerts.map(alert => {
+    const shortage = Math.max(alert.reorderLevel + 1 - alert.currentQuantity, 0), transfers = [];
+    let remaining = shortage;
+    const candidates = (bySku.get(alert.sku) || []).filter(donor => donor.storeId !== alert.storeId && donor.surplus > 0).sort((a, b) => b.surplus - a.surplus);
+    for (const donor of candidates) {
+      if (remaining === 0) break;
+      const quantity = Math.min(donor.surplus, remaining);
+      transfers.push({ fromStoreId: donor.storeId, fromStoreName: donor.storeName, fromItemId: donor.itemId, quantity });
+      donor.surplus -= quantity; remaining -= quantity;
+    }
+    return { alertId: alert.id, itemId: alert.itemId, sku: alert.sku, productName: alert.productName, storeId: alert.storeId, storeName: alert.storeName, currentQuantity: alert.currentQuantity, reorderLevel: alert.reorderLevel, shortage, covered: shortage - remaining, transfers };
+  });
+}
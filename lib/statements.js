@@ -0,0 +1,101 @@
+import { bumpAllVersions, bumpTableVersion, writeTarget } from './cache.js';
+import { recordLockWait, timeSql } from './metrics.js';
+
+const MAX_CACHED_STATEMENTS = 500;
+const statementCaches = new WeakMap(), rawPrepares = new WeakMap();
+let commitCallbacks = null;
+
+// Returns a compiled statement for `sql` on `connection`, reusing it across calls. Keyed by SQL text so dynamically
+// built queries share a statement per distinct shape; the least recently used one is dropped past MAX_CACHED_STATEMENTS.
+export function prepareCached(connection, sql) {
+  let cache = statementCaches.get(connection);
+  if (!cache) statementCaches.set(connection, cache = new Map());
+  let compiled = cache.get(sql);
+  if (compiled) {
+    cache.delete(sql);
+  } else {
+    compiled = instrument((rawPrepares.get(connection) || connection.prepare.bind(connection))(sql), sql);
+    if (cache.size >= MAX_CACHED_STATEMENTS) cache.delete(cache.keys().next().value);
+  }
+  cache.set(sql, compiled);
+  return compiled;
+}
+
+// Same call surface as a better-sqlite3 Statement, with every execution timed into the SQL metrics. Statements that
+// write a table bump its read-cache version once the write commits.
+function instrument(compiled, sql) {
+  const label = sql.replace(/\s+/g, ' ').trim(), target = writeTarget(label);
+  const written = target ? (result) => { afterCommit(() => bumpTableVersion(target)); return result; } : (result) => result;
+  return {
+    reader: compiled.reader,
+    source: compiled.source,
+    run: (...params) => written(timeSql(label, result => result.changes, () => compiled.run(...params))),
+    get: (...params) => written(timeSql(label, row => (row === undefined ? 0 : 1), () => compiled.get(...params))),
+    all: (...params) => written(timeSql(label, rows => rows.length, () => compiled.all(...params))),
+    iterate: (...params) => compiled.iterate(...params)
+  };
+}
+
+// Makes writes on `connection` that bypass prepareCached (db.exec, and statements from connection.prepare that write)
+// invalidate the whole read cache once they commit, since they cannot be attributed to a table. prepareCached keeps
+// compiling with the original prepare, so its writes still bump only the table they target.
+export function trackWrites(connection) {
+  const prepare = connection.prepare.bind(connection), exec = connection.exec.bind(connection);
+  const written = (result) => { afterCommit(bumpAllVersions); return result; };
+  rawPrepares.set(connection, prepare);
+  connection.exec = (sql) => written(exec(sql));
+  connection.prepare = (sql) => {
+    const compiled = prepare(sql);
+    if (compiled.reader && !writeTarget(sql)) return compiled;
+    for (const method of ['run', 'get', 'all']) {
+      const call = compiled[method].bind(compiled);
+      compiled[method] = (...params) => written(call(...params));
+    }
+    return compiled;
+  };
+  return connection;
+}
+
+// Like db.transaction(fn), but a top-level call takes the write lock up front with BEGIN IMMEDIATE and records how long
+// that took (time spent waiting on other writers, up to busy_timeout). Nested calls run as savepoints; one that throws
+// is rolled back on its own, together with the after-commit callbacks it registered.
+export function writeTransaction(connection, fn) {
+  const run = connection.transaction(fn);
+  const nested = (...args) => {
+    const registered = commitCallbacks ? commitCallbacks.length : 0;
+    try {
+      return run(...args);
+    } catch (error) {
+      if (commitCallbacks) commitCallbacks.length = registered;
+      throw error;
+    }
+  };
+  return (...args) => {
+    if (connection.inTransaction) return nested(...args);
+    const started = performance.now();
+    prepareCached(connection, 'BEGIN IMMEDIATE').run();
+    recordLockWait(performance.now() - started);
+    // A transaction on another connection (a shard) may be open around this one; its callbacks wait for its own commit.
+    const outer = commitCallbacks;
+    commitCallbacks = [];
+    try {
+      const result = run(...args);
+      prepareCached(connection, 'COMMIT').run();
+      const callbacks = commitCallbacks;
+      commitCallbacks = outer;
+      for (const callback of callbacks) callback();
+      return result;
+    } catch (error) {
+      commitCallbacks = outer;
+      if (connection.inTransaction) prepareCached(connection, 'ROLLBACK').run();
+      throw error;
+    }
+  };
+}
+
+// Runs `callback` once the innermost enclosing writeTransaction commits (never, if it rolls back), or right away outside
+// one. Transactions are synchronous, so the open ones form a stack and a module-level list for the innermost is enough.
+export function afterCommit(callback) {
+  if (commitCallbacks) commitCallbacks.push(callback);
+  else callback();
+}
@@ -0,0 +1,103 @@
+import { prepareCached, writeTransaction } from './statements.js';
+
+// Per-store dashboard counters maintained by triggers on inventoryItems and alerts, so the
+// dashboard reads O(stores) rows instead of scanning every item. totalValue is kept as an integer
+// in 1/10000 currency units so incremental updates never accumulate floating-point drift.
+
+export const VALUE_SCALE = 10000;
+
+const STATS_SCHEMA = `
+  CREATE TABLE IF NOT EXISTS storeStats (storeId TEXT PRIMARY KEY, itemCount INTEGER NOT NULL DEFAULT 0, totalValueScaled INTEGER NOT NULL DEFAULT 0, lowStockCount INTEGER NOT NULL DEFAULT 0, activeAlerts INTEGER NOT NULL DEFAULT 0);
+  CREATE TRIGGER IF NOT EXISTS store_stats_item_ai AFTER INSERT ON inventoryItems BEGIN
+    INSERT INTO storeStats (storeId, itemCount, totalValueScaled, lowStockCount) VALUES (new.storeId, 1, CAST(ROUND(new.currentQuantity * new.unitCost * ${VALUE_SCALE}) AS INTEGER), new.currentQuantity <= new.reorderLevel)
+      ON CONFLICT(storeId) DO UPDATE SET itemCount = itemCount + excluded.itemCount, totalValueScaled = totalValueScaled + excluded.totalValueScaled, lowStockCount = lowStockCount + excluded.lowStockCount;
+  END;
+  CREATE TRIGGER IF NOT EXISTS store_stats_item_ad AFTER DELETE ON inventoryItems BEGIN
+    UPDATE storeStats SET itemCount = itemCount - 1, totalValueScaled = totalValueScaled - CAST(ROUND(old.currentQuantity * old.unitCost * ${VALUE_SCALE}) AS INTEGER), lowStockCount = lowStockCount - (old.currentQuantity <= old.reorderLevel) WHERE storeId = old.storeId;
+  END;
+  CREATE TRIGGER IF NOT EXISTS store_stats_item_au AFTER UPDATE OF currentQuantity, reorderLevel, unitCost, storeId ON inventoryItems BEGIN
+    UPDATE storeStats SET itemCount = itemCount - 1, totalValueScaled = totalValueScaled - CAST(ROUND(old.currentQuantity * old.unitCost * ${VALUE_SCALE}) AS INTEGER), lowStockCount = lowStockCount - (old.currentQuantity <= old.reorderLevel) WHERE storeId = old.storeId;
+    INSERT INTO storeStats (storeId, itemCount, totalValueScaled, lowStockCount) VALUES (new.storeId, 1, CAST(ROUND(new.currentQuantity * new.unitCost * ${VALUE_SCALE}) AS INTEGER), new.currentQuantity <= new.reorderLevel)
+      ON CONFLICT(storeId) DO UPDATE SET itemCount = itemCount + excluded.itemCount, totalValueScaled = totalValueScaled + excluded.totalValueScaled, lowStockCount = lowStockCount + excluded.lowStockCount;
+  END;
+  CREATE TRIGGER IF NOT EXISTS store_stats_alert_ai AFTER INSERT ON alerts WHEN new.resolved = 0 BEGIN
+    INSERT INTO storeStats (storeId, activeAlerts) VALUES (new.storeId, 1) ON CONFLICT(storeId) DO UPDATE SET activeAlerts = activeAlerts + 1;
+  END;
+  CREATE TRIGGER IF NOT EXISTS store_stats_alert_ad AFTER DELETE ON alerts WHEN old.resolved = 0 BEGIN
+    UPDATE storeStats SET activeAlerts = activeAlerts - 1 WHERE storeId = old.storeId;
+  END;
+  CREATE TRIGGER IF NOT EXISTS store_stats_alert_au AFTER UPDATE OF resolved, storeId ON alerts BEGIN
+    UPDATE storeStats SET activeAlerts = activeAlerts - (old.resolved = 0) WHERE storeId = old.storeId;
+    INSERT INTO storeStats (storeId, activeAlerts) VALUES (new.storeId, new.resolved = 0) ON CONFLICT(storeId) DO UPDATE SET activeAlerts = activeAlerts + excluded.activeAlerts;
+  END;
+`;
+
+const RECOMPUTE_SQL = `
+  SELECT storeId, SUM(itemCount) AS itemCount, SUM(totalValueScaled) AS totalValueScaled, SUM(lowStockCount) AS lowStockCount, SUM(activeAlerts) AS activeAlerts FROM (
+    SELECT storeId, COUNT(*) AS itemCount, SUM(CAST(ROUND(currentQuantity * unitCost * ${VALUE_SCALE}) AS INTEGER)) AS totalValueScaled, SUM(currentQuantity <= reorderLevel) AS lowStockCount, 0 AS activeAlerts FROM inventoryItems GROUP BY storeId
+    UNION ALL SELECT storeId, 0, 0, 0, COUNT(*) FROM alerts WHERE resolved = 0 GROUP BY storeId
+  ) GROUP BY storeId
+`;
+
+const COUNTERS = ['itemCount', 'totalValueScaled', 'lowStockCount', 'activeAlerts'];
+
+export function ensureStoreStats(db) {
+  const exists = db.prepare("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'storeStats'").get();
+  db.exec(STATS_SCHEMA);
+  if (!exists) rebuildStoreStats(db);
+}
+
+export function rebuildStoreStats(db) {
+  writeTransaction(db, () => {
+    prepareCached(db, 'DELETE FROM storeStats').run();
+    prepareCached(db, `INSERT INTO storeStats (storeId, itemCount, totalValueScaled, lowStockCount, activeAlerts) ${RECOMPUTE_SQL}`).run();
+  })();
+}
+
+// Compares the maintained counters against a full recompute; returns one entry per store that differs.
+export function checkStoreStats(db) {
+  return db.transaction(() => {
+    const expected = new Map(db.prepare(RECOMPUTE_SQL).all().map(row => [row.storeId, row]));
+    const actual = new Map(db.prepare('SELECT * FROM storeStats').all().map(row => [row.storeId, row]));
+    const mismatches = [];
+    for (const storeId of new Set([...expected.keys(), ...actual.keys()])) {
+      const want = expected.get(storeId), have = actual.get(storeId);
+      const fields = COUNTERS.filter(field => (want?.[field] || 0) !== (have?.[field] || 0));
+      if (fields.length > 0) mismatches.push({ storeId, fields, expected: want || null, actual: have || null });
+    }
+    return mismatches;
+  })();
+}
+
+export const formatValue = (scaled) => ((scaled || 0) / VALUE_SCALE).toFixed(2);
+const readTotals = (db) => prepareCached(db, 'SELECT COALESCE(SUM(itemCount), 0) AS totalItems, COALESCE(SUM(totalValueScaled), 0) AS totalValueScaled, COALESCE(SUM(lowStockCount), 0) AS lowStockCount, COALESCE(SUM(activeAlerts), 0) AS activeAlerts FROM storeStats').get();
+
+// Totals summed over a connection or an array of them (shards).
+const sumTotals = (dbs) => dbs.map(readTotals).reduce((sum, totals) => {
+  for (const field of Object.keys(totals)) sum[field] = (sum[field] || 0) + totals[field];
+  return sum;
+}, {});
+
+// Catalog-wide dashboard totals without the per-store breakdown.
+export function readStatsTotals(db) {
+  const dbs = [].concat(db), { totalValueScaled, ...totals } = sumTotals(dbs);
+  const totalStores = dbs.reduce((count, connection) => count + prepareCached(connection, 'SELECT COUNT(*) AS count FROM stores').get().count, 0);
+  return { ...totals, totalStores, totalValue: formatValue(totalValueScaled) };
+}
+
+// Dashboard totals plus a per-store breakdown, optionally restricted to one store. With an array of shards, each
+// contributes the stores it holds.
+export function readStoreStats(db, storeId = null) {
+  const dbs = [].concat(db);
+  const stores = dbs.flatMap(connection => prepareCached(connection, `SELECT s.id AS storeId, s.name AS storeName, COALESCE(t.itemCount, 0) AS totalItems, COALESCE(t.totalValueScaled, 0) AS totalValueScaled, COALESCE(t.lowStockCount, 0) AS lowStockCount, COALESCE(t.activeAlerts, 0) AS activeAlerts FROM stores s LEFT JOIN storeStats t ON t.storeId = s.id ${storeId ? 'WHERE s.id = ?' : ''} ORDER BY s.name`).all(...(storeId ? [storeId] : [])));
+  if (dbs.length > 1) stores.sort((a, b) => (a.storeName < b.storeName ? -1 : a.storeName > b.storeName ? 1 : 0));
+  const totals = storeId ? stores[0] || {} : sumTotals(dbs);
+  return {
+    totalItems: totals.totalItems || 0,
+    totalStores: stores.length,
+    activeAlerts: totals.activeAlerts || 0,
+    totalValue: formatValue(totals.totalValueScaled),
+    lowStockCount: totals.lowStockCount || 0,
+    stores: stores.map(({ totalValueScaled, ...store }) => ({ ...store, totalValue: formatValue(totalValueScaled) }))
+  };
+}
@@ -0,0 +1,38 @@
+import jwt from 'jsonwebtoken';
+
+const JWT_SECRET = process.env.JWT_SECRET || 'your-secret-key-change-in-production';
+const TOKEN_TTL = '7d', MAX_CACHED_TOKENS = 10000;
+
+// Verified token payloads keyed by the raw token, least recently used first. Entries are dropped once the token's
+// own `exp` passes, so a cache hit never outlives what jwt.verify would have accepted.
+const verifiedTokens = new Map();
+
+export function signToken(user) {
+  return jwt.sign({ userId: user.id, username: user.username, role: user.role }, JWT_SECRET, { expiresIn: TOKEN_TTL });
+}
+
+export function verifyToken(request) {
+  const authHeader = request.headers.get('authorization');
+  if (!authHeader || !authHeader.startsWith('Bearer ')) return null;
+  return verifyTokenValue(authHeader.substring(7));
+}
+
+// Verifies a raw token, e.g. one passed as a query parameter by EventSource, which cannot set headers.
+export function verifyTokenValue(token) {
+  if (!token) return null;
+  const cached = verifiedTokens.get(token);
+  if (cached) {
+    verifiedTokens.delete(token);
+    if (cached.exp * 1000 <= Date.now()) return null;
+    verifiedTokens.set(token, cached);
+    return cached;
+  }
+  try {
+    const payload = jwt.verify(token, JWT_SECRET);
+    if (verifiedTokens.size >= MAX_CACHED_TOKENS) verifiedTokens.delete(verifiedTokens.keys().next().value);
+    verifiedTokens.set(token, payload);
+    return payload;
+  } catch (error) {
+    return null;
+  }
+}
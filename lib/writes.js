@@ -0,0 +1,59 @@
+import { AsyncResource } from 'async_hooks';
+import { recordWriteBatch } from './metrics.js';
+import { writeTransaction } from './statements.js';
+
+// Group commit for single-item mutations. With WRITE_COALESCE_MS > 0, submitWrite queues each mutation and a flush
+// WRITE_COALESCE_MS after the first one (or as soon as WRITE_COALESCE_MAX_OPS are queued) runs the whole queue in one
+// write transaction, paying for one lock acquisition and one commit instead of one per request. Mutations run in
+// arrival order, so updates to the same item keep their order, and each in its own savepoint, so one that throws is
+// rolled back and rejected alone while the rest commit. Off by default: every mutation runs in its own transaction.
+
+export const WRITE_COALESCE_MS = Number(process.env.WRITE_COALESCE_MS) || 0;
+const WRITE_COALESCE_MAX_OPS = Number(process.env.WRITE_COALESCE_MAX_OPS) || 256;
+
+// One queue per connection, so with sharding each shard file commits its own groups.
+const queues = new Map();
+
+function flush(db) {
+  const queue = queues.get(db);
+  if (!queue) return;
+  queues.delete(db);
+  clearTimeout(queue.timer);
+  const batch = queue.operations;
+  let outcomes;
+  try {
+    outcomes = writeTransaction(db, () => batch.map(({ operation }) => {
+      try {
+        // Nested, so each mutation gets its own savepoint.
+        return { result: writeTransaction(db, operation)() };
+      } catch (error) {
+        return { error };
+      }
+    }))();
+  } catch (error) {
+    // The transaction itself failed (lock timeout, commit error), so nothing in the batch was applied.
+    for (const { reject } of batch) reject(error);
+    return;
+  }
+  recordWriteBatch(batch.length);
+  batch.forEach(({ resolve, reject }, index) => (outcomes[index].error ? reject(outcomes[index].error) : resolve(outcomes[index].result)));
+}
+
+// Runs `operation(db)` (synchronous) in a write transaction and resolves with its return value, or rejects with what
+// it threw. Events and cache invalidations it triggers are emitted after the commit that contains it.
+export function submitWrite(db, operation) {
+  if (WRITE_COALESCE_MS <= 0) {
+    try {
+      return Promise.resolve(writeTransaction(db, operation)(db));
+    } catch (error) {
+      return Promise.reject(error);
+    }
+  }
+  return new Promise((resolve, reject) => {
+    let queue = queues.get(db);
+    if (!queue) queues.set(db, queue = { operations: [], timer: setTimeout(() => flush(db), WRITE_COALESCE_MS) });
+    // Bound to the caller's async context, so SQL time is still attributed to the request that issued the mutation.
+    queue.operations.push({ operation: AsyncResource.bind(() => operation(db)), resolve, reject });
+    if (queue.operations.length === WRITE_COALESCE_MAX_OPS) setImmediate(() => flush(db));
+  });
+}
@@ -4,7 +4,7 @@ const nextConfig = {
     unoptimized: true,
   },
   experimental: {},
-  serverExternalPackages: ['better-sqlite3'],
+  serverExternalPackages: ['better-sqlite3', 'bcryptjs', 'bcrypt', 'argon2'],
   turbopack: {},
   webpack(config, { dev }) {
     if (dev) {
@@ -0,0 +1,22 @@
+import Database from 'better-sqlite3';
+import path from 'path';
+import { rebuildSearchIndex } from './lib/search.js';
+
+const DB_PATH = process.argv[2] || path.join(process.cwd(), 'inventory.db');
+const db = new Database(DB_PATH);
+
+function rebuild() {
+  console.log(`🔎 Rebuilding full-text search index for ${DB_PATH}...`);
+  const started = Date.now();
+  const itemCount = rebuildSearchIndex(db);
+  console.log(`✓ Indexed ${itemCount} inventory items in ${Date.now() - started} ms`);
+  db.close();
+}
+
+try {
+  rebuild();
+} catch (error) {
+  console.error('Error rebuilding search index:', error);
+  db.close();
+  process.exit(1);
+}
@@ -0,0 +1,27 @@
+import Database from 'better-sqlite3';
+import path from 'path';
+import { ensureHistoryRollups } from './lib/history.js';
+import { ensureForecast, rebuildVelocities } from './lib/forecast.js';
+
+// Usage: node rebuild-velocities.js [db]
+// Recomputes every item's sales velocity and projected stockout from its full history (retained events and rollups).
+const DB_PATH = process.argv[2] || path.join(process.cwd(), 'inventory.db');
+const db = new Database(DB_PATH);
+
+function rebuild() {
+  console.log(`📈 Rebuilding sales velocities for ${DB_PATH}...`);
+  const started = Date.now();
+  db.pragma('busy_timeout = 5000');
+  ensureHistoryRollups(db);
+  const { items, tracked } = ensureForecast(db) || rebuildVelocities(db);
+  console.log(`✓ Scanned ${items} inventory items, ${tracked} with sales (${Date.now() - started} ms)`);
+  db.close();
+}
+
+try {
+  rebuild();
+} catch (error) {
+  console.error('Error rebuilding sales velocities:', error);
+  db.close();
+  process.exit(1);
+}
@@ -0,0 +1,86 @@
+import Database from 'better-sqlite3';
+import fs from 'fs';
+import path from 'path';
+import { SHARD_GROUPS, shardKey, shardPath } from './lib/shards.js';
+
+// Usage: node shard-database.js [source.db] [shardsDir] [--groups N]
+// Splits a single-file database into shardsDir/main.db (users and stores) plus one file per store, or per store group
+// with --groups N (defaults to SHARD_GROUPS), holding that store's items, alerts and history. The source is only read.
+// Search indexes, dashboard and SKU counters, sales velocities and indexes are built by the server when it first opens each file.
+const groupsFlag = process.argv.indexOf('--groups');
+const GROUPS = groupsFlag > -1 ? Number(process.argv[groupsFlag + 1]) : SHARD_GROUPS;
+const args = process.argv.slice(2).filter((arg, index, all) => arg !== '--groups' && all[index - 1] !== '--groups');
+const SOURCE = args[0] || path.join(process.cwd(), 'inventory.db');
+const TARGET_DIR = args[1] || path.join(process.cwd(), 'shards');
+
+const MAIN_TABLES = ['users', 'stores'];
+const SHARD_TABLES = ['stores', 'inventoryItems', 'alerts', 'inventoryHistory', 'inventoryHistoryDaily'];
+// Rows of each shard table that belong to a shard, given its store ids as a JSON array.
+const SHARD_ROWS = {
+  stores: 'id IN (SELECT value FROM json_each(?))',
+  inventoryItems: 'storeId IN (SELECT value FROM json_each(?))',
+  alerts: 'storeId IN (SELECT value FROM json_each(?))',
+  inventoryHistory: 'itemId IN (SELECT id FROM main.inventoryItems)',
+  inventoryHistoryDaily: 'itemId IN (SELECT id FROM main.inventoryItems)'
+};
+
+// Creates `file` with the source's definition of each table and copies the selected rows.
+function copyTables(file, tables, where = {}, storeIds = []) {
+  if (fs.existsSync(file)) throw new Error(`${file} already exists`);
+  const target = new Database(file);
+  try {
+    target.pragma('journal_mode = WAL');
+    target.prepare('ATTACH DATABASE ? AS source').run(SOURCE);
+    const counts = {};
+    target.transaction(() => {
+      for (const table of tables) {
+        const definition = target.prepare("SELECT sql FROM source.sqlite_master WHERE type = 'table' AND name = ?").get(table);
+        if (!definition) continue;
+        target.exec(definition.sql);
+        const filter = where[table];
+        counts[table] = target.prepare(`INSERT INTO main.${table} SELECT * FROM source.${table}${filter ? ` WHERE ${filter}` : ''}`).run(...(filter?.includes('?') ? [JSON.stringify(storeIds)] : [])).changes;
+      }
+    })();
+    target.exec('DETACH DATABASE source');
+    return counts;
+  } finally {
+    target.close();
+  }
+}
+
+function split() {
+  console.log(`🔀 Splitting ${SOURCE} into ${TARGET_DIR} (${GROUPS > 0 ? `${GROUPS} store groups` : 'one shard per store'})...`);
+  const started = Date.now();
+  const source = new Database(SOURCE, { readonly: true, fileMustExist: true });
+  const stores = source.prepare('SELECT id FROM stores').all().map(store => store.id);
+  const orphans = source.prepare('SELECT COUNT(*) AS count FROM inventoryItems WHERE storeId NOT IN (SELECT id FROM stores)').get().count;
+  const expectedItems = source.prepare('SELECT COUNT(*) AS count FROM inventoryItems').get().count - orphans;
+  source.close();
+  if (orphans > 0) console.warn(`⚠  ${orphans} inventory items belong to no store and are not copied`);
+
+  fs.mkdirSync(TARGET_DIR, { recursive: true });
+  const main = copyTables(path.join(TARGET_DIR, 'main.db'), MAIN_TABLES);
+  console.log(`✓ main.db: ${main.users || 0} users, ${main.stores || 0} stores`);
+
+  const shards = new Map();
+  for (const storeId of stores) {
+    const key = shardKey(storeId, GROUPS);
+    shards.has(key) ? shards.get(key).push(storeId) : shards.set(key, [storeId]);
+  }
+  let copiedItems = 0;
+  for (const [key, storeIds] of shards) {
+    const counts = copyTables(shardPath(key, TARGET_DIR), SHARD_TABLES, SHARD_ROWS, storeIds);
+    copiedItems += counts.inventoryItems || 0;
+    console.log(`✓ ${key}.db: ${storeIds.length} stores, ${counts.inventoryItems || 0} items, ${counts.alerts || 0} alerts, ${counts.inventoryHistory || 0} history events`);
+  }
+  if (copiedItems !== expectedItems) throw new Error(`Copied ${copiedItems} items, expected ${expectedItems}`);
+  console.log(`✓ Wrote ${shards.size} shards in ${Date.now() - started} ms`);
+  console.log(`\nStart the server with DB_PATH=${path.join(TARGET_DIR, 'main.db')} SHARDS_DIR=${TARGET_DIR}${GROUPS > 0 ? ` SHARD_GROUPS=${GROUPS}` : ''}`);
+}
+
+try {
+  split();
+} catch (error) {
+  console.error('Error splitting database:', error);
+  process.exit(1);
+}